@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache em disco das escalas geradas, indexada pela impressão digital das entradas.
+
+A impressão digital é um hash do conteúdo das linhas que influenciam a
+geração (pessoas ativas, políticas e regras de turnos, ciclos de folgas e as
+férias, horários fixos e dias fechados dentro do horizonte), da data de
+início, do número de semanas e da versão do algoritmo de geração. Se nada
+mudou, a escala é lida da cache em vez de ser gerada de novo.
+
+As escalas ficam num ficheiro SQLite ao lado da base de dados (com a ligação
+partilhada de repositorio.py), com os códigos do ScheduleStore comprimidos;
+acima de `max_entradas` são apagadas as menos usadas recentemente (LRU). A cache é só uma otimização: erros ao lê-la ou
+escrevê-la nunca impedem a geração.
+"""
+
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+from array import array
+from datetime import timedelta
+
+from escalaDados import ScheduleStore
+from repositorio import repositorio
+from datas import ordinal
+
+VERSAO_FORMATO = 1
+MAX_ENTRADAS = 32
+
+# (tabela, consulta) com as linhas que entram na impressão digital
+_CONSULTAS = (
+    ('pessoas', 'SELECT id, nome, horas_diarias, funcao FROM pessoas WHERE ativo = 1 ORDER BY id'),
+    ('politicas_turno', 'SELECT * FROM politicas_turno ORDER BY id'),
+    ('regras_turno', 'SELECT * FROM regras_turno ORDER BY id'),
+    ('ciclos_folgas', 'SELECT pessoa_id, semanas, ancora, valido_de, valido_ate FROM ciclos_folgas ORDER BY id'),
+    ('folgas_ciclo', 'SELECT pessoa_id, semana_id, dia_semana FROM folgas_ciclo '
+                     'ORDER BY pessoa_id, semana_id, dia_semana'),
+    ('ferias', 'SELECT pessoa_id, data_inicio, data_fim FROM ferias '
+               'WHERE inicio_dia <= :fim AND fim_dia >= :inicio ORDER BY pessoa_id, data_inicio, data_fim'),
+    ('horarios_fixos', 'SELECT pessoa_id, data, horario FROM horarios_fixos '
+                       'WHERE dia BETWEEN :inicio AND :fim ORDER BY pessoa_id, data'),
+    ('dias_loja_fechada', 'SELECT data, descricao FROM dias_loja_fechada '
+                          'WHERE dia BETWEEN :inicio AND :fim ORDER BY data'),
+)
+
+
+def caminho_cache(db_path):
+    """Ficheiro da cache de uma base de dados (escala_trabalho.db -> escala_trabalho_cache.db)"""
+    return os.path.splitext(db_path)[0] + '_cache.db'
+
+
+def impressoes_por_tabela(db_path, start_date, num_semanas):
+    """{tabela: hash} das linhas de cada tabela de entrada no horizonte pedido"""
+    inicio = start_date.strftime('%Y-%m-%d')
+    fim = (start_date + timedelta(days=num_semanas * 7 - 1)).strftime('%Y-%m-%d')
+    conn = repositorio(db_path).leitura()
+    limites = {'inicio': ordinal(inicio), 'fim': ordinal(fim)}
+    impressoes = {}
+    for tabela, consulta in _CONSULTAS:
+        h = hashlib.blake2b(digest_size=20)
+        for linha in conn.execute(consulta, limites):
+            h.update(repr(linha).encode())
+        impressoes[tabela] = h.hexdigest()
+    return impressoes
+
+
+def impressao_digital(db_path, start_date, num_semanas, versao_regras=0, impressoes=None):
+    """Hash das entradas da geração para o horizonte pedido (impressoes: já lidas por tabela)"""
+    if impressoes is None:
+        impressoes = impressoes_por_tabela(db_path, start_date, num_semanas)
+    h = hashlib.blake2b(digest_size=20)
+    h.update(repr((VERSAO_FORMATO, versao_regras, start_date.strftime('%Y-%m-%d'), num_semanas)).encode())
+    for tabela, impressao in impressoes.items():
+        h.update(tabela.encode())
+        h.update(impressao.encode())
+    return h.hexdigest()
+
+
+class ScheduleCache:
+    """Escalas geradas guardadas por impressão digital, com despejo LRU"""
+
+    def __init__(self, caminho, max_entradas=MAX_ENTRADAS):
+        self.caminho = caminho
+        self.max_entradas = max_entradas
+        self._repo = None
+
+    def _ligar(self):
+        """Repositório do ficheiro da cache (a tabela é criada no primeiro uso)"""
+        if self._repo is None:
+            repo = repositorio(self.caminho)
+            with repo.transacao() as conn:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS escalas_cache (
+                        chave TEXT PRIMARY KEY,
+                        data_inicio TEXT NOT NULL,
+                        num_dias INTEGER NOT NULL,
+                        pessoas TEXT NOT NULL,
+                        vocabulario TEXT NOT NULL,
+                        preenchido BLOB NOT NULL,
+                        dados BLOB NOT NULL,
+                        ultimo_acesso REAL NOT NULL
+                    )
+                ''')
+            self._repo = repo
+        return self._repo
+
+    def obter(self, chave, start_date, ficheiro=None):
+        """ScheduleStore guardado com esta chave, ou None"""
+        try:
+            repo = self._ligar()
+            linha = repo.consultar_um(
+                'SELECT num_dias, pessoas, vocabulario, preenchido, dados FROM escalas_cache WHERE chave = ?',
+                (chave,))
+            if linha is None:
+                return None
+            repo.executar('UPDATE escalas_cache SET ultimo_acesso = ? WHERE chave = ?', (time.time(), chave))
+        except sqlite3.Error as e:
+            print(f"Erro ao ler a cache de escalas: {e}")
+            return None
+
+        num_dias, pessoas, vocabulario, preenchido, dados = linha
+        pessoas = json.loads(pessoas)
+        codigos = array('H')
+        codigos.frombytes(zlib.decompress(dados))
+        colunas = {p: codigos[i * num_dias:(i + 1) * num_dias] for i, p in enumerate(pessoas)}
+        return ScheduleStore.from_codigos(start_date, num_dias, json.loads(vocabulario), colunas,
+                                          zlib.decompress(preenchido), ficheiro=ficheiro)
+
+    def guardar(self, chave, store):
+        """Guarda a escala e apaga as entradas menos usadas acima do limite"""
+        codigos = array('H')
+        for pessoa in store.pessoas:
+            codigos.extend(store.codigos_pessoa(pessoa))
+        try:
+            with self._ligar().transacao() as conn:
+                conn.execute('INSERT OR REPLACE INTO escalas_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (
+                    chave, store.start_date.strftime('%Y-%m-%d'), store.num_dias,
+                    json.dumps(store.pessoas), json.dumps(store.vocabulario),
+                    zlib.compress(bytes(store.preenchido)), zlib.compress(codigos.tobytes()), time.time()
+                ))
+                conn.execute('''
+                    DELETE FROM escalas_cache WHERE chave NOT IN
+                        (SELECT chave FROM escalas_cache ORDER BY ultimo_acesso DESC LIMIT ?)
+                ''', (self.max_entradas,))
+        except sqlite3.Error as e:
+            print(f"Erro ao escrever na cache de escalas: {e}")
+
+    def limpar(self):
+        try:
+            self._ligar().executar('DELETE FROM escalas_cache')
+        except sqlite3.Error as e:
+            print(f"Erro ao limpar a cache de escalas: {e}")
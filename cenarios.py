@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Avaliação de cenários (e se...?) de pedidos de férias e horários fixos.
+
+Parte de uma escala base e de N pedidos candidatos (férias ou horários fixos
+ainda não gravados) e avalia cada combinação de pedidos. As entradas da base
+são lidas e compiladas uma só vez e a escala base é gerada uma vez; cada
+processo do pool recebe essa base no arranque e, por cenário, aplica os
+pedidos a uma cópia das restrições compiladas e recalcula só os dias
+afetados (como a regeneração incremental do gerador).
+
+Cada cenário é pontuado pelas horas abaixo do mínimo de cobertura, pelos
+dias sem fecho às 20:00 ou sem abertura e pela equidade entre pessoas, e os
+resultados vêm numa tabela ordenada do melhor para o pior.
+
+Uso:
+    python cenarios.py --ferias "Ana,2026-04-06,2026-04-12" --ferias "Rui,2026-04-08,2026-04-15" \\
+        --fixo "Rui,2026-04-20,09:00 - 18:00" --saida cenarios.xlsx
+"""
+
+import os
+import sys
+import copy
+import argparse
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from turnos import Shift, mascara_horas
+from cobertura import CoverageMatrix
+from estatisticas import tabela_vocabulario
+from otimizador import PESO_SEM_FECHO, PESO_SEM_ABERTURA
+
+INICIO_05_07 = mascara_horas(5, 6, 7)
+
+PESO_FALTA = 1.0      # por hora abaixo do mínimo de cobertura
+PESO_EQUIDADE = 1.0   # por unidade de desvio padrão entre pessoas
+MAX_CENARIOS = 4096   # 2^12 combinações
+# Abaixo disto não compensa arrancar processos
+MIN_CENARIOS_POOL = 8
+
+COLUNAS = ['Posição', 'Pedidos', 'Nº pedidos', 'Horas em falta', 'Dias com falta',
+           'Dias sem fecho', 'Dias sem abertura', 'Desvio fins de semana',
+           'Desvio turnos cedo', 'Desvio turnos tarde', 'Custo', 'Diferença para a base']
+
+
+def _data(valor):
+    """Aceita 'AAAA-MM-DD', date ou datetime"""
+    if isinstance(valor, str):
+        return date.fromisoformat(valor)
+    return valor
+
+
+class Pedido:
+    """Pedido candidato: férias (inicio-fim) ou horário fixo num dia"""
+
+    FERIAS = 'ferias'
+    HORARIO_FIXO = 'horario_fixo'
+
+    def __init__(self, tipo, pessoa, inicio, fim=None, horario=None):
+        if tipo not in (self.FERIAS, self.HORARIO_FIXO):
+            raise ValueError(f"Tipo de pedido desconhecido: {tipo}")
+        if tipo == self.HORARIO_FIXO and not horario:
+            raise ValueError("Um horário fixo precisa do horário")
+        self.tipo = tipo
+        self.pessoa = pessoa
+        self.inicio = _data(inicio)
+        self.fim = _data(fim) if fim is not None else self.inicio
+        self.horario = horario
+
+    @classmethod
+    def ferias(cls, pessoa, inicio, fim):
+        return cls(cls.FERIAS, pessoa, inicio, fim)
+
+    @classmethod
+    def horario_fixo(cls, pessoa, data, horario):
+        return cls(cls.HORARIO_FIXO, pessoa, data, horario=horario)
+
+    @property
+    def descricao(self):
+        if self.tipo == self.FERIAS:
+            return f"Férias {self.pessoa} {self.inicio:%d/%m}-{self.fim:%d/%m}"
+        return f"Fixo {self.pessoa} {self.inicio:%d/%m} {self.horario}"
+
+    def dias(self, restricoes):
+        """Dias do horizonte afetados pelo pedido"""
+        a = max(restricoes.dia(self.inicio), 0)
+        b = min(restricoes.dia(self.fim), restricoes.num_dias - 1)
+        return range(a, b + 1)
+
+    def aplicar(self, restricoes):
+        """Marca o pedido nas restrições (copia antes a coluna da pessoa)"""
+        dias = self.dias(restricoes)
+        if not dias:
+            return
+        if self.tipo == self.FERIAS:
+            coluna = bytearray(restricoes.ferias.get(self.pessoa) or bytes(restricoes.num_dias))
+            coluna[dias.start:dias.stop] = b'\x01' * len(dias)
+            restricoes.ferias[self.pessoa] = coluna
+        else:
+            coluna = list(restricoes.fixos.get(self.pessoa) or [None] * restricoes.num_dias)
+            coluna[dias.start] = self.horario
+            restricoes.fixos[self.pessoa] = coluna
+
+
+def aplicar_pedidos(restricoes, pedidos):
+    """Cópia das restrições compiladas com os pedidos aplicados (a base não é alterada)"""
+    novas = copy.copy(restricoes)
+    novas.ferias = dict(restricoes.ferias)
+    novas.fixos = dict(restricoes.fixos)
+    for pedido in pedidos:
+        pedido.aplicar(novas)
+    return novas
+
+
+def preparar_base(db_path, start_date, num_semanas):
+    """Gerador com as entradas carregadas e compiladas e a escala base gerada em memória"""
+    # Importado aqui para que os processos do pool só o carreguem ao receber a base
+    from gerador import WorkScheduleGenerator
+    from escalaDados import ScheduleStore
+
+    generator = WorkScheduleGenerator(db_path, usar_cache=False)
+    generator.start_date = start_date
+    generator.num_semanas = num_semanas
+    generator.carregar_entradas()
+    num_dias = num_semanas * 7
+    generator.schedule_data = ScheduleStore(start_date, num_dias, generator.pessoas)
+    for dia in range(num_dias):
+        generator.gerar_dia(dia)
+    return generator
+
+
+def pontuar(generator):
+    """Indicadores de cobertura e equidade da escala do gerador e o custo total"""
+    store = generator.schedule_data
+    pessoas = list(generator.pessoas.keys())
+    cobertura = CoverageMatrix.from_generator(generator)
+    falta, _, _, _ = cobertura.lacunas()
+
+    codigos = np.zeros((len(cobertura.dias), len(pessoas)), dtype=np.uint16)
+    for j, pessoa in enumerate(pessoas):
+        codigos[:, j] = np.frombuffer(store.codigos_pessoa(pessoa), dtype=np.uint16)[cobertura.dias]
+    turnos = [Shift.parse(texto) for texto in store.vocabulario]
+    fecha = np.array([t.fecha for t in turnos], dtype=bool)
+    abre = np.array([bool(t.bit_inicio & INICIO_05_07) for t in turnos], dtype=bool)
+    sem_fecho = int((cobertura.aberto & ~fecha[codigos].any(axis=1)).sum())
+    sem_abertura = int((cobertura.aberto & ~abre[codigos].any(axis=1)).sum())
+
+    # Equidade: desvio padrão entre pessoas (mesmas definições do resumo da escala)
+    tabela = tabela_vocabulario(store.vocabulario)
+    fim_semana = tabela['trabalho'][codigos] & (cobertura.dias % 7 >= 5)[:, None]
+    desvio_fim_semana = fim_semana.sum(axis=0).std()
+    desvio_cedo = tabela['cedo'][codigos].sum(axis=0).std()
+    desvio_tarde = tabela['tarde'][codigos].sum(axis=0).std()
+    indicadores = {
+        'Horas em falta': int(falta.sum()),
+        'Dias com falta': int(falta.any(axis=1).sum()),
+        'Dias sem fecho': sem_fecho,
+        'Dias sem abertura': sem_abertura,
+        'Desvio fins de semana': round(float(desvio_fim_semana), 2),
+        'Desvio turnos cedo': round(float(desvio_cedo), 2),
+        'Desvio turnos tarde': round(float(desvio_tarde), 2),
+    }
+    indicadores['Custo'] = round(
+        PESO_FALTA * indicadores['Horas em falta']
+        + PESO_SEM_FECHO * sem_fecho
+        + PESO_SEM_ABERTURA * sem_abertura
+        + PESO_EQUIDADE * (indicadores['Desvio fins de semana'] + indicadores['Desvio turnos cedo']
+                           + indicadores['Desvio turnos tarde']), 2)
+    return indicadores
+
+
+# Base partilhada por todos os cenários do processo: (gerador, pedidos)
+_base = None
+
+
+def _iniciar(generator, pedidos):
+    global _base
+    _base = (generator, pedidos)
+
+
+def _avaliar(combinacao):
+    """Pontua um cenário (índices dos pedidos) sobre a base do processo"""
+    generator, pedidos = _base
+    restricoes, store = generator.restricoes, generator.schedule_data
+    escolhidos = [pedidos[i] for i in combinacao]
+    try:
+        generator.restricoes = aplicar_pedidos(restricoes, escolhidos)
+        if escolhidos:
+            generator.schedule_data = store.copia()
+            sujos = set()
+            for pedido in escolhidos:
+                sujos.update(pedido.dias(restricoes))
+            generator.recalcular_dias(sujos)
+        return combinacao, pontuar(generator)
+    finally:
+        generator.restricoes, generator.schedule_data = restricoes, store
+
+
+def combinacoes(num_pedidos, tamanho_max=None):
+    """Todas as combinações de pedidos (índices), da base sem pedidos até tamanho_max"""
+    tamanho_max = num_pedidos if tamanho_max is None else min(tamanho_max, num_pedidos)
+    return [c for n in range(tamanho_max + 1) for c in itertools.combinations(range(num_pedidos), n)]
+
+
+def avaliar_cenarios(generator, pedidos, tamanho_max=None, max_workers=None, progresso=None):
+    """Avalia todas as combinações de pedidos sobre a base e devolve a tabela ordenada.
+
+    generator: base de preparar_base (entradas compiladas e escala base gerada).
+    tamanho_max: número máximo de pedidos aceites em simultâneo.
+    max_workers: processos do pool (1 = no próprio processo).
+    progresso: callback opcional (concluidos, total).
+    """
+    for pedido in pedidos:
+        if pedido.pessoa not in generator.pessoas:
+            raise ValueError(f"Pessoa desconhecida no pedido: {pedido.pessoa}")
+    cenarios = combinacoes(len(pedidos), tamanho_max)
+    if len(cenarios) > MAX_CENARIOS:
+        raise ValueError(f"Demasiados cenários ({len(cenarios)}); limite {MAX_CENARIOS}: reduza tamanho_max")
+
+    def recolher(resultados):
+        for concluidos, resultado in enumerate(resultados, 1):
+            if progresso:
+                progresso(concluidos, len(cenarios))
+            yield resultado
+
+    workers = max_workers or os.cpu_count() or 1
+    if workers == 1 or len(cenarios) < MIN_CENARIOS_POOL:
+        _iniciar(generator, pedidos)
+        try:
+            resultados = list(recolher(map(_avaliar, cenarios)))
+        finally:
+            _iniciar(None, None)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_iniciar,
+                                 initargs=(generator, pedidos)) as pool:
+            blocos = max(1, len(cenarios) // (workers * 4))
+            resultados = list(recolher(pool.map(_avaliar, cenarios, chunksize=blocos)))
+
+    base = resultados[0][1]['Custo']
+    registos = []
+    for combinacao, indicadores in resultados:
+        registo = {
+            'Pedidos': ', '.join(pedidos[i].descricao for i in combinacao) or '(sem pedidos)',
+            'Nº pedidos': len(combinacao),
+        }
+        registo.update(indicadores)
+        registo['Diferença para a base'] = round(indicadores['Custo'] - base, 2)
+        registos.append(registo)
+    df = pd.DataFrame(registos)
+    # Mais barato primeiro; em empate, o cenário que aceita mais pedidos
+    df = df.sort_values(['Custo', 'Nº pedidos'], ascending=[True, False], kind='stable').reset_index(drop=True)
+    df['Posição'] = range(1, len(df) + 1)
+    return df[COLUNAS]
+
+
+def _ler_pedido(tipo, texto):
+    partes = [p.strip() for p in texto.split(',', 2)]
+    if len(partes) != 3:
+        raise argparse.ArgumentTypeError(f"Pedido inválido: {texto}")
+    if tipo == Pedido.FERIAS:
+        return Pedido.ferias(*partes)
+    return Pedido.horario_fixo(*partes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Avalia combinações de pedidos de férias e horários fixos')
+    parser.add_argument('--db', default='escala_trabalho.db', help='base de dados')
+    parser.add_argument('--inicio', default='2026-03-16', help='data de início (AAAA-MM-DD)')
+    parser.add_argument('--semanas', type=int, default=12, help='número de semanas')
+    parser.add_argument('--ferias', action='append', default=[], metavar='PESSOA,INICIO,FIM',
+                        type=lambda t: _ler_pedido(Pedido.FERIAS, t), help='pedido de férias')
+    parser.add_argument('--fixo', action='append', default=[], metavar='PESSOA,DATA,HORARIO',
+                        type=lambda t: _ler_pedido(Pedido.HORARIO_FIXO, t), help='pedido de horário fixo')
+    parser.add_argument('--max-pedidos', type=int, default=None, help='máximo de pedidos por cenário')
+    parser.add_argument('--processos', type=int, default=None, help='número máximo de processos')
+    parser.add_argument('--saida', help='ficheiro .xlsx ou .csv para a tabela de cenários')
+    args = parser.parse_args(argv)
+
+    pedidos = args.ferias + args.fixo
+    if not pedidos:
+        parser.error('indique pelo menos um pedido (--ferias ou --fixo)')
+    generator = preparar_base(args.db, datetime.strptime(args.inicio, '%Y-%m-%d'), args.semanas)
+    df = avaliar_cenarios(generator, pedidos, args.max_pedidos, args.processos)
+    print(df.to_string(index=False))
+    if args.saida:
+        if args.saida.lower().endswith('.csv'):
+            df.to_csv(args.saida, sep=';', index=False, encoding='utf-8-sig')
+        else:
+            df.to_excel(args.saida, sheet_name='Cenários', index=False)
+        print(f"Cenários exportados para {args.saida}")
+    return 0
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
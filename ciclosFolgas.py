@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ciclos de folgas: regras compactas mais exceções por semana.
+
+Uma regra (tabela ciclos_folgas) guarda as semanas do padrão, a
+segunda-feira âncora e o intervalo de validade; a folga de um dia resolve-se
+por aritmética modular sobre a âncora. As linhas de folgas_ciclo são
+exceções: quando uma pessoa tem linhas numa semana, essas linhas substituem
+a regra nessa semana. Mudar uma rotação é atualizar uma linha, e o tamanho da
+base de dados já não cresce com o horizonte.
+
+As regras são escritas por gravar_ciclos e as exceções por gravar_excecoes,
+que compara as folgas pretendidas, (semana_id, dia_semana) por pessoa, com as
+linhas já gravadas e aplica as diferenças numa só transação, com executemany.
+"""
+
+import json
+from collections import Counter
+from datetime import date, timedelta
+
+from datas import ordinal, dia_semana
+
+def semana_id_de(data):
+    """Identificador AAAASS da semana ISO da data (ano ISO: 29/12/2025 → 202601)"""
+    ano, numero_semana, _ = data.isocalendar()
+    return f"{ano}{numero_semana:02d}"
+
+
+def segunda_de(semana_id):
+    """Segunda-feira da semana ISO AAAASS, ou None se o identificador não for válido"""
+    semana_id = str(semana_id)
+    try:
+        return date.fromisocalendar(int(semana_id[:4]), int(semana_id[4:]), 1)
+    except ValueError:
+        return None
+
+
+class CicloFolgas:
+    """Regra: as semanas do padrão repetem-se a partir da segunda-feira âncora.
+
+    Datas guardadas como ordinais (date.toordinal); fim None = sem fim.
+    """
+    __slots__ = ('semanas', 'ancora', 'inicio', 'fim')
+
+    def __init__(self, semanas, ancora, inicio, fim=None):
+        self.semanas = [frozenset(dias) for dias in semanas]
+        self.ancora = ancora
+        self.inicio = inicio
+        self.fim = fim
+
+    def cobre(self, dia):
+        return self.inicio <= dia and (self.fim is None or dia <= self.fim)
+
+    def dias_folga(self, segunda):
+        """Dias de folga (0 = segunda) do padrão na semana que começa em `segunda`"""
+        return self.semanas[(segunda - self.ancora) // 7 % len(self.semanas)]
+
+
+class FolgasPessoa:
+    """Regras de uma pessoa (a primeira que cobre o dia prevalece) e exceções por semana"""
+    __slots__ = ('regras', 'excecoes')
+
+    def __init__(self):
+        self.regras = []
+        self.excecoes = {}  # ordinal da segunda-feira -> dias de folga dessa semana
+
+    def e_folga(self, dia):
+        """Se o dia (ordinal) é folga: exceção da semana, senão a regra que o cobre"""
+        ds = dia_semana(dia)
+        segunda = dia - ds
+        excecao = self.excecoes.get(segunda)
+        if excecao is not None:
+            return ds in excecao
+        for regra in self.regras:
+            if regra.cobre(dia):
+                return ds in regra.dias_folga(segunda)
+        return False
+
+    def folgas_da_semana(self, segunda):
+        """Dias de folga da semana que começa na data `segunda`"""
+        base = segunda.toordinal()
+        return [d for d in range(7) if self.e_folga(base + d)]
+
+    def semanas_definidas(self):
+        """Segundas-feiras (datas) das semanas com exceções ou cobertas por regras com fim"""
+        segundas = set(self.excecoes)
+        for regra in self.regras:
+            if regra.fim is not None:
+                primeira = regra.inicio - dia_semana(regra.inicio)
+                segundas.update(range(primeira, regra.fim + 1, 7))
+        return [date.fromordinal(s) for s in sorted(segundas)]
+
+
+_REGRAS = '''
+    SELECT {chave}, c.semanas, c.ancora, c.valido_de, c.valido_ate
+    FROM ciclos_folgas c
+    JOIN pessoas p ON c.pessoa_id = p.id
+    WHERE {filtro}
+    ORDER BY c.id
+'''
+_EXCECOES = '''
+    SELECT {chave}, fc.semana_id, fc.dia_semana
+    FROM folgas_ciclo fc
+    JOIN pessoas p ON fc.pessoa_id = p.id
+    WHERE {filtro}
+'''
+
+
+def _carregar(conn, chave, filtro, params=()):
+    folgas = {}
+    for pessoa, semanas, ancora, inicio, fim in conn.execute(
+            _REGRAS.format(chave=chave, filtro=filtro), params):
+        folgas.setdefault(pessoa, FolgasPessoa()).regras.append(CicloFolgas(
+            json.loads(semanas), ordinal(ancora), ordinal(inicio), ordinal(fim) if fim else None))
+    for pessoa, semana_id, dia in conn.execute(
+            _EXCECOES.format(chave=chave, filtro=filtro), params):
+        segunda = segunda_de(semana_id)
+        if segunda is not None:
+            excecoes = folgas.setdefault(pessoa, FolgasPessoa()).excecoes
+            excecoes.setdefault(segunda.toordinal(), set()).add(int(dia))
+    return folgas
+
+
+def carregar_folgas(conn):
+    """{nome: FolgasPessoa} das pessoas ativas"""
+    return _carregar(conn, 'p.nome', 'p.ativo = 1')
+
+
+def folgas_da_pessoa(conn, pessoa_id):
+    return _carregar(conn, 'p.id', 'p.id = ?', (pessoa_id,)).get(pessoa_id, FolgasPessoa())
+
+
+def gravar_ciclos(repo, ciclos, ancora, num_semanas, substituir=True):
+    """Grava uma regra por pessoa ({pessoa_id: semanas do padrão}) numa só transação.
+
+    A regra vale num_semanas a partir da segunda-feira `ancora`. Com
+    substituir, as regras e exceções anteriores dessas pessoas são apagadas;
+    sem substituir, as anteriores prevalecem nas semanas que já cobrem.
+    """
+    inicio = ancora.isoformat()
+    fim = (ancora + timedelta(weeks=num_semanas, days=-1)).isoformat()
+    pessoas = [(pessoa_id,) for pessoa_id in ciclos]
+    with repo.transacao() as conn:
+        if substituir:
+            conn.executemany("DELETE FROM ciclos_folgas WHERE pessoa_id = ?", pessoas)
+            conn.executemany("DELETE FROM folgas_ciclo WHERE pessoa_id = ?", pessoas)
+        conn.executemany("""
+            INSERT INTO ciclos_folgas (pessoa_id, semanas, ancora, valido_de, valido_ate)
+            VALUES (?, ?, ?, ?, ?)
+        """, [(pessoa_id, json.dumps([sorted(dias) for dias in semanas]), inicio, inicio, fim)
+              for pessoa_id, semanas in ciclos.items()])
+
+
+def gravar_excecoes(repo, excecoes, semanas):
+    """Grava exceções ({pessoa_id: {(semana_id, dia_semana)}}) numa só transação.
+
+    Nas semanas indicadas, as linhas de cada pessoa passam a ser exatamente
+    as pedidas: só se apagam as que deixaram de existir e só se inserem as
+    novas. Devolve (inseridas, apagadas).
+    """
+    inserir, apagar = [], []
+    with repo.transacao() as conn:
+        for pessoa_id, folgas in excecoes.items():
+            existentes = {(str(semana_id), dia) for semana_id, dia in conn.execute(
+                "SELECT semana_id, dia_semana FROM folgas_ciclo WHERE pessoa_id = ?", (pessoa_id,))}
+            inserir.extend((pessoa_id, semana_id, dia) for semana_id, dia in folgas - existentes)
+            sobras = {(s, d) for s, d in existentes - folgas if s in semanas}
+            apagar.extend((pessoa_id, semana_id, dia) for semana_id, dia in sobras)
+
+        conn.executemany("""
+            DELETE FROM folgas_ciclo WHERE pessoa_id = ? AND semana_id = ? AND dia_semana = ?
+        """, apagar)
+        conn.executemany("""
+            INSERT INTO folgas_ciclo (pessoa_id, semana_id, dia_semana) VALUES (?, ?, ?)
+        """, sorted(inserir))
+    return len(inserir), len(apagar)
+
+
+# === COMPACTAÇÃO (migração 3) ===
+# Maior ciclo procurado ao converter linhas antigas numa regra
+MAX_SEMANAS_CICLO = 12
+
+
+def _melhor_padrao(semanas):
+    """Padrão com menos linhas de exceção para semanas consecutivas [(semana_id, dias)]"""
+    melhor = None
+    for tamanho in range(1, max(1, min(MAX_SEMANAS_CICLO, len(semanas) // 2)) + 1):
+        padrao = [Counter(dias for _, dias in semanas[i::tamanho]).most_common(1)[0][0]
+                  for i in range(tamanho)]
+        excecoes = [(semana_id, dias) for k, (semana_id, dias) in enumerate(semanas)
+                    if dias != padrao[k % tamanho]]
+        linhas = sum(len(dias) for _, dias in excecoes)
+        if melhor is None or linhas < melhor[0]:
+            melhor = (linhas, padrao, excecoes)
+    return melhor
+
+
+def compactar_folgas(cursor):
+    """Converte as linhas de folgas_ciclo em regras e exceções, sem mudar as folgas resultantes.
+
+    Cada sequência de semanas consecutivas de uma pessoa passa a uma regra
+    com o padrão que deixa menos exceções; as semanas iguais ao padrão
+    deixam de ter linhas.
+    """
+    por_pessoa = {}
+    for pessoa_id, semana_id, dia in cursor.execute(
+            "SELECT pessoa_id, semana_id, dia_semana FROM folgas_ciclo"):
+        segunda = segunda_de(semana_id)
+        if segunda is not None:
+            semanas = por_pessoa.setdefault(pessoa_id, {})
+            semanas.setdefault(segunda, (str(semana_id), set()))[1].add(int(dia))
+
+    regras, apagar = [], []
+    for pessoa_id, semanas in sorted(por_pessoa.items()):
+        # Sequências de semanas consecutivas
+        sequencias = []
+        for segunda in sorted(semanas):
+            semana_id, dias = semanas[segunda]
+            if not sequencias or segunda - sequencias[-1][-1][0] != timedelta(weeks=1):
+                sequencias.append([])
+            sequencias[-1].append((segunda, semana_id, frozenset(dias)))
+
+        for sequencia in sequencias:
+            linhas, padrao, excecoes = _melhor_padrao([(s, d) for _, s, d in sequencia])
+            if linhas >= sum(len(d) for _, _, d in sequencia):
+                continue
+            primeira, ultima = sequencia[0][0], sequencia[-1][0]
+            regras.append((pessoa_id, json.dumps([sorted(dias) for dias in padrao]),
+                           primeira.isoformat(), primeira.isoformat(),
+                           (ultima + timedelta(days=6)).isoformat()))
+            manter = {semana_id for semana_id, _ in excecoes}
+            apagar.extend((pessoa_id, semana_id) for _, semana_id, _ in sequencia
+                          if semana_id not in manter)
+
+    cursor.executemany("""
+        INSERT INTO ciclos_folgas (pessoa_id, semanas, ancora, valido_de, valido_ate)
+        VALUES (?, ?, ?, ?, ?)
+    """, regras)
+    cursor.executemany("DELETE FROM folgas_ciclo WHERE pessoa_id = ? AND semana_id = ?", apagar)
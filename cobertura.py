@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Matriz de cobertura dias × horas da escala gerada (NumPy).
+
+Os horários da escala são códigos sobre um vocabulário (ScheduleStore); cada
+código é convertido uma vez numa linha de presença por hora e a matriz de
+presenças (dias × pessoas × horas) obtém-se por indexação, sem ciclos por
+célula. Sobre ela são calculadas as horas abaixo do mínimo (lacunas) e acima
+do máximo (excesso) face aos alvos de pessoal.
+"""
+
+import numpy as np
+import pandas as pd
+
+from escalaDados import DIAS_SEMANA
+from turnos import Shift
+
+HORA_INICIO = 5   # primeira hora analisada (05:00-06:00)
+HORA_FIM = 22     # última hora analisada termina às 22:00
+
+# Alvo mínimo por omissão: pelo menos uma pessoa das 07:00 às 20:00
+MINIMO_PADRAO = {h: 1 for h in range(7, 20)}
+
+
+def presencas_vocabulario(vocabulario):
+    """Matriz (códigos × 24) com True nas horas inteiras em que o turno está presente"""
+    tabela = np.zeros((len(vocabulario), 24), dtype=bool)
+    for codigo, texto in enumerate(vocabulario):
+        mascara = Shift.parse(texto).mascara
+        for h in range(24):
+            if mascara >> h & 1:
+                tabela[codigo, h] = True
+    return tabela
+
+
+def _alvo(valor, num_dias, dias_semana, horas):
+    """Converte um alvo (int, {hora: n}, array por hora ou 7 × horas) numa matriz dias × horas"""
+    if valor is None:
+        return None
+    if isinstance(valor, dict):
+        linha = np.array([valor.get(h, 0) for h in horas])
+        return np.broadcast_to(linha, (num_dias, len(horas)))
+    valor = np.asarray(valor)
+    if valor.ndim == 0:
+        return np.full((num_dias, len(horas)), int(valor))
+    if valor.ndim == 1:
+        return np.broadcast_to(valor, (num_dias, len(horas)))
+    if valor.shape[0] == 7:
+        return valor[dias_semana]  # alvo por dia da semana
+    return valor
+
+
+class CoverageMatrix:
+    """Presenças e contagem de pessoas por dia e hora do horizonte gerado"""
+
+    def __init__(self, store, pessoas=None, dias_fechados=(), hora_inicio=HORA_INICIO, hora_fim=HORA_FIM):
+        self.store = store
+        self.pessoas = list(store.pessoas if pessoas is None else pessoas)
+        self.horas = list(range(hora_inicio, hora_fim))
+        self.dias = np.array(store.dias_preenchidos(), dtype=np.int64)
+
+        # Códigos dias × pessoas
+        codigos = np.zeros((store.num_dias, len(self.pessoas)), dtype=np.uint16)
+        for j, pessoa in enumerate(self.pessoas):
+            codigos[:, j] = np.frombuffer(store.codigos_pessoa(pessoa), dtype=np.uint16)
+        codigos = codigos[self.dias]
+
+        tabela = presencas_vocabulario(store.vocabulario)[:, hora_inicio:hora_fim]
+        # presencas[d, p, h]
+        self.presencas = tabela[codigos]
+        self.contagem = self.presencas.sum(axis=1, dtype=np.int16)
+        self.dias_semana = self.dias % 7
+        fechados = set(dias_fechados)
+        self.aberto = np.array([d not in fechados for d in self.dias], dtype=bool)
+
+    @classmethod
+    def from_generator(cls, generator, **kwargs):
+        """Matriz da escala do gerador, ignorando os dias de loja fechada"""
+        store = generator.schedule_data
+        fechados = [d for d in store.dias_preenchidos() if generator.restricoes.loja_fechada(d) is not None]
+        return cls(store, list(generator.pessoas.keys()), fechados, **kwargs)
+
+    def dataframe(self):
+        """Contagem de pessoas por dia (linhas) e hora (colunas)"""
+        return pd.DataFrame(
+            self.contagem,
+            index=[self.store.data(int(d)).strftime('%d/%m/%Y') for d in self.dias],
+            columns=[f"{h:02d}:00" for h in self.horas]
+        )
+
+    def lacunas(self, minimo=None, maximo=None):
+        """Máscaras (dias × horas) de horas abaixo do mínimo e acima do máximo"""
+        minimo = MINIMO_PADRAO if minimo is None else minimo
+        num_dias = len(self.dias)
+        alvo_min = _alvo(minimo, num_dias, self.dias_semana, self.horas)
+        alvo_max = _alvo(maximo, num_dias, self.dias_semana, self.horas)
+        falta = (self.contagem < alvo_min) & self.aberto[:, None]
+        excesso = np.zeros_like(falta)
+        if alvo_max is not None:
+            excesso = (self.contagem > alvo_max) & self.aberto[:, None]
+        return falta, excesso, alvo_min, alvo_max
+
+    def relatorio(self, minimo=None, maximo=None):
+        """Relatório de lacunas e excessos: um registo por dia e hora, com quem está presente"""
+        falta, excesso, alvo_min, alvo_max = self.lacunas(minimo, maximo)
+        registos = []
+        for tipo, mascara in (('Falta', falta), ('Excesso', excesso)):
+            for i, k in zip(*np.nonzero(mascara)):
+                dia = int(self.dias[i])
+                presentes = [self.pessoas[j] for j in np.flatnonzero(self.presencas[i, :, k])]
+                registos.append({
+                    'Data': self.store.data(dia).strftime('%d/%m/%Y'),
+                    'Dia': DIAS_SEMANA[dia % 7],
+                    'Hora': f"{self.horas[k]:02d}:00",
+                    'Tipo': tipo,
+                    'Pessoas': int(self.contagem[i, k]),
+                    'Mínimo': int(alvo_min[i, k]),
+                    'Máximo': int(alvo_max[i, k]) if alvo_max is not None else None,
+                    'Presentes': ', '.join(presentes),
+                    '_ordem': (dia, self.horas[k]),
+                })
+        registos.sort(key=lambda r: r['_ordem'])
+        return pd.DataFrame(registos, columns=['Data', 'Dia', 'Hora', 'Tipo', 'Pessoas',
+                                               'Mínimo', 'Máximo', 'Presentes'])
+
+    def resumo(self, minimo=None, maximo=None):
+        """Totais para o separador de resumo"""
+        falta, excesso, _, _ = self.lacunas(minimo, maximo)
+        return {
+            'horas_em_falta': int(falta.sum()),
+            'dias_com_falta': int(falta.any(axis=1).sum()),
+            'horas_em_excesso': int(excesso.sum()),
+            'media_por_hora': {f"{h:02d}:00": round(float(v), 2)
+                               for h, v in zip(self.horas, self.contagem[self.aberto].mean(axis=0))}
+            if self.aberto.any() else {},
+        }
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Comparação entre versões da escala (guardadas em escala_detalhes ou em memória).
+
+Duas escalas guardadas são comparadas em SQL, com junções sobre o índice
+único (escala_id, pessoa_id, data) de escala_detalhes. Uma escala guardada e
+a escala atual do gerador são comparadas sobre os arrays de códigos do
+ScheduleStore: os vocabulários das duas versões são unidos, os códigos
+traduzidos por indexação e as diferenças obtidas com uma só comparação por
+pessoa. O resultado é sempre um DataFrame com uma linha por pessoa e dia
+alterados.
+
+Uso:
+    python comparacaoEscalas.py 3 5 --saida diferencas.xlsx
+"""
+
+import sys
+import argparse
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from escalaDados import ScheduleStore, DIAS_SEMANA
+from repositorio import repositorio
+
+COLUNAS = ['Data', 'Dia', 'Pessoa', 'Antes', 'Depois', 'Tipo']
+ALTERADO = 'Alterado'
+NOVO = 'Novo'          # só existe na versão mais recente
+REMOVIDO = 'Removido'  # só existe na versão anterior
+
+_SQL_DIFERENCAS = '''
+    SELECT a.data, pa.nome, a.horario, b.horario
+    FROM escala_detalhes a
+    JOIN pessoas pa ON pa.id = a.pessoa_id
+    LEFT JOIN escala_detalhes b
+        ON b.escala_id = :depois AND b.pessoa_id = a.pessoa_id AND b.data = a.data
+    WHERE a.escala_id = :antes AND (b.horario IS NULL OR b.horario <> a.horario)
+    UNION ALL
+    SELECT b.data, pb.nome, NULL, b.horario
+    FROM escala_detalhes b
+    JOIN pessoas pb ON pb.id = b.pessoa_id
+    WHERE b.escala_id = :depois AND NOT EXISTS (
+        SELECT 1 FROM escala_detalhes a
+        WHERE a.escala_id = :antes AND a.pessoa_id = b.pessoa_id AND a.data = b.data)
+'''
+
+
+def _tipos(antes, depois):
+    return np.where(pd.isna(antes), NOVO, np.where(pd.isna(depois), REMOVIDO, ALTERADO))
+
+
+def _dataframe(datas, pessoas, antes, depois):
+    """DataFrame de diferenças ordenado por data e pessoa (datas: datetime64)"""
+    datas = pd.DatetimeIndex(datas)
+    df = pd.DataFrame({
+        'Data': datas.strftime('%d/%m/%Y'),
+        'Dia': np.array(DIAS_SEMANA, dtype=object)[datas.dayofweek],
+        'Pessoa': pessoas,
+        'Antes': antes,
+        'Depois': depois,
+        'Tipo': _tipos(antes, depois),
+        '_ordem': datas,
+    }, columns=COLUNAS + ['_ordem'])
+    df = df.sort_values(['_ordem', 'Pessoa'], kind='stable').drop(columns='_ordem')
+    return df.reset_index(drop=True)
+
+
+def comparar_guardadas(conn, escala_antes, escala_depois):
+    """Diferenças entre duas escalas guardadas (conn: ligação sqlite3 à base de dados)"""
+    linhas = conn.execute(_SQL_DIFERENCAS, {'antes': escala_antes, 'depois': escala_depois}).fetchall()
+    if not linhas:
+        return pd.DataFrame(columns=COLUNAS)
+    datas, pessoas, antes, depois = zip(*linhas)
+    return _dataframe(pd.to_datetime(datas, format='%Y-%m-%d'), list(pessoas),
+                      np.array(antes, dtype=object), np.array(depois, dtype=object))
+
+
+def _codigos_alinhados(store, pessoa, inicio, num_dias, traducao):
+    """Códigos da pessoa no vocabulário comum, para os dias [inicio, inicio + num_dias)"""
+    codigos = np.zeros(num_dias, dtype=np.int32)
+    if pessoa in store.pessoas:
+        proprios = np.frombuffer(store.codigos_pessoa(pessoa), dtype=np.uint16)
+        desvio = store.inicio - inicio
+        codigos[desvio:desvio + store.num_dias] = traducao[proprios]
+    return codigos
+
+
+def comparar_escalas(antes, depois, pessoas=None):
+    """Diferenças entre dois ScheduleStore (alinhados pela data, não pelo índice do dia)"""
+    if pessoas is None:
+        pessoas = list(dict.fromkeys(antes.pessoas + depois.pessoas))
+    vocabulario = list(dict.fromkeys(antes.vocabulario + depois.vocabulario))  # None fica com o código 0
+    indice = {texto: i for i, texto in enumerate(vocabulario)}
+    traducao_antes = np.array([indice[t] for t in antes.vocabulario], dtype=np.int32)
+    traducao_depois = np.array([indice[t] for t in depois.vocabulario], dtype=np.int32)
+    textos = np.array(vocabulario, dtype=object)
+
+    inicio = min(antes.inicio, depois.inicio)
+    num_dias = max(antes.inicio + antes.num_dias, depois.inicio + depois.num_dias) - inicio
+    partes = []
+    for pessoa in pessoas:
+        a = _codigos_alinhados(antes, pessoa, inicio, num_dias, traducao_antes)
+        b = _codigos_alinhados(depois, pessoa, inicio, num_dias, traducao_depois)
+        dias = np.flatnonzero(a != b)
+        if len(dias):
+            partes.append((dias, pessoa, a[dias], b[dias]))
+    if not partes:
+        return pd.DataFrame(columns=COLUNAS)
+
+    dias = np.concatenate([p[0] for p in partes])
+    ordinais = dias + inicio
+    # Ordinal 1 = 0001-01-01
+    datas = np.datetime64('0001-01-01', 'D') + (ordinais - 1)
+    return _dataframe(
+        datas,
+        np.concatenate([np.full(len(p[0]), p[1], dtype=object) for p in partes]),
+        textos[np.concatenate([p[2] for p in partes])],
+        textos[np.concatenate([p[3] for p in partes])],
+    )
+
+
+def store_guardado(conn, escala_id, pessoas=None):
+    """ScheduleStore de uma escala guardada (None se não existir)"""
+    cabecalho = conn.execute('SELECT data_inicio, num_semanas FROM escalas_geradas WHERE id = ?',
+                             (escala_id,)).fetchone()
+    if cabecalho is None:
+        return None
+    detalhes = conn.execute('''
+        SELECT d.data, p.nome, d.horario
+        FROM escala_detalhes d
+        JOIN pessoas p ON p.id = d.pessoa_id
+        WHERE d.escala_id = ?
+        ORDER BY d.data
+    ''', (escala_id,)).fetchall()
+    if pessoas is None:
+        pessoas = list(dict.fromkeys(nome for _, nome, _ in detalhes))
+    return ScheduleStore.from_detalhes(date.fromisoformat(cabecalho[0]), cabecalho[1] * 7, pessoas, detalhes)
+
+
+def comparar_com_atual(conn, escala_id, store):
+    """Diferenças entre uma escala guardada (antes) e a escala em memória (depois)"""
+    guardado = store_guardado(conn, escala_id)
+    if guardado is None:
+        raise ValueError(f"Escala guardada não encontrada: {escala_id}")
+    pessoas = list(dict.fromkeys(guardado.pessoas + store.pessoas))
+    return comparar_escalas(guardado, store, pessoas)
+
+
+def resumo_diferencas(df):
+    """Número de dias alterados, novos e removidos por pessoa"""
+    if df.empty:
+        return pd.DataFrame(columns=['Pessoa', ALTERADO, NOVO, REMOVIDO, 'Total'])
+    resumo = pd.crosstab(df['Pessoa'], df['Tipo'])
+    resumo = resumo.reindex(columns=[ALTERADO, NOVO, REMOVIDO], fill_value=0)
+    resumo['Total'] = resumo.sum(axis=1)
+    resumo.columns.name = None
+    return resumo.reset_index()
+
+
+def exportar_diferencas(df, filename):
+    """Exporta as diferenças para CSV (';') ou Excel (com uma folha de resumo por pessoa)"""
+    if filename.lower().endswith('.csv'):
+        df.to_csv(filename, sep=';', index=False, encoding='utf-8-sig')
+        return filename
+    from openpyxl.styles import PatternFill, Font
+    cores = {ALTERADO: 'FFF3CD', NOVO: 'D4EDDA', REMOVIDO: 'F8D7DA'}
+    with pd.ExcelWriter(filename, engine='openpyxl') as writer:
+        df.to_excel(writer, sheet_name='Diferenças', index=False)
+        resumo_diferencas(df).to_excel(writer, sheet_name='Resumo', index=False)
+        ws = writer.sheets['Diferenças']
+        preenchimentos = {tipo: PatternFill(start_color=cor, end_color=cor, fill_type='solid')
+                          for tipo, cor in cores.items()}
+        negrito = Font(bold=True)
+        for cell in ws[1]:
+            cell.font = negrito
+        coluna_depois = COLUNAS.index('Depois')
+        for linha, tipo in enumerate(df['Tipo'], 2):
+            for cell in ws[linha]:
+                cell.fill = preenchimentos[tipo]
+            ws[linha][coluna_depois].font = negrito
+        for letra, largura in zip('ABCDEF', (12, 10, 14, 16, 16, 10)):
+            ws.column_dimensions[letra].width = largura
+    return filename
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compara duas escalas guardadas na base de dados')
+    parser.add_argument('antes', type=int, help='id da escala anterior (escalas_geradas)')
+    parser.add_argument('depois', type=int, help='id da escala mais recente')
+    parser.add_argument('--db', default='escala_trabalho.db', help='base de dados')
+    parser.add_argument('--saida', help='ficheiro .xlsx ou .csv para exportar as diferenças')
+    args = parser.parse_args(argv)
+
+    df = comparar_guardadas(repositorio(args.db).leitura(), args.antes, args.depois)
+    print(resumo_diferencas(df).to_string(index=False) if not df.empty else 'Sem diferenças')
+    if args.saida:
+        print(f"Diferenças exportadas para {exportar_diferencas(df, args.saida)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,32 +1,42 @@
 # database.py
-import sqlite3
-import os
 from datetime import datetime
 
-class DatabaseManager:
-    def __init__(self):
-        import os
-        import sys
-        import shutil
+from repositorio import repositorio
+import migracoes
 
-        self.connection = None
-        self.db_file = "escala_trabalho.db"
-        self.dias_semana = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sábado', 'Domingo']
+# Observadores de alterações aos dados de entrada da escala.
+# Cada callback recebe (tabela, data_inicio, data_fim); sem datas = tudo.
+_observadores = []
+
+def registar_observador(callback):
+    if callback not in _observadores:
+        _observadores.append(callback)
 
-        # === CÓPIA AUTOMÁTICA DA BD NO EXECUTÁVEL ===
-        if getattr(sys, 'frozen', False):  # Roda como executável (PyInstaller)
-            bundle_dir = sys._MEIPASS
-            bundled_db = os.path.join(bundle_dir, 'escala_trabalho.db')
-            if os.path.exists(bundled_db) and not os.path.exists(self.db_file):
-                shutil.copy(bundled_db, self.db_file)
-        # ===========================================
+def remover_observador(callback):
+    if callback in _observadores:
+        _observadores.remove(callback)
 
+def notificar_alteracao(tabela, inicio=None, fim=None):
+    for callback in list(_observadores):
+        try:
+            callback(tabela, inicio, fim)
+        except Exception as e:
+            print(f"Erro ao notificar alteração: {e}")
+
+class DatabaseManager:
+    def __init__(self, db_file="escala_trabalho.db"):
+        self.db_file = db_file
+        self.dias_semana = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
+        self._ids_pessoas = None
+        self.repo = None
+        self.connection = None
         self.connect()
     
     def connect(self):
         try:
-            self.connection = sqlite3.connect(self.db_file)
-            self.connection.row_factory = sqlite3.Row
+            # Ligação partilhada do processo (ver repositorio.py)
+            self.repo = repositorio(self.db_file)
+            self.connection = self.repo.conn
             self.create_tables()
             return True
         except Exception as e:
@@ -34,135 +44,18 @@ class DatabaseManager:
             return False
     
     def create_tables(self):
-        tables = [
-            """CREATE TABLE IF NOT EXISTS pessoas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome TEXT NOT NULL UNIQUE,
-                horas_diarias INTEGER DEFAULT 8,
-                cor_hex TEXT DEFAULT '#FFFFFF',
-                ativo BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )""",
-            
-            """CREATE TABLE IF NOT EXISTS ferias (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                pessoa_id INTEGER NOT NULL,
-                data_inicio DATE NOT NULL,
-                data_fim DATE NOT NULL,
-                descricao TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (pessoa_id) REFERENCES pessoas(id) ON DELETE CASCADE
-            )""",
-            
-            """CREATE TABLE IF NOT EXISTS horarios_fixos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                pessoa_id INTEGER NOT NULL,
-                data DATE NOT NULL,
-                horario TEXT NOT NULL,
-                descricao TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (pessoa_id) REFERENCES pessoas(id) ON DELETE CASCADE,
-                UNIQUE(pessoa_id, data)
-            )""",
-            
-            """CREATE TABLE IF NOT EXISTS folgas_ciclo (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                pessoa_id INTEGER NOT NULL,
-                semana_referencia INTEGER NOT NULL,
-                dia_semana INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (pessoa_id) REFERENCES pessoas(id) ON DELETE CASCADE,
-                UNIQUE(pessoa_id, semana_referencia, dia_semana)
-            )""",
-            
-            """CREATE TABLE IF NOT EXISTS dias_loja_fechada (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                data DATE NOT NULL UNIQUE,
-                descricao TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )""",
-            
-            """CREATE TABLE IF NOT EXISTS escalas_geradas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                data_inicio DATE NOT NULL,
-                num_semanas INTEGER NOT NULL,
-                data_geracao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                descricao TEXT,
-                UNIQUE(data_inicio, num_semanas)
-            )""",
-            
-            """CREATE TABLE IF NOT EXISTS escala_detalhes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                escala_id INTEGER NOT NULL,
-                pessoa_id INTEGER NOT NULL,
-                data DATE NOT NULL,
-                horario TEXT NOT NULL,
-                dia_semana INTEGER NOT NULL,
-                semana_numero INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (escala_id) REFERENCES escalas_geradas(id) ON DELETE CASCADE,
-                FOREIGN KEY (pessoa_id) REFERENCES pessoas(id) ON DELETE CASCADE,
-                UNIQUE(escala_id, pessoa_id, data)
-            )"""
-        ]
-        
-        cursor = self.connection.cursor()
-        for table in tables:
-            try:
-                cursor.execute(table)
-            except Exception as e:
-                print(f"Erro ao criar tabela: {e}")
-        self.connection.commit()
-        
-        # Inserir dados iniciais
-        self.initialize_data()
-    
-    def initialize_data(self):
-        # Verificar se já existem dados
-        cursor = self.connection.cursor()
-        cursor.execute("SELECT COUNT(*) FROM pessoas")
-        if cursor.fetchone()[0] == 0:
-            # Inserir pessoas
-            pessoas = [
-                ('Susana A.', 8, '#E8F5E8'),
-                ('António C.', 8, '#FFF3CD'),
-                ('Antónia F.', 8, '#D4EDDA'),
-                ('Magda G.', 8, '#CCE5FF'),
-                ('Eduardo S.', 8, '#F0E6FF')
-            ]
-            
-            cursor.executemany(
-                "INSERT OR IGNORE INTO pessoas (nome, horas_diarias, cor_hex) VALUES (?, ?, ?)",
-                pessoas
-            )
-            
-            # Inserir dias em que a loja está fechada
-            dias_fechada = [
-                ('2025-12-25', 'Natal'),
-                ('2026-01-01', 'Ano Novo')
-            ]
-            
-            cursor.executemany(
-                "INSERT OR IGNORE INTO dias_loja_fechada (data, descricao) VALUES (?, ?)",
-                dias_fechada
-            )
-            
-            self.connection.commit()
+        """Cria ou atualiza o esquema (só na primeira ligação do processo; ver migracoes.py)"""
+        migracoes.migrar(self.repo)
     
     def execute_query(self, query, params=None, fetch=False):
         try:
-            if self.connection is None:
+            if self.repo is None:
                 self.connect()
             
-            cursor = self.connection.cursor()
-            cursor.execute(query, params or ())
-            
             if fetch:
-                result = [dict(row) for row in cursor.fetchall()]
-                return result
-            else:
-                self.connection.commit()
-                return True
+                return self.repo.consultar_dicts(query, params or ())
+            self.repo.executar(query, params or ())
+            return True
                 
         except Exception as e:
             print(f"Erro na query: {e}")
@@ -189,7 +82,7 @@ class DatabaseManager:
         """, fetch=True)
     
     def get_folgas_ciclo(self, pessoa_id):
-        """Obtém as folgas do ciclo para uma pessoa (nova estrutura)"""
+        """Exceções por semana ao ciclo de folgas de uma pessoa (regras em ciclos_folgas)"""
         return self.execute_query("""
             SELECT semana_id, dia_semana 
             FROM folgas_ciclo 
@@ -200,50 +93,93 @@ class DatabaseManager:
     def get_dias_loja_fechada(self):
         return self.execute_query("SELECT data FROM dias_loja_fechada", fetch=True)
     
-    def save_escala(self, data_inicio, num_semanas, schedule_data):
+    def get_ids_pessoas(self, recarregar=False):
+        """Mapa nome -> id de todas as pessoas (uma só query, guardado em cache)"""
+        if self._ids_pessoas is None or recarregar:
+            self._ids_pessoas = dict(self.repo.consultar("SELECT nome, id FROM pessoas"))
+        return self._ids_pessoas
+
+    def save_escala(self, data_inicio, num_semanas, schedule_data, descricao=None):
+        """Guarda uma escala gerada (registos por dia ou ScheduleStore) numa só transação.
+
+        Cada gravação é uma nova versão e as anteriores mantêm-se para
+        comparação. Se a escala for igual à última versão do mesmo horizonte
+        (ex.: lida da cache), não se grava de novo e devolve-se o id dessa
+        versão. Devolve o id da escala guardada, ou False em caso de erro.
+        """
+        colunas_meta = ('Semana', 'Data', 'Dia', 'Data_obj')
+        indice_dia = {dia: i for i, dia in enumerate(self.dias_semana)}
         try:
-            # Salvar escala principal
-            cursor = self.connection.cursor()
-            cursor.execute("""
-                INSERT OR REPLACE INTO escalas_geradas (data_inicio, num_semanas, descricao) 
-                VALUES (?, ?, ?)
-            """, (data_inicio, num_semanas, f"Escala gerada em {datetime.now()}"))
-            
-            escala_id = cursor.lastrowid
-            
-            # Salvar detalhes da escala
-            for registro in schedule_data:
+            ids = self.get_ids_pessoas()
+            registos = list(schedule_data)
+            pessoas = [p for p in (registos[0] if registos else {}) if p not in colunas_meta]
+            if any(p not in ids for p in pessoas):
+                # Pessoa criada depois de a cache ser preenchida
+                ids = self.get_ids_pessoas(recarregar=True)
+
+            detalhes = []
+            for registro in registos:
+                data = registro['Data_obj'].strftime('%Y-%m-%d')
+                dia_semana = indice_dia[registro['Dia']]
                 for pessoa_nome, horario in registro.items():
-                    if pessoa_nome not in ['Semana', 'Data', 'Dia', 'Data_obj']:
-                        # Obter ID da pessoa
-                        pessoa_result = self.execute_query(
-                            "SELECT id FROM pessoas WHERE nome = ?", 
-                            (pessoa_nome,), 
-                            fetch=True
-                        )
-                        
-                        if pessoa_result:
-                            pessoa_id = pessoa_result[0]['id']
-                            
-                            cursor.execute("""
-                                INSERT OR REPLACE INTO escala_detalhes 
-                                (escala_id, pessoa_id, data, horario, dia_semana, semana_numero) 
-                                VALUES (?, ?, ?, ?, ?, ?)
-                            """, (
-                                escala_id, 
-                                pessoa_id, 
-                                registro['Data_obj'].strftime('%Y-%m-%d'),
-                                str(horario),
-                                self.dias_semana.index(registro['Dia']),
-                                registro['Semana']
-                            ))
-            
-            self.connection.commit()
-            return True
+                    if pessoa_nome in colunas_meta or horario is None or pessoa_nome not in ids:
+                        continue
+                    detalhes.append((ids[pessoa_nome], data, str(horario), dia_semana, registro['Semana']))
+
+            with self.repo.transacao() as conn:
+                cursor = conn.cursor()
+                ultima = self.ultima_versao(data_inicio, num_semanas, conn)
+                if ultima is not None:
+                    guardados = set(cursor.execute(
+                        "SELECT pessoa_id, data, horario FROM escala_detalhes WHERE escala_id = ?", (ultima,)))
+                    if guardados == {d[:3] for d in detalhes}:
+                        return ultima
+
+                cursor.execute("""
+                    INSERT INTO escalas_geradas (data_inicio, num_semanas, descricao)
+                    VALUES (?, ?, ?)
+                """, (data_inicio, num_semanas, descricao or f"Escala gerada em {datetime.now():%d/%m/%Y %H:%M}"))
+                escala_id = cursor.lastrowid
+                cursor.executemany("""
+                    INSERT INTO escala_detalhes
+                    (escala_id, pessoa_id, data, horario, dia_semana, semana_numero)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, [(escala_id,) + d for d in detalhes])
+            return escala_id
         except Exception as e:
             print(f"Erro ao salvar escala: {e}")
             return False
+
+    def ultima_versao(self, data_inicio, num_semanas, conn=None):
+        """Id da versão mais recente guardada para o horizonte, ou None"""
+        conn = conn or self.repo.leitura()
+        return conn.execute("SELECT MAX(id) FROM escalas_geradas WHERE data_inicio = ? AND num_semanas = ?",
+                            (data_inicio, num_semanas)).fetchone()[0]
+
+    def get_escalas_geradas(self):
+        """Escalas guardadas, da mais recente para a mais antiga"""
+        return self.execute_query("""
+            SELECT id, data_inicio, num_semanas, data_geracao, descricao
+            FROM escalas_geradas
+            ORDER BY data_geracao DESC, id DESC
+        """, fetch=True)
+
+    def load_escala(self, escala_id):
+        """Cabeçalho da escala guardada e tuplas (data, nome, horario) ordenadas por data"""
+        cabecalho = self.repo.consultar_dicts("SELECT id, data_inicio, num_semanas, data_geracao, descricao "
+                                              "FROM escalas_geradas WHERE id = ?", (escala_id,))
+        if not cabecalho:
+            return None, []
+        detalhes = self.repo.consultar("""
+            SELECT d.data, p.nome, d.horario
+            FROM escala_detalhes d
+            JOIN pessoas p ON p.id = d.pessoa_id
+            WHERE d.escala_id = ?
+            ORDER BY d.data
+        """, (escala_id,))
+        return cabecalho[0], detalhes
     
     def close(self):
-        if self.connection:
-            self.connection.close()
\ No newline at end of file
+        # A ligação é partilhada pelo processo (repositorio.fechar_todos ao sair)
+        self.connection = None
+        self.repo = None
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Conversão de datas partilhada pelos módulos.
+
+Na base de dados as datas continuam em TEXT 'AAAA-MM-DD' (legíveis e
+editadas pelos diálogos), mas as tabelas de entrada da escala têm colunas
+geradas com o ordinal do dia (o mesmo de date.toordinal), indexadas
+(migração 4). As consultas por intervalo comparam inteiros pelo índice e o
+Python recebe ordinais, convertidos com date.fromordinal em vez de strptime.
+"""
+
+from datetime import date
+
+# julianday('0001-01-01') - 1: julianday(texto) - EPOCA_JULIANA == date.toordinal()
+EPOCA_JULIANA = 1721424.5
+
+
+def sql_ordinal(coluna):
+    """Expressão SQL com o ordinal do dia de uma coluna 'AAAA-MM-DD' (NULL se inválida)"""
+    return f"CAST(julianday({coluna}) - {EPOCA_JULIANA} AS INTEGER)"
+
+
+def ordinal(valor):
+    """Ordinal do dia de 'AAAA-MM-DD', date ou datetime"""
+    if isinstance(valor, str):
+        return date.fromisoformat(valor[:10]).toordinal()
+    return valor.toordinal()
+
+
+def de_ordinal(dia):
+    return date.fromordinal(dia)
+
+
+def para_data(valor):
+    """Aceita 'AAAA-MM-DD', date ou datetime (devolvido sem alterações)"""
+    if isinstance(valor, str):
+        return date.fromisoformat(valor[:10])
+    return valor
+
+
+def limites_ano(ano):
+    """Ordinais do primeiro e do último dia do ano"""
+    ano = int(ano)
+    return date(ano, 1, 1).toordinal(), date(ano, 12, 31).toordinal()
+
+
+def dia_semana(dia):
+    """Dia da semana de um ordinal (0 = segunda; o ordinal 1 é uma segunda-feira)"""
+    return (dia - 1) % 7
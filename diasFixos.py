@@ -7,7 +7,8 @@ from PyQt5.QtWidgets import (
 from PyQt5.QtCore import Qt, QDate
 from PyQt5.QtGui import QFont, QColor
 from datetime import datetime
-from database import DatabaseManager
+from database import DatabaseManager, notificar_alteracao
+from turnos import validar_horario
 
 
 class DiasFixosDialog(QDialog):
@@ -135,9 +136,7 @@ class DiasFixosDialog(QDialog):
             self.tabela.setItem(row, 4, QTableWidgetItem(h.get('descricao', '')))
 
     def validar_horario(self, texto):
-        import re
-        pattern = r'^([0-1]?[0-9]|2[0-3]):[0-5][0-9] - ([0-1]?[0-9]|2[0-3]):[0-5][0-9]$'
-        return bool(re.match(pattern, texto.strip()))
+        return validar_horario(texto)
 
     def adicionar_horario(self):
         nome = self.combo_pessoa.currentText()
@@ -167,6 +166,7 @@ class DiasFixosDialog(QDialog):
         """, (pessoa_id, data, horario, descricao or None))
 
         if success:
+            notificar_alteracao('horarios_fixos', data)
             QMessageBox.information(self, "Sucesso", "Horário fixo adicionado!")
             self.input_horario.clear()
             self.input_descricao.clear()
@@ -223,6 +223,8 @@ class DiasFixosDialog(QDialog):
         """, (nova_data, novo_horario, nova_desc or None, horario_id))
 
         if success:
+            notificar_alteracao('horarios_fixos', data_atual)
+            notificar_alteracao('horarios_fixos', nova_data)
             QMessageBox.information(self, "Sucesso", "Horário atualizado!")
             self.carregar_horarios()
         else:
@@ -254,6 +256,7 @@ class DiasFixosDialog(QDialog):
 
         success = self.db.execute_query("DELETE FROM horarios_fixos WHERE id = ?", (horario_id,))
         if success:
+            notificar_alteracao('horarios_fixos', data)
             QMessageBox.information(self, "Sucesso", "Horário apagado!")
             self.carregar_horarios()
         else:
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Armazenamento da escala gerada indexado pelo dia do horizonte.
+
+Substitui a lista de dicionários por dia: cada pessoa tem uma coluna
+indexada pelo dia, pelo que o acesso a (dia, pessoa) é O(1) e as fatias por
+semana ou mês são intervalos contíguos de índices.
+
+Os horários são guardados como códigos de 2 bytes (array 'H') sobre um
+vocabulário partilhado, em blocos de um trimestre. Para horizontes longos
+(vários anos) os blocos terminados podem ser despejados para um ficheiro
+SQLite e relidos a pedido, mantendo em memória só os blocos mais recentes.
+"""
+
+import os
+import sqlite3
+import weakref
+from array import array
+from collections import OrderedDict
+from datetime import date, timedelta
+
+DIAS_SEMANA = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
+COLUNAS_META = ['Semana', 'Data', 'Dia']
+DIAS_BLOCO = 91  # um trimestre (13 semanas)
+
+
+def _remover_ficheiro(conn, caminho):
+    conn.close()
+    try:
+        os.remove(caminho)
+    except OSError:
+        pass
+
+
+class ScheduleStore:
+    """Escala de trabalho por dia (ordinal) e pessoa"""
+
+    def __init__(self, start_date, num_dias, pessoas, ficheiro=None, blocos_em_memoria=2):
+        self.start_date = start_date
+        self.inicio = start_date.toordinal()
+        self.num_dias = num_dias
+        self.pessoas = list(pessoas)
+        self.preenchido = bytearray(num_dias)
+        # Incrementada a cada alteração (chave das caches de estatísticas)
+        self.versao = 0
+        # Código 0 = sem horário (None)
+        self.vocabulario = [None]
+        self.codigos = {None: 0}
+        # bloco -> {pessoa: array('H')}, do menos para o mais recente
+        self.blocos = OrderedDict()
+        self.blocos_sujos = set()
+        self.blocos_em_memoria = blocos_em_memoria
+        self.conn = None
+        if ficheiro:
+            self.conn = sqlite3.connect(ficheiro, check_same_thread=False)
+            self.conn.execute('DROP TABLE IF EXISTS blocos')
+            self.conn.execute(
+                'CREATE TABLE blocos (bloco INTEGER, pessoa TEXT, dados BLOB, PRIMARY KEY (bloco, pessoa))'
+            )
+            self._finalizar = weakref.finalize(self, _remover_ficheiro, self.conn, ficheiro)
+
+    @classmethod
+    def from_rows(cls, rows, pessoas):
+        """Constrói o armazenamento a partir de registos com 'Data_obj' e uma coluna por pessoa"""
+        rows = [r for r in rows if r.get('Data_obj') is not None]
+        if not rows:
+            return None
+        inicio = min(r['Data_obj'] for r in rows)
+        fim = max(r['Data_obj'] for r in rows)
+        store = cls(inicio, fim.toordinal() - inicio.toordinal() + 1, pessoas)
+        for r in rows:
+            store.guardar_dia(store.dia(r['Data_obj']), r)
+        return store
+
+    @classmethod
+    def from_codigos(cls, start_date, num_dias, vocabulario, colunas, preenchido, ficheiro=None):
+        """Constrói o armazenamento a partir dos códigos do horizonte inteiro de cada pessoa
+        ({pessoa: array 'H'}, como os de codigos_pessoa) e do respetivo vocabulário"""
+        store = cls(start_date, num_dias, list(colunas), ficheiro=ficheiro)
+        store.vocabulario = list(vocabulario)
+        store.codigos = {texto: i for i, texto in enumerate(store.vocabulario)}
+        store.preenchido = bytearray(preenchido)
+        for n in range(-(-num_dias // DIAS_BLOCO)):
+            bloco = store.bloco(n)
+            inicio = n * DIAS_BLOCO
+            for pessoa, codigos in colunas.items():
+                bloco[pessoa][:] = codigos[inicio:inicio + len(bloco[pessoa])]
+            store.blocos_sujos.add(n)
+        store.versao += 1
+        return store
+
+    @classmethod
+    def from_detalhes(cls, start_date, num_dias, pessoas, detalhes):
+        """Constrói o armazenamento a partir de tuplas (data 'AAAA-MM-DD', pessoa, horário)
+        ordenadas por data, como as de escala_detalhes"""
+        store = cls(start_date, num_dias, pessoas)
+        data_atual = None
+        ds = {}
+        for data, nome, horario in detalhes:
+            if data != data_atual:
+                if ds:
+                    store._guardar_detalhe(data_atual, ds)
+                data_atual, ds = data, {}
+            ds[nome] = horario
+        if ds:
+            store._guardar_detalhe(data_atual, ds)
+        return store
+
+    def copia(self):
+        """Cópia em memória (sem ficheiro de blocos) com os mesmos códigos e vocabulário"""
+        return ScheduleStore.from_codigos(self.start_date, self.num_dias, self.vocabulario,
+                                          {p: self.codigos_pessoa(p) for p in self.pessoas}, self.preenchido)
+
+    def _guardar_detalhe(self, data, ds):
+        dia = date.fromisoformat(data).toordinal() - self.inicio
+        if 0 <= dia < self.num_dias:
+            self.guardar_dia(dia, ds)
+
+    def fechar(self):
+        """Apaga o ficheiro de blocos (se existir)"""
+        if self.conn is not None:
+            self._finalizar()
+            self.conn = None
+
+    # ------------------------------------------------------------------
+    # Blocos e códigos
+    # ------------------------------------------------------------------
+    def codigo(self, horario):
+        c = self.codigos.get(horario)
+        if c is None:
+            c = len(self.vocabulario)
+            self.vocabulario.append(horario)
+            self.codigos[horario] = c
+        return c
+
+    def bloco(self, n):
+        """Colunas do bloco n (carregadas do ficheiro se tiverem sido despejadas)"""
+        bloco = self.blocos.get(n)
+        if bloco is not None:
+            self.blocos.move_to_end(n)
+            return bloco
+        bloco = {}
+        if self.conn is not None:
+            for pessoa, dados in self.conn.execute('SELECT pessoa, dados FROM blocos WHERE bloco = ?', (n,)):
+                coluna = array('H')
+                coluna.frombytes(dados)
+                bloco[pessoa] = coluna
+        tamanho = min(DIAS_BLOCO, self.num_dias - n * DIAS_BLOCO)
+        for pessoa in self.pessoas:
+            if pessoa not in bloco:
+                bloco[pessoa] = array('H', bytes(2 * tamanho))
+        self.blocos[n] = bloco
+        self._despejar()
+        return bloco
+
+    def _despejar(self):
+        """Escreve no ficheiro os blocos menos usados que excedam o limite em memória"""
+        if self.conn is None:
+            return
+        while len(self.blocos) > self.blocos_em_memoria:
+            n, bloco = self.blocos.popitem(last=False)
+            if n in self.blocos_sujos:
+                self.conn.executemany(
+                    'INSERT OR REPLACE INTO blocos (bloco, pessoa, dados) VALUES (?, ?, ?)',
+                    [(n, pessoa, coluna.tobytes()) for pessoa, coluna in bloco.items()]
+                )
+                self.conn.commit()
+                self.blocos_sujos.discard(n)
+
+    # ------------------------------------------------------------------
+    # Índices
+    # ------------------------------------------------------------------
+    def __len__(self):
+        return sum(self.preenchido)
+
+    def dia(self, data):
+        """Índice do dia dentro do horizonte"""
+        return data.toordinal() - self.inicio
+
+    def data(self, dia):
+        return self.start_date + timedelta(days=dia)
+
+    def semana_numero(self, dia):
+        """Número da semana (1, 2, ...) contado a partir da data de início"""
+        return dia // 7 + 1
+
+    @property
+    def num_semanas(self):
+        return -(-self.num_dias // 7)
+
+    def dias_semana(self, semana):
+        """Intervalo de dias da semana (1, 2, ...) do horizonte"""
+        inicio = (semana - 1) * 7
+        return range(max(inicio, 0), min(inicio + 7, self.num_dias))
+
+    def dias_mes(self, ano, mes):
+        """Intervalo de dias do mês indicado que caem dentro do horizonte"""
+        primeiro = self.start_date.replace(year=ano, month=mes, day=1)
+        seguinte = primeiro.replace(year=ano + mes // 12, month=mes % 12 + 1)
+        return range(max(self.dia(primeiro), 0), min(self.dia(seguinte), self.num_dias))
+
+    # ------------------------------------------------------------------
+    # Células
+    # ------------------------------------------------------------------
+    def get(self, dia, pessoa, default=None):
+        if not 0 <= dia < self.num_dias or pessoa not in self.pessoas:
+            return default
+        valor = self.vocabulario[self.bloco(dia // DIAS_BLOCO)[pessoa][dia % DIAS_BLOCO]]
+        return default if valor is None else valor
+
+    def set(self, dia, pessoa, horario):
+        if pessoa not in self.pessoas:
+            self.pessoas.append(pessoa)
+            for n in list(self.blocos):
+                self.blocos[n][pessoa] = array('H', bytes(2 * len(next(iter(self.blocos[n].values())))))
+        n = dia // DIAS_BLOCO
+        self.bloco(n)[pessoa][dia % DIAS_BLOCO] = self.codigo(horario)
+        self.blocos_sujos.add(n)
+        self.preenchido[dia] = 1
+        self.versao += 1
+
+    def guardar_dia(self, dia, ds):
+        """Copia os horários de um dicionário de dia (pessoa -> horário)"""
+        n = dia // DIAS_BLOCO
+        bloco = self.bloco(n)
+        i = dia % DIAS_BLOCO
+        for pessoa, coluna in bloco.items():
+            coluna[i] = self.codigo(ds.get(pessoa))
+        self.blocos_sujos.add(n)
+        self.preenchido[dia] = 1
+        self.versao += 1
+
+    def codigos_pessoa(self, pessoa):
+        """Códigos (array 'H') da pessoa para o horizonte inteiro, bloco a bloco"""
+        codigos = array('H')
+        for n in range(-(-self.num_dias // DIAS_BLOCO)):
+            bloco = self.bloco(n)
+            if pessoa in bloco:
+                codigos.extend(bloco[pessoa])
+            else:
+                codigos.frombytes(bytes(2 * min(DIAS_BLOCO, self.num_dias - n * DIAS_BLOCO)))
+        return codigos
+
+    def coluna(self, pessoa):
+        """Horários de uma pessoa para os dias preenchidos"""
+        if pessoa not in self.pessoas:
+            return []
+        return [self.get(d, pessoa) for d in self.dias_preenchidos()]
+
+    # ------------------------------------------------------------------
+    # Iteração para DataFrame, tabela e Excel
+    # ------------------------------------------------------------------
+    def dias_preenchidos(self, dias=None):
+        dias = range(self.num_dias) if dias is None else dias
+        return [d for d in dias if self.preenchido[d]]
+
+    def valores(self, dia, pessoas):
+        """Horários do dia para as pessoas indicadas (None se não houver)"""
+        bloco = self.bloco(dia // DIAS_BLOCO)
+        i = dia % DIAS_BLOCO
+        vocabulario = self.vocabulario
+        return [vocabulario[bloco[p][i]] if p in bloco else None for p in pessoas]
+
+    def linha(self, dia):
+        """Registo do dia no formato antigo (Semana, Data, Dia, Data_obj + pessoas)"""
+        data = self.data(dia)
+        registo = {
+            'Semana': self.semana_numero(dia),
+            'Data': data.strftime('%d/%m/%Y'),
+            'Dia': DIAS_SEMANA[dia % 7],
+            'Data_obj': data
+        }
+        registo.update(zip(self.pessoas, self.valores(dia, self.pessoas)))
+        return registo
+
+    def __getitem__(self, dia):
+        return self.linha(dia)
+
+    def __iter__(self):
+        for dia in self.dias_preenchidos():
+            yield self.linha(dia)
+
+    def linhas(self, dias):
+        for dia in self.dias_preenchidos(dias):
+            yield self.linha(dia)
+
+    def rows(self, pessoas=None, dias=None):
+        """Tuplas (Semana, Data, Dia, horário de cada pessoa...) prontas para exportar.
+
+        É um gerador: percorre os blocos por ordem, sem materializar o horizonte.
+        """
+        pessoas = self.pessoas if pessoas is None else pessoas
+        for dia in self.dias_preenchidos(dias):
+            yield (self.semana_numero(dia), self.data(dia).strftime('%d/%m/%Y'), DIAS_SEMANA[dia % 7]) + \
+                tuple(self.valores(dia, pessoas))
+
+    def columns(self, pessoas=None):
+        """Dicionário coluna -> lista de valores, pela ordem de COLUNAS_META + pessoas"""
+        pessoas = self.pessoas if pessoas is None else pessoas
+        dias = self.dias_preenchidos()
+        dados = {
+            'Semana': [self.semana_numero(d) for d in dias],
+            'Data': [self.data(d).strftime('%d/%m/%Y') for d in dias],
+            'Dia': [DIAS_SEMANA[d % 7] for d in dias],
+        }
+        for pessoa in pessoas:
+            dados[pessoa] = []
+        for d in dias:
+            for pessoa, valor in zip(pessoas, self.valores(d, pessoas)):
+                dados[pessoa].append(valor)
+        return dados
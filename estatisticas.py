@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Estatísticas da escala gerada calculadas numa só passagem (NumPy).
+
+Cada código do vocabulário é convertido uma vez em minutos de trabalho e
+indicadores (trabalho, turno cedo, turno tarde, folga, férias); as contagens
+por pessoa, semana e mês obtêm-se por indexação da matriz de códigos
+dias × pessoas, sem ciclos por célula. As horas são as reais de cada turno,
+incluindo dias fixos, e os dias de loja fechada (com qualquer descrição) não
+contam como trabalho.
+
+O resultado fica memorizado por escala e versão: enquanto a escala não muda,
+o separador de resumo e o Excel reutilizam o mesmo cálculo.
+"""
+
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from turnos import Shift
+
+HORA_CEDO = 8    # turno cedo: começa antes das 08:00
+HORA_TARDE = 20  # turno tarde: acaba às 20:00 ou depois
+
+COLUNAS_PESSOA = ['Dias de trabalho', 'Horas', 'Dias ao fim de semana',
+                  'Turnos cedo', 'Turnos tarde', 'Folgas', 'Férias']
+
+
+def tabela_vocabulario(vocabulario):
+    """Arrays indexados pelo código: minutos de trabalho e indicadores de cada horário"""
+    turnos = [Shift.parse(texto) for texto in vocabulario]
+    trabalho = np.array([t.is_trabalho for t in turnos], dtype=bool)
+    return {
+        'minutos': np.array([t.minutos for t in turnos], dtype=np.int32),
+        'trabalho': trabalho,
+        'cedo': trabalho & np.array([t.inicio < HORA_CEDO * 60 for t in turnos], dtype=bool),
+        'tarde': trabalho & np.array([t.fim >= HORA_TARDE * 60 for t in turnos], dtype=bool),
+        'folga': np.array([t.tipo == Shift.FOLGA for t in turnos], dtype=bool),
+        'ferias': np.array([t.tipo == Shift.FERIAS for t in turnos], dtype=bool),
+    }
+
+
+class ScheduleStatistics:
+    """Totais por pessoa, semana e mês de uma versão da escala"""
+
+    def __init__(self, store, pessoas=None):
+        self.store = store
+        self.versao = store.versao
+        self.pessoas = list(store.pessoas if pessoas is None else pessoas)
+        self.dias = np.array(store.dias_preenchidos(), dtype=np.int64)
+
+        codigos = np.zeros((store.num_dias, len(self.pessoas)), dtype=np.uint16)
+        for j, pessoa in enumerate(self.pessoas):
+            codigos[:, j] = np.frombuffer(store.codigos_pessoa(pessoa), dtype=np.uint16)
+        codigos = codigos[self.dias]
+
+        tabela = tabela_vocabulario(store.vocabulario)
+        self.horas = tabela['minutos'][codigos] / 60.0
+        trabalho = tabela['trabalho'][codigos]
+        fim_semana = (self.dias % 7 >= 5)[:, None]
+
+        self.por_pessoa = pd.DataFrame({
+            'Dias de trabalho': trabalho.sum(axis=0),
+            'Horas': self.horas.sum(axis=0),
+            'Dias ao fim de semana': (trabalho & fim_semana).sum(axis=0),
+            'Turnos cedo': tabela['cedo'][codigos].sum(axis=0),
+            'Turnos tarde': tabela['tarde'][codigos].sum(axis=0),
+            'Folgas': tabela['folga'][codigos].sum(axis=0),
+            'Férias': tabela['ferias'][codigos].sum(axis=0),
+        }, index=pd.Index(self.pessoas, name='Pessoa'), columns=COLUNAS_PESSOA)
+
+        horas = pd.DataFrame(self.horas, columns=self.pessoas)
+        self.por_semana = horas.groupby(pd.Index(self.dias // 7 + 1, name='Semana')).sum()
+        datas = np.datetime64(store.data(0), 'D') + self.dias
+        meses = pd.PeriodIndex(datas.astype('datetime64[M]'), freq='M', name='Mês')
+        self.por_mes = horas.groupby(meses).sum()
+
+    def pessoa(self, nome):
+        """Estatísticas de uma pessoa como dicionário"""
+        return self.por_pessoa.loc[nome].to_dict()
+
+
+_memo = weakref.WeakKeyDictionary()
+
+
+def estatisticas(store, pessoas=None):
+    """Estatísticas da escala; só são recalculadas quando a versão da escala muda"""
+    chave = (store.versao, tuple(store.pessoas if pessoas is None else pessoas))
+    em_cache = _memo.get(store)
+    if em_cache is None or em_cache[0] != chave:
+        em_cache = (chave, ScheduleStatistics(store, pessoas))
+        _memo[store] = em_cache
+    return em_cache[1]
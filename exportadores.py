@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Exportadores rápidos da escala gerada: CSV, Parquet e iCalendar (.ics).
+
+Trabalham diretamente sobre o ScheduleStore (sem construir o DataFrame) e
+podem ser usados sem interface gráfica. O Parquet precisa do pyarrow, que é
+opcional: só é importado quando se exporta para esse formato.
+
+Uso (comparação de tempos com o Excel):
+    python exportadores.py --inicio 2025-09-29 --semanas 52 --saida exportacoes
+"""
+
+import os
+import csv
+import sys
+import time
+import argparse
+from datetime import datetime, timedelta, timezone
+
+from escalaDados import COLUNAS_META, DIAS_SEMANA
+from turnos import Shift
+
+
+def exportar_csv(store, pessoas, filename, delimiter=';'):
+    """Escreve a escala em CSV (mesmas colunas do Excel), linha a linha"""
+    with open(filename, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f, delimiter=delimiter)
+        writer.writerow(COLUNAS_META + list(pessoas))
+        writer.writerows(store.rows(pessoas))
+    return filename
+
+
+def exportar_parquet(store, pessoas, filename):
+    """Escreve a escala em Parquet: uma coluna por pessoa codificada por dicionário.
+
+    Os códigos do ScheduleStore são usados diretamente como índices do
+    dicionário (o vocabulário da escala), sem converter célula a célula.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("A exportação para Parquet precisa do pacote 'pyarrow' (pip install pyarrow)")
+
+    dias = store.dias_preenchidos()
+    # O código 0 (sem horário) fica nulo; os restantes indexam o vocabulário a partir de 1
+    vocabulario = pa.array(store.vocabulario[1:], type=pa.string())
+    indices_dias = pa.array(dias, type=pa.int32())
+
+    colunas = {
+        'Semana': pa.array([store.semana_numero(d) for d in dias], type=pa.int16()),
+        'Data': pa.array([_data(store.data(d)) for d in dias], type=pa.date32()),
+        'Dia': pa.DictionaryArray.from_arrays(pa.array([d % 7 for d in dias], type=pa.int8()),
+                                              pa.array(DIAS_SEMANA)),
+    }
+    for pessoa in pessoas:
+        codigos = pa.array(store.codigos_pessoa(pessoa), type=pa.uint16()).take(indices_dias).cast(pa.int32())
+        indices = pc.if_else(pc.equal(codigos, 0), None, pc.subtract(codigos, 1))
+        colunas[pessoa] = pa.DictionaryArray.from_arrays(indices.cast(pa.int16()), vocabulario)
+
+    pq.write_table(pa.table(colunas), filename)
+    return filename
+
+
+def _data(valor):
+    return valor.date() if isinstance(valor, datetime) else valor
+
+
+def _ics_texto(texto):
+    return str(texto).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _nome_ficheiro(pessoa):
+    return ''.join(c if c.isalnum() else '_' for c in pessoa).strip('_')
+
+
+def exportar_ics(store, pessoas, pasta, prefixo='escala'):
+    """Escreve um calendário iCalendar por pessoa com os turnos e as férias.
+
+    Devolve a lista de ficheiros criados. As horas são locais (sem fuso),
+    como na escala.
+    """
+    os.makedirs(pasta, exist_ok=True)
+    carimbo = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    ficheiros = []
+    for pessoa in pessoas:
+        filename = os.path.join(pasta, f"{prefixo}_{_nome_ficheiro(pessoa)}.ics")
+        uid_pessoa = _nome_ficheiro(pessoa).lower()
+        with open(filename, 'w', newline='', encoding='utf-8') as f:
+            f.write('BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//Escalas de Trabalho//PT\r\n')
+            f.write(f'X-WR-CALNAME:{_ics_texto(pessoa)}\r\n')
+            for dia in store.dias_preenchidos():
+                turno = Shift.parse(store.get(dia, pessoa))
+                data = store.data(dia)
+                if turno.is_trabalho:
+                    inicio = datetime(data.year, data.month, data.day) + timedelta(minutes=turno.inicio)
+                    fim = datetime(data.year, data.month, data.day) + timedelta(minutes=turno.fim)
+                    datas = (f'DTSTART:{inicio:%Y%m%dT%H%M%S}\r\n'
+                             f'DTEND:{fim:%Y%m%dT%H%M%S}\r\n')
+                    resumo = f'Turno {turno.texto}'
+                elif turno.tipo == Shift.FERIAS:
+                    datas = (f'DTSTART;VALUE=DATE:{data:%Y%m%d}\r\n'
+                             f'DTEND;VALUE=DATE:{data + timedelta(days=1):%Y%m%d}\r\n')
+                    resumo = 'Férias'
+                else:
+                    continue
+                f.write('BEGIN:VEVENT\r\n'
+                        f'UID:{data:%Y%m%d}-{uid_pessoa}@escalas\r\n'
+                        f'DTSTAMP:{carimbo}\r\n'
+                        f'{datas}'
+                        f'SUMMARY:{_ics_texto(resumo)}\r\n'
+                        'END:VEVENT\r\n')
+            f.write('END:VCALENDAR\r\n')
+        ficheiros.append(filename)
+    return ficheiros
+
+
+# Formato -> função (store, pessoas, destino)
+EXPORTADORES = {
+    'csv': exportar_csv,
+    'parquet': exportar_parquet,
+    'ics': exportar_ics,
+}
+
+
+def medir_exportacoes(generator, pasta, formatos=('xlsx', 'csv', 'parquet', 'ics')):
+    """Exporta a escala do gerador em cada formato e devolve {formato: segundos}"""
+    os.makedirs(pasta, exist_ok=True)
+    pessoas = list(generator.pessoas.keys())
+    tempos = {}
+    for formato in formatos:
+        destino = os.path.join(pasta, 'ics' if formato == 'ics' else f'escala.{formato}')
+        inicio = time.perf_counter()
+        try:
+            if formato == 'xlsx':
+                generator.export_to_excel(destino)
+            else:
+                EXPORTADORES[formato](generator.schedule_data, pessoas, destino)
+        except RuntimeError as e:
+            print(f"{formato}: {e}")
+            continue
+        tempos[formato] = time.perf_counter() - inicio
+    return tempos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Mede os tempos de exportação da escala em cada formato')
+    parser.add_argument('--inicio', default='2026-03-16', help='data de início (AAAA-MM-DD)')
+    parser.add_argument('--semanas', type=int, default=52, help='número de semanas')
+    parser.add_argument('--saida', default='exportacoes', help='pasta de destino')
+    parser.add_argument('--db', default='escala_trabalho.db', help='base de dados')
+    args = parser.parse_args(argv)
+
+    from gerador import WorkScheduleGenerator
+    generator = WorkScheduleGenerator(args.db)
+    generator.start_date = datetime.strptime(args.inicio, '%Y-%m-%d')
+    generator.num_semanas = args.semanas
+    generator.generate_schedule()
+    for formato, segundos in medir_exportacoes(generator, args.saida).items():
+        print(f"{formato:<8} {segundos * 1000:8.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,8 +6,8 @@ from PyQt5.QtWidgets import (
 )
 from PyQt5.QtCore import Qt, QDate
 from PyQt5.QtGui import QFont, QColor
-from datetime import datetime
-from database import DatabaseManager
+from database import DatabaseManager, notificar_alteracao
+from datas import ordinal
 
 
 class FeriasDialog(QDialog):
@@ -144,16 +144,15 @@ class FeriasDialog(QDialog):
 
         pessoa_id = self.pessoas[nome]
 
-        # Verificar sobreposição
-        for f in self.ferias_cache:
-            if f['nome'] == nome:
-                fi = datetime.strptime(f['data_inicio'], '%Y-%m-%d').date()
-                ff = datetime.strptime(f['data_fim'], '%Y-%m-%d').date()
-                ni = datetime.strptime(inicio, '%Y-%m-%d').date()
-                nf = datetime.strptime(fim, '%Y-%m-%d').date()
-                if not (nf < fi or ni > ff):
-                    QMessageBox.warning(self, "Sobreposição", f"Férias já existem entre {f['data_inicio']} e {f['data_fim']}")
-                    return
+        # Verificar sobreposição (pelo índice de ordinais da pessoa)
+        sobreposta = self.db.repo.consultar_um("""
+            SELECT data_inicio, data_fim FROM ferias
+            WHERE pessoa_id = ? AND inicio_dia <= ? AND fim_dia >= ?
+            ORDER BY inicio_dia LIMIT 1
+        """, (pessoa_id, ordinal(fim), ordinal(inicio)))
+        if sobreposta:
+            QMessageBox.warning(self, "Sobreposição", f"Férias já existem entre {sobreposta[0]} e {sobreposta[1]}")
+            return
 
         success = self.db.execute_query("""
             INSERT INTO ferias (pessoa_id, data_inicio, data_fim, descricao)
@@ -161,6 +160,7 @@ class FeriasDialog(QDialog):
         """, (pessoa_id, inicio, fim, descricao or None))
 
         if success:
+            notificar_alteracao('ferias', inicio, fim)
             QMessageBox.information(self, "Sucesso", "Férias adicionadas!")
             self.input_descricao.clear()
             self.carregar_ferias()
@@ -212,6 +212,8 @@ class FeriasDialog(QDialog):
         """, (novo_inicio, novo_fim, nova_desc or None, ferias_id))
 
         if success:
+            notificar_alteracao('ferias', inicio.toString('yyyy-MM-dd'), fim.toString('yyyy-MM-dd'))
+            notificar_alteracao('ferias', novo_inicio, novo_fim)
             QMessageBox.information(self, "Sucesso", "Férias atualizadas!")
             self.carregar_ferias()
         else:
@@ -243,6 +245,7 @@ class FeriasDialog(QDialog):
 
         success = self.db.execute_query("DELETE FROM ferias WHERE id = ?", (ferias_id,))
         if success:
+            notificar_alteracao('ferias', inicio, fim)
             QMessageBox.information(self, "Sucesso", "Férias apagadas!")
             self.carregar_ferias()
         else:
@@ -2,14 +2,13 @@ from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QTableWidget, QT
 from PyQt5.QtCore import Qt, QDate
 from PyQt5.QtGui import QFont, QColor
 from datetime import datetime, timedelta, date
-from database import DatabaseManager
+from database import DatabaseManager, notificar_alteracao
+from ciclosFolgas import semana_id_de, segunda_de, folgas_da_pessoa, gravar_ciclos, gravar_excecoes
 
 # === FUNÇÕES AUXILIARES PARA SEMANAS ===
 def get_semana_id_from_date(data):
     """Converte uma data para o formato AAAASS (ex: 202540)"""
-    ano = data.year
-    numero_semana = data.isocalendar()[1]  # ISO week number
-    return f"{ano}{numero_semana:02d}"
+    return semana_id_de(data)
 
 def get_semana_id_formatado(semana_id):
     """Formata AAAASS para AAAA-WSS (ex: 202540 → 2025-W40)"""
@@ -285,16 +284,12 @@ class FolgasDialog(QDialog):
             self.pessoa_ids[pessoa] = pessoa_result[0]['id']
         pessoa_id = self.pessoa_ids[pessoa]
 
-        # Remover folgas existentes para esta semana
-        self.db.execute_query("""
-            DELETE FROM folgas_ciclo WHERE pessoa_id = ? AND semana_id = ?
-        """, (pessoa_id, semana_id))
+        # Exceção ao ciclo nesta semana (substitui a regra e as folgas anteriores)
+        gravar_excecoes(self.db.repo, {pessoa_id: {(semana_id, dia) for dia in dias_folga}},
+                        semanas={semana_id})
 
-        # Inserir novas folgas
-        for dia in dias_folga:
-            self.db.execute_query("""
-                INSERT INTO folgas_ciclo (pessoa_id, semana_id, dia_semana) VALUES (?, ?, ?)
-            """, (pessoa_id, semana_id, dia))
+        segunda = get_date_from_semana_id(semana_id)
+        notificar_alteracao('folgas_ciclo', segunda, segunda + timedelta(days=6))
 
         semana_formatada = get_semana_id_formatado(semana_id)
         QMessageBox.information(
@@ -323,45 +318,38 @@ class FolgasDialog(QDialog):
         if not ok:
             return
 
-        # Obter ID da pessoa
-        pessoa_result = self.db.execute_query(
-            "SELECT id FROM pessoas WHERE nome = ?", (pessoa,), fetch=True
+        # Só a pessoa selecionada ou toda a equipa (numa só transação)
+        opcoes = [f"Só {pessoa}", "Toda a equipa"]
+        opcao, ok = QInputDialog.getItem(
+            self, "Gerar Ciclo", "Gerar o ciclo para:", opcoes, 0, False
         )
-        if not pessoa_result:
-            QMessageBox.warning(self, "Erro", f"Pessoa {pessoa} não encontrada na base de dados!")
+        if not ok:
             return
-        pessoa_id = pessoa_result[0]['id']
+        pessoas = [pessoa] if opcao == opcoes[0] else list(self.ciclos_base)
 
-        ciclo = self.ciclos_base[pessoa]
-        tamanho_ciclo = len(ciclo)
+        # Obter IDs das pessoas
+        ids = self.db.get_ids_pessoas(recarregar=True)
+        em_falta = [p for p in pessoas if p not in ids]
+        if em_falta:
+            QMessageBox.warning(self, "Erro", f"Pessoa {', '.join(em_falta)} não encontrada na base de dados!")
+            return
 
-        # Data de referência
+        # Segunda-feira da semana de referência
         data_referencia = self.data_ref_edit.date().toPyDate()
+        ancora = data_referencia - timedelta(days=data_referencia.weekday())
 
-        # Limpar folgas existentes para esta pessoa
-        self.db.execute_query("DELETE FROM folgas_ciclo WHERE pessoa_id = ?", (pessoa_id,))
-
-        # Inserir ciclo repetitivo
-        for semana_offset in range(num_semanas):
-            # Calcular qual semana do ciclo (0, 1, 2, 3... e reinicia)
-            posicao_no_ciclo = semana_offset % tamanho_ciclo
-            dias_folga = ciclo[posicao_no_ciclo]
-
-            # Calcular semana_id para esta semana
-            data_semana = data_referencia + timedelta(weeks=semana_offset)
-            semana_id = get_semana_id_from_date(data_semana)
+        # Uma regra por pessoa em substituição das regras e exceções anteriores
+        gravar_ciclos(self.db.repo, {ids[p]: self.ciclos_base[p] for p in pessoas},
+                      ancora, num_semanas, substituir=True)
 
-            # Inserir dias de folga
-            for dia in dias_folga:
-                self.db.execute_query("""
-                    INSERT INTO folgas_ciclo (pessoa_id, semana_id, dia_semana) VALUES (?, ?, ?)
-                """, (pessoa_id, semana_id, dia))
+        notificar_alteracao('ciclos_folgas')
 
+        tamanho_ciclo = len(self.ciclos_base[pessoa])
         QMessageBox.information(
             self, "Sucesso",
-            f"Ciclo de {tamanho_ciclo} semanas gerado para {pessoa}!\n"
+            f"Ciclo gerado para {', '.join(pessoas)}!\n"
             f"Total de semanas na base de dados: {num_semanas}\n"
-            f"O ciclo repete {num_semanas // tamanho_ciclo} vezes completas."
+            f"O ciclo de {pessoa} ({tamanho_ciclo} semanas) repete {num_semanas // tamanho_ciclo} vezes completas."
         )
 
         # Carregar da base de dados para confirmar
@@ -395,17 +383,14 @@ class FolgasDialog(QDialog):
 
         # 3. Determinar data inicial
         if opcao == opcoes[0]:
-            # Última semana salva
-            ultima = self.db.execute_query("""
-                SELECT MAX(semana_id) FROM folgas_ciclo WHERE pessoa_id = ?
-            """, (pessoa_id,), fetch=True)
-            if not ultima or not ultima[0]['MAX(semana_id)']:
+            # Última semana salva (regras e exceções)
+            semanas = folgas_da_pessoa(self.db.repo.leitura(), pessoa_id).semanas_definidas()
+            if not semanas:
                 QMessageBox.information(self, "Info", "Nenhum ciclo encontrado. Usando data base atual.")
                 data_inicial = self.data_ref_edit.date().toPyDate()
+                data_inicial -= timedelta(days=data_inicial.weekday())
             else:
-                ultima_semana_id = ultima[0]['MAX(semana_id)']
-                ultima_data = get_date_from_semana_id(ultima_semana_id)
-                data_inicial = ultima_data + timedelta(weeks=1)
+                data_inicial = semanas[-1] + timedelta(weeks=1)
         else:
             # Escolher data com calendário
             dialog = QDialog(self)
@@ -461,21 +446,11 @@ class FolgasDialog(QDialog):
         if not ok:
             return
 
-        # 5. Gerar e inserir (sem apagar)
-        ciclo = self.ciclos_base[pessoa]
-        tamanho_ciclo = len(ciclo)
-
-        for semana_offset in range(num_semanas):
-            posicao_no_ciclo = semana_offset % tamanho_ciclo
-            dias_folga = ciclo[posicao_no_ciclo]
-            data_semana = data_inicial + timedelta(weeks=semana_offset)
-            semana_id = get_semana_id_from_date(data_semana)
+        # 5. Nova regra (as existentes prevalecem onde já houver ciclo)
+        gravar_ciclos(self.db.repo, {pessoa_id: self.ciclos_base[pessoa]},
+                      data_inicial, num_semanas, substituir=False)
 
-            for dia in dias_folga:
-                self.db.execute_query("""
-                    INSERT OR IGNORE INTO folgas_ciclo (pessoa_id, semana_id, dia_semana)
-                    VALUES (?, ?, ?)
-                """, (pessoa_id, semana_id, dia))
+        notificar_alteracao('ciclos_folgas', data_inicial, data_inicial + timedelta(weeks=num_semanas, days=-1))
 
         QMessageBox.information(
             self, "Sucesso",
@@ -501,35 +476,20 @@ class FolgasDialog(QDialog):
             self.pessoa_ids[pessoa] = pessoa_result[0]['id']
         pessoa_id = self.pessoa_ids[pessoa]
 
-        # Carregar folgas da base de dados
-        folgas_db = self.db.execute_query("""
-            SELECT semana_id, dia_semana FROM folgas_ciclo
-            WHERE pessoa_id = ?
-            ORDER BY semana_id, dia_semana
-        """, (pessoa_id,), fetch=True)
+        # Semanas definidas (regras e exceções) e respetivas folgas
+        folgas = folgas_da_pessoa(self.db.repo.leitura(), pessoa_id)
+        semanas = folgas.semanas_definidas()
 
-        if not folgas_db:
+        if not semanas:
             QMessageBox.information(self, "Info", f"Nenhum ciclo encontrado para {pessoa} na base de dados!")
             return
 
-        # Reconstruir ciclo a partir da base de dados
-        ciclo_reconstruido = {}
-        for folga in folgas_db:
-            semana_id = folga['semana_id']
-            dia = folga['dia_semana']
-            if semana_id not in ciclo_reconstruido:
-                ciclo_reconstruido[semana_id] = []
-            ciclo_reconstruido[semana_id].append(dia)
-
-        # Converter para lista ordenada por semana_id
-        ciclo_ordenado = []
-        for semana_id in sorted(ciclo_reconstruido.keys()):
-            ciclo_ordenado.append(sorted(ciclo_reconstruido[semana_id]))
+        ciclo_ordenado = [folgas.folgas_da_semana(segunda) for segunda in semanas]
 
         # Atualizar visualização com o ciclo reconstruído (não sobrescreve ciclos_base)
         self.atualizar_visualizacao_ciclo(ciclo_ordenado)
 
-        num_semanas = len(ciclo_reconstruido)
+        num_semanas = len(semanas)
         QMessageBox.information(
             self, "Sucesso",
             f"Ciclo carregado da base de dados para {pessoa}!\n"
@@ -608,20 +568,14 @@ class FolgasDialog(QDialog):
                 return
             self.pessoa_ids[pessoa] = pessoa_result[0]['id']
 
-        # Buscar folgas para esta semana específica
-        folgas_db = self.db.execute_query("""
-            SELECT dia_semana FROM folgas_ciclo
-            WHERE pessoa_id = ? AND semana_id = ?
-        """, (self.pessoa_ids[pessoa], semana_id), fetch=True)
+        # Folgas desta semana específica (exceção ou regra)
+        segunda = segunda_de(semana_id)
+        folgas = folgas_da_pessoa(self.db.repo.leitura(), self.pessoa_ids[pessoa])
+        dias_folga = folgas.folgas_da_semana(segunda) if segunda else []
 
-        # Limpar seleção atual
+        # Limpar seleção atual e marcar dias de folga encontrados
         self.limpar_selecao()
-
-        # Marcar dias de folga encontrados
-        dias_folga = []
-        for folga in folgas_db:
-            dia = folga['dia_semana']
-            dias_folga.append(dia)
+        for dia in dias_folga:
             if dia in self.checkboxes:
                 self.checkboxes[dia].setChecked(True)
 
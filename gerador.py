@@ -1,215 +1,258 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import os
 import sys
-import sqlite3
+import tempfile
+import numpy as np
 import pandas as pd
 import threading
 from PyQt5.QtCore import QTimer
 from datetime import datetime, timedelta
 from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
+from copy import copy
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles.fonts import DEFAULT_FONT
+from openpyxl.styles import PatternFill, Font, Alignment, Border, Side, NamedStyle
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-                             QTableWidget, QTableWidgetItem, QPushButton, QLabel,
+                             QTableView, QPushButton, QLabel,
                              QDateEdit, QSpinBox, QTabWidget, QTextEdit,
                              QMessageBox, QHeaderView, QProgressBar,
-                             QFileDialog)
-from PyQt5.QtCore import Qt, QDate, QThread, pyqtSignal
-from PyQt5.QtGui import QFont, QColor
+                             QFileDialog, QCheckBox, QInputDialog, QComboBox)
+from PyQt5.QtCore import Qt, QDate, pyqtSignal, QAbstractTableModel, QModelIndex
+from PyQt5.QtGui import QFont, QColor, QBrush
+from turnos import Shift, mascara_horas, bits_inicio
+from escalaDados import ScheduleStore, COLUNAS_META, DIAS_SEMANA
+from database import registar_observador, DatabaseManager as EscalasGuardadas
+from repositorio import repositorio
+import migracoes
+import regras
+import ciclosFolgas
+from datas import de_ordinal, para_data
+import otimizador
+import exportadores
+from cobertura import CoverageMatrix
+from estatisticas import estatisticas
+import comparacaoEscalas
+from tarefas import Job, JobWorker, PASSOS
+from cacheEscalas import ScheduleCache, caminho_cache, impressao_digital, impressoes_por_tabela
+
+# Máscaras de horas usadas nas verificações de cobertura
+INICIO_05_07 = mascara_horas(5, 6, 7)
+INICIO_05_06 = mascara_horas(5, 6)
+INICIO_11_13 = mascara_horas(11, 12, 13)
+INICIO_13 = mascara_horas(13)
 
 class DatabaseManager:
+    """Leituras das entradas do gerador, sobre a ligação partilhada (repositorio.py)"""
+
     def __init__(self, db_path='escala_trabalho.db'):
         self.db_path = db_path
+        self.repo = repositorio(db_path)
         self.init_database()
 
     def init_database(self):
-        """Inicializa a base de dados com as tabelas necessárias e garante colunas opcionais"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        # Tabela de pessoas
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS pessoas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome TEXT UNIQUE NOT NULL,
-                horas_diarias INTEGER DEFAULT 8,
-                ativo INTEGER DEFAULT 1
-            )
-        ''')
-
-        # Adicionar coluna 'cor' se não existir
-        cursor.execute("PRAGMA table_info(pessoas)")
-        columns = [col[1] for col in cursor.fetchall()]
-        if 'cor' not in columns:
-            cursor.execute('ALTER TABLE pessoas ADD COLUMN cor TEXT DEFAULT "FFFFFF"')
-
-        # Tabela de ferias
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS ferias (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                pessoa_id INTEGER,
-                data_inicio DATE NOT NULL,
-                data_fim DATE NOT NULL,
-                FOREIGN KEY (pessoa_id) REFERENCES pessoas (id)
-            )
-        ''')
-
-        # Tabela de ciclos de folgas
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS folgas_ciclo (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                pessoa_id INTEGER,
-                semana_id INTEGER,
-                dia_semana INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (pessoa_id) REFERENCES pessoas (id)
-            )
-        ''')
-
-        # Tabela de horários fixos
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS horarios_fixos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                pessoa_id INTEGER,
-                data DATE NOT NULL,
-                horario TEXT NOT NULL,
-                FOREIGN KEY (pessoa_id) REFERENCES pessoas (id)
-            )
-        ''')
-
-        # === TABELA UNIFICADA: dias_loja_fechada ===
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS dias_loja_fechada (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                data DATE UNIQUE NOT NULL,
-                descricao TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-
-        # === MIGRAÇÃO: de loja_fechada → dias_loja_fechada ===
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='loja_fechada'")
-        if cursor.fetchone():
-            # Copia dados
-            cursor.execute('''
-                INSERT OR IGNORE INTO dias_loja_fechada (data)
-                SELECT data FROM loja_fechada
-            ''')
-            # Apaga a tabela antiga
-            cursor.execute('DROP TABLE loja_fechada')
-
-        conn.commit()
-        conn.close()
+        """Garante o esquema atual da base de dados (migrações por user_version)"""
+        migracoes.migrar(self.repo)
 
     def get_pessoas(self):
         """Obtém a lista de pessoas da base de dados com cor_hex"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
         # Busca nome, horas e cor_hex
-        cursor.execute('''
-            SELECT p.nome, p.horas_diarias, p.cor
+        pessoas_data = self.repo.consultar('''
+            SELECT p.nome, p.horas_diarias, p.cor, p.id, p.funcao, p.cor_hex
             FROM pessoas p
             WHERE p.ativo = 1
         ''')
-        pessoas_data = cursor.fetchall()
-        conn.close()
+
+        def sem_cardinal(valor):
+            return valor.replace('#', '') if valor and valor.startswith('#') else valor
 
         pessoas = {}
-        for nome, horas, cor_hex in pessoas_data:
+        for nome, horas, cor_hex, pessoa_id, funcao, cor_tabela in pessoas_data:
             # Se cor_hex for None, usa branco
-            cor = cor_hex.replace('#', '') if cor_hex and cor_hex.startswith('#') else (cor_hex if cor_hex else 'FFFFFF')
-            pessoas[nome] = {'horas': horas, 'cor': cor, 'id': None}  # id não usado aqui
-        return pessoas  
-       
+            cor = sem_cardinal(cor_hex) or 'FFFFFF'
+            pessoas[nome] = {'horas': horas, 'cor': cor, 'id': pessoa_id, 'funcao': funcao,
+                             # Cor de fundo na tabela (pessoas.cor_hex, senão pessoas.cor)
+                             'cor_tabela': sem_cardinal(cor_tabela) or cor}
+        return pessoas
+
+    def get_politicas(self):
+        """Políticas de turnos: ({pessoa_id: Politica}, {funcao: Politica})"""
+        return regras.carregar_politicas(self.repo.leitura())
 
     def get_ferias(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT p.nome, f.data_inicio, f.data_fim
+        ferias_data = self.repo.consultar('''
+            SELECT p.nome, f.inicio_dia, f.fim_dia
             FROM ferias f
             JOIN pessoas p ON f.pessoa_id = p.id
             WHERE p.ativo = 1
         ''')
-        ferias_data = cursor.fetchall()
-        conn.close()
 
         ferias = {}
         for nome, inicio, fim in ferias_data:
             if nome not in ferias:
                 ferias[nome] = []
-            ferias[nome].append((datetime.strptime(inicio, '%Y-%m-%d').date(),
-                                datetime.strptime(fim, '%Y-%m-%d').date()))
+            ferias[nome].append((de_ordinal(inicio), de_ordinal(fim)))
         return ferias
 
     def get_folgas_ciclo(self):
-        """Obtém os ciclos de folgas da base de dados usando semana_id (AAAASS)"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT p.nome, fc.semana_id, fc.dia_semana
-            FROM folgas_ciclo fc
-            JOIN pessoas p ON fc.pessoa_id = p.id
-            WHERE p.ativo = 1
-            ORDER BY p.nome, fc.semana_id, fc.dia_semana
-        ''')
-        folgas_data = cursor.fetchall()
-        conn.close()
-
-        ciclos = {}
-        for nome, semana_id, dia_semana in folgas_data:
-            if nome not in ciclos:
-                ciclos[nome] = {}
-            if semana_id not in ciclos[nome]:
-                ciclos[nome][semana_id] = []
-            ciclos[nome][semana_id].append(dia_semana)
-        return ciclos
+        """Ciclos de folgas por pessoa: regras e exceções por semana (ver ciclosFolgas.py)"""
+        return ciclosFolgas.carregar_folgas(self.repo.leitura())
 
     def get_horarios_fixos(self):
         """Obtém os horários fixos da base de dados"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT p.nome, hf.data, hf.horario
+        horarios_data = self.repo.consultar('''
+            SELECT p.nome, hf.dia, hf.horario
             FROM horarios_fixos hf
             JOIN pessoas p ON hf.pessoa_id = p.id
         ''')
-        horarios_data = cursor.fetchall()
-        conn.close()
-        horarios = {}
-        for nome, data_str, horario in horarios_data:
-            data = datetime.strptime(data_str, '%Y-%m-%d')
-            horarios[(data, nome)] = horario
-        return horarios
+        return {(de_ordinal(dia), nome): horario for nome, dia, horario in horarios_data}
 
     def get_loja_fechada(self):
         """Obtém dias fechados com descrição"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT data, descricao FROM dias_loja_fechada ORDER BY data')
-        dados = cursor.fetchall()
-        conn.close()
-        return [(datetime.strptime(d[0], '%Y-%m-%d'), d[1]) for d in dados]
-
-class ScheduleWorker(QThread):
-    progress = pyqtSignal(int)
+        dados = self.repo.consultar('SELECT dia, descricao FROM dias_loja_fechada ORDER BY dia')
+        return [(de_ordinal(dia), descricao) for dia, descricao in dados]
+
+class ConstraintIndex:
+    """Restrições compiladas em arrays densos indexados pelo dia do horizonte.
+
+    Cada verificação no ciclo diário passa a ser um acesso por índice (O(1)),
+    em vez de percorrer listas de férias ou dias fechados.
+    """
+
+    def __init__(self, start_date, num_dias):
+        self.inicio = start_date.toordinal()
+        self.num_dias = num_dias
+        self.ferias = {}    # pessoa -> bytearray(num_dias)
+        self.folgas = {}    # pessoa -> bytearray(num_dias)
+        self.fixos = {}     # pessoa -> [horario ou None] * num_dias
+        self.fechado = [None] * num_dias  # descrição do dia fechado ou None
+
+    @classmethod
+    def compile(cls, start_date, num_dias, ferias, ciclos_folgas, horarios_fixos, loja_fechada_dates):
+        idx = cls(start_date, num_dias)
+
+        # Férias: intervalos recortados ao horizonte e marcados por slice
+        for pessoa, periodos in ferias.items():
+            dias = idx.ferias.setdefault(pessoa, bytearray(num_dias))
+            for inicio, fim in periodos:
+                a = max(idx.dia(inicio), 0)
+                b = min(idx.dia(fim), num_dias - 1)
+                if a <= b:
+                    dias[a:b + 1] = b'\x01' * (b - a + 1)
+
+        # Folgas do ciclo: regra por aritmética modular, exceções por semana
+        for pessoa, folgas in ciclos_folgas.items():
+            dias = idx.folgas.setdefault(pessoa, bytearray(num_dias))
+            for d in range(num_dias):
+                if folgas.e_folga(idx.inicio + d):
+                    dias[d] = 1
+
+        # Horários fixos
+        for (data, pessoa), horario in horarios_fixos.items():
+            d = idx.dia(data)
+            if 0 <= d < num_dias:
+                idx.fixos.setdefault(pessoa, [None] * num_dias)[d] = horario
+
+        # Dias de loja fechada (a primeira ocorrência prevalece)
+        for data, descricao in loja_fechada_dates:
+            d = idx.dia(data)
+            if 0 <= d < num_dias and idx.fechado[d] is None:
+                idx.fechado[d] = descricao or 'Loja Fechada'
+
+        return idx
+
+    def dia(self, data):
+        """Converte uma data/datetime no índice do dia dentro do horizonte"""
+        return data.toordinal() - self.inicio
+
+    def is_ferias(self, pessoa, dia):
+        dias = self.ferias.get(pessoa)
+        return dias is not None and 0 <= dia < self.num_dias and dias[dia] == 1
+
+    def is_folga(self, pessoa, dia):
+        dias = self.folgas.get(pessoa)
+        return dias is not None and 0 <= dia < self.num_dias and dias[dia] == 1
+
+    def horario_fixo(self, pessoa, dia):
+        dias = self.fixos.get(pessoa)
+        if dias is None or not 0 <= dia < self.num_dias:
+            return None
+        return dias[dia]
+
+    def loja_fechada(self, dia):
+        """Devolve a descrição do dia fechado, ou None se a loja abre"""
+        if 0 <= dia < self.num_dias:
+            return self.fechado[dia]
+        return None
+
+class ScheduleWorker(JobWorker):
+    semana_pronta = pyqtSignal(object)
     finished = pyqtSignal(object)
-    error = pyqtSignal(str)
 
     def __init__(self, generator):
         super().__init__()
         self.generator = generator
 
-    def run(self):
-        try:
-            self.generator.generate_schedule()
-            df = self.generator.create_dataframe()
-            self.finished.emit(df)
-        except Exception as e:
-            self.error.emit(str(e))
+    def executar(self, job):
+        otimizar = self.generator.orcamento_otimizacao > 0
+        fim_geracao = 0.8 if otimizar else 1.0
+        job.fase(0.0, fim_geracao, "A gerar escala...")
+        if self.generator.precisa_geracao_completa():
+            # Geração completa: envia cada semana assim que fica pronta (cancelável entre semanas)
+            total = self.generator.num_semanas
+            for i, semana in enumerate(self.generator.iter_schedule(por_semana=True), 1):
+                self.semana_pronta.emit(semana)
+                job.checkpoint(i / total)
+        else:
+            job.checkpoint()
+            self.generator.update_schedule()
+            job.progresso(1.0)
+        if otimizar:
+            job.fase(fim_geracao, 1.0, "A otimizar...")
+            self.generator.optimize_schedule(job=job)
+        df = self.generator.create_dataframe()
+        self.finished.emit(df)
+
+
+class ExportWorker(JobWorker):
+    """Exporta a escala numa thread, com progresso e cancelamento"""
+    finished = pyqtSignal(object)
+
+    def __init__(self, generator, destino, formato=None):
+        super().__init__()
+        self.generator = generator
+        self.destino = destino
+        self.formato = formato
+
+    def executar(self, job):
+        job.fase(0.0, 1.0, "A exportar...")
+        self.finished.emit(self.generator.exportar(self.destino, self.formato, job=job))
 
 class WorkScheduleGenerator:
-    def __init__(self):
-        self.db = DatabaseManager()        
+    # Tabela alterada -> (atributo do gerador, método de carregamento)
+    CARREGADORES = {
+        'ferias': ('ferias', 'get_ferias'),
+        'folgas_ciclo': ('ciclos_folgas', 'get_folgas_ciclo'),
+        'ciclos_folgas': ('ciclos_folgas', 'get_folgas_ciclo'),
+        'horarios_fixos': ('horarios_fixos', 'get_horarios_fixos'),
+        'dias_loja_fechada': ('loja_fechada_dates', 'get_loja_fechada'),
+    }
+    # Alterações que obrigam a gerar o horizonte inteiro
+    TABELAS_GERACAO_COMPLETA = ('pessoas', 'politicas_turno', 'regras_turno')
+    # Acima deste horizonte os trimestres terminados são despejados para ficheiro
+    SEMANAS_EM_MEMORIA = 52
+    # Entra na chave da cache de escalas: incrementar quando a lógica de gerar_dia mudar
+    VERSAO_GERACAO = 1
+
+    def __init__(self, db_path='escala_trabalho.db', usar_cache=True):
+        self.db = DatabaseManager(db_path)
+        # Escalas já geradas, por impressão digital das entradas (None = sem cache)
+        self.cache = ScheduleCache(caminho_cache(db_path)) if usar_cache else None
+        self.escala_da_cache = False
+        # Impressão digital das entradas da escala em memória (None se foi alterada depois)
+        self.chave_gerada = None
+        # Impressões por tabela das entradas já refletidas na escala em memória
+        self.entradas_geradas = None
         self.start_date = datetime(2026, 3, 16)  # Segunda-feira
         self.num_semanas = 12
         self.pessoas = self.db.get_pessoas()
@@ -217,477 +260,767 @@ class WorkScheduleGenerator:
         self.horarios_fixos = self.db.get_horarios_fixos()
         self.loja_fechada_dates = self.db.get_loja_fechada()
         self.dias_semana = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
-        self.schedule_data = []
+        self.despacho = []
+        self.schedule_data = None
+        self.restricoes = None
+        # Regeneração incremental: parâmetros do último resultado e alterações pendentes
+        self.parametros_gerados = None
+        self.alteracoes = []
+        # Modo de otimização: segundos de pesquisa local após a geração (0 = desligado)
+        self.orcamento_otimizacao = 0
+        self.relatorio_otimizacao = None
+
+    def compile_constraints(self):
+        """Compila férias, folgas, horários fixos e dias fechados para o horizonte pedido"""
+        self.restricoes = ConstraintIndex.compile(
+            self.start_date, self.num_semanas * 7,
+            self.ferias, self.ciclos_folgas, self.horarios_fixos, self.loja_fechada_dates
+        )
+        return self.restricoes
 
     def is_folga(self, pessoa, current_date):
         """Verifica se é folga baseado na base de dados (semana_id AAAASS)"""
-        if pessoa not in self.ciclos_folgas:
-            return False
-
-        # Calcula semana_id no formato AAAASS
-        year, iso_week, _ = current_date.isocalendar()
-        semana_id = f"{year}{iso_week:02d}"
-
-        dia_semana = current_date.weekday()  # 0=Segunda, ..., 6=Domingo
-
-        return dia_semana in self.ciclos_folgas[pessoa].get(semana_id, [])
+        return self.restricoes.is_folga(pessoa, self.restricoes.dia(current_date))
 
     def is_ferias(self, pessoa, data):
-        if pessoa not in self.ferias:
-            return False
-        for inicio, fim in self.ferias[pessoa]:
-            if inicio <= data.date() <= fim:
-                return True
-        return False
+        return self.restricoes.is_ferias(pessoa, self.restricoes.dia(data))
 
     def is_loja_fechada(self, data):
-        return any(d[0].date() == data.date() for d in self.loja_fechada_dates)
-
-    def get_turno_antonio_quinzenal(self, total_days, day):
-        if total_days <= 3:
-            return '11:00 - 20:00'
-        semanas_completas = (total_days - 4) // 7
-        periodo_A = semanas_completas % 2 == 0
-        if day in [5, 6]:
-            return None
-        return '09:00 - 18:00' if periodo_A else '11:00 - 20:00'
-
-    def get_susana_schedule(self, total_days, day, current_date, is_folga):
-        if is_folga or self.is_ferias('Susana A.', current_date):
-            return 'FOLGA' if is_folga else 'FÉRIAS'
-        if 0 <= day <= 4:
-            return '05:00 - 14:00'
-        else:
-            return 'FOLGA'
-
-    def get_antonia_schedule(self, total_days, day, current_date, is_folga):
-        if is_folga or self.is_ferias('Antónia F.', current_date):
-            return 'FOLGA' if is_folga else 'FÉRIAS'
-        if day == 1:
-            return '06:00 - 15:00'
-        else:
-            return '07:00 - 16:00'
+        return self.restricoes.loja_fechada(self.restricoes.dia(data)) is not None
+
+    def get_horario_fixo(self, pessoa, data):
+        return self.restricoes.horario_fixo(pessoa, self.restricoes.dia(data))
+
+    def compile_rules(self):
+        """Compila as políticas de turnos numa tabela de despacho pela ordem de processamento"""
+        por_pessoa, por_funcao = self.db.get_politicas()
+        self.despacho = regras.compilar_despacho(self.pessoas, por_pessoa, por_funcao)
+        return self.despacho
+
+    def condicao_regra(self, condicao, pessoa, ds):
+        """Avalia uma condição de regra com os turnos já atribuídos no dia"""
+        if condicao == regras.SEMPRE:
+            return True
+        if condicao == regras.TARDE_OCUPADA:
+            return bool(self.bits_inicio_dia(ds, excluir=pessoa) & INICIO_11_13)
+        if condicao == regras.SEM_FECHO:
+            return not self.has_coverage_until_20(ds)
+        if condicao == regras.SEM_ABERTURA:
+            return not self.has_early_shift_05_06(ds)
+        return False
 
-    def get_antonio_schedule(self, total_days, day, current_date, is_folga, ds):
-        # 1. Horário fixo tem prioridade máxima
-        if (current_date, 'António C.') in self.horarios_fixos:
-            return self.horarios_fixos[(current_date, 'António C.')]
+    def turno_quinzenal(self, pessoa, politica, total_days, ds):
+        """Turno da alternância quinzenal, ajustado ao fecho e ao dia anterior"""
+        turno = politica.turno_quinzenal(total_days)
+
+        # Se o turno quinzenal for de fecho mas já houver quem feche → turno base
+        if Shift.parse(turno).fecha and self.has_coverage_until_20(ds):
+            turno = politica.turno_base
+
+        # Ajuste com dia anterior (no máximo suavizar_horas de diferença no início)
+        base = Shift.parse(politica.turno_base)
+        if politica.suavizar_horas and total_days > 0 and base.is_trabalho:
+            turno_anterior = Shift.parse(self.schedule_data.get(total_days - 1, pessoa))
+            if turno_anterior.is_trabalho:
+                hora_anterior = turno_anterior.hora_inicio
+                hora_sugerida = Shift.parse(turno).hora_inicio
+                if abs(hora_anterior - hora_sugerida) > politica.suavizar_horas:
+                    if hora_sugerida > hora_anterior:
+                        hora_sugerida = hora_anterior + politica.suavizar_horas
+                    else:
+                        hora_sugerida = max(base.hora_inicio, hora_anterior - politica.suavizar_horas)
+                    return f"{hora_sugerida:02d}:00 - {hora_sugerida + base.minutos // 60:02d}:00"
+        return turno
 
-        # 2. FOLGA - deve vir ANTES de férias porque is_folga já foi calculada
-        if is_folga:
+    def turno_politica(self, pessoa, politica, total_days, day, ds):
+        """Horário base de uma pessoa: folga/férias, depois a primeira regra que se aplica"""
+        if self.restricoes.is_folga(pessoa, total_days):
             return 'FOLGA'
-        
-        # 3. Férias
-        if self.is_ferias('António C.', current_date):
+        if self.restricoes.is_ferias(pessoa, total_days):
             return 'FÉRIAS'
+        bit_dia = 1 << day
+        for dias, condicao, turno in politica.regras:
+            if not dias & bit_dia:
+                continue
+            if condicao == regras.QUINZENAL:
+                return self.turno_quinzenal(pessoa, politica, total_days, ds)
+            if self.condicao_regra(condicao, pessoa, ds):
+                return turno
+        return politica.turno_base
+
+    def pode_fechar(self, pessoa, politica, total_days, day, h, tem_turno_muito_cedo, tem_turno_13h):
+        """Verifica as condições da política para passar a pessoa para o fecho às 20:00"""
+        if not politica.fecho_dias >> day & 1:
+            return False
+        condicoes = politica.fecho_condicoes
+        if regras.FECHO_SEM_TURNO_13 in condicoes and tem_turno_13h:
+            return False
+        if regras.FECHO_COM_TURNO_CEDO in condicoes and not tem_turno_muito_cedo:
+            return False
+        if regras.FECHO_NAO_ABRE in condicoes and Shift.parse(h).hora_inicio == 5:
+            return False
+        if regras.FECHO_QUINZENAL in condicoes and \
+                not Shift.parse(politica.turno_quinzenal(total_days)).fecha:
+            return False
+        return True
 
-        # Resto da lógica continua igual...
-        # Verifica se já há alguém às 11:00, 12:00 ou 13:00
-        tem_alguem_tarde_inicio = any(
-            isinstance(h, str) and h.startswith(('11:', '12:', '13:')) 
-            for p, h in ds.items()
-            if p != 'António C.' and isinstance(h, str) and h not in ['FOLGA', 'FÉRIAS', 'Loja Fechada']
-        )
-
-        # Se já tem alguém às 11:00, 12:00 ou 13:00 → António vai às 09:00
-        if tem_alguem_tarde_inicio:
-            return '09:00 - 18:00'
-
-        # ===================================================================
-        # FIM-DE-SEMANA (Sábado = 5, Domingo = 6)
-        # ===================================================================
-        if day in [5, 6]:
-            # Prioridade máxima: garantir fecho às 20:00
-            if not self.has_coverage_until_20(ds):
-                return '11:00 - 20:00'
-            # Só depois, se já houver quem feche, verifica se precisa abrir cedo
-            if not self.has_early_shift_05_06(ds):
-                return '08:00 - 17:00'
-            # Se já houver abertura cedo e fecho tarde → horário normal
-            return '09:00 - 18:00'
-
-        # ===================================================================
-        # DIAS DE SEMANA
-        # ===================================================================
-        turno_quinzenal = self.get_turno_antonio_quinzenal(total_days, day)
-
-        # Se no turno quinzenal dele for suposto fazer tarde, mas já há alguém tarde → faz normal
-        if turno_quinzenal.startswith('11:') and self.has_coverage_until_20(ds):
-            turno_quinzenal = '09:00 - 18:00'
-
-        # Ajuste com dia anterior
-        if total_days > 0:
-            data_anterior = current_date - timedelta(days=1)
-            horario_anterior = None
-            for registro in self.schedule_data:
-                if registro['Data_obj'] == data_anterior and 'António C.' in registro:
-                    horario_anterior = registro['António C.']
-                    break
-            if horario_anterior and isinstance(horario_anterior, str) and horario_anterior not in ['FOLGA', 'FÉRIAS', 'Loja Fechada']:
-                try:
-                    hora_anterior = int(horario_anterior.split(':')[0])
-                    hora_sugerida = int(turno_quinzenal.split(':')[0])
-                    diferenca = abs(hora_anterior - hora_sugerida)
-                    if diferenca > 3:
-                        if hora_sugerida > hora_anterior:
-                            hora_sugerida = hora_anterior + 3
-                        else:
-                            hora_sugerida = max(9, hora_anterior - 3)
-                        return f"{hora_sugerida:02d}:00 - {hora_sugerida + 9:02d}:00"
-                except:
-                    pass
-        return turno_quinzenal
-
-    def get_magda_schedule(self, total_days, day, current_date, is_folga, ds):
-        # 1. Horário fixo (tem prioridade máxima)
-        if (current_date, 'Magda G.') in self.horarios_fixos:
-            return self.horarios_fixos[(current_date, 'Magda G.')]
-
-        # 2. Folga/Férias da Magda
-        if is_folga or self.is_ferias('Magda G.', current_date):
-            return 'FOLGA' if is_folga else 'FÉRIAS'
-
-        # 3. Horário padrão
-        return '13:00 - 22:00'
-
-    def get_eduardo_schedule(self, total_days, day, current_date, is_folga, ds):
-        # 1. Horário fixo (BD)
-        if (current_date, 'Eduardo S.') in self.horarios_fixos:
-            return self.horarios_fixos[(current_date, 'Eduardo S.')]
-
-        # 2. Folga/Férias
-        if is_folga or self.is_ferias('Eduardo S.', current_date):
-            return 'FOLGA' if is_folga else 'FÉRIAS'
-
-        # 3. Terça-feira (dia 1)
-        if day == 1:
-            return '05:00 - 14:00'
-
-        # 4. Verifica se já há alguém às 11:00, 12:00 ou 13:00
-        tem_alguem_tarde_inicio = any(
-            isinstance(h, str) and h.startswith(('11:', '12:', '13:')) 
-            for p, h in ds.items()
-            if p != 'Eduardo S.' and isinstance(h, str) and h not in ['FOLGA', 'FÉRIAS', 'Loja Fechada']
-        )
-
-        # 5. REGRA: Se já tem alguém às 11:00, 12:00 ou 13:00 → Eduardo às 06:00
-        if tem_alguem_tarde_inicio:
-            return '06:00 - 15:00'
-
-        # 6. Caso contrário, verifica se precisa de cobertura até 20:00
-        if not self.has_coverage_until_20(ds):
-            return '11:00 - 20:00'
-
-        # 7. DEFAULT: 06:00-15:00
-        return '06:00 - 15:00'
+    def bits_inicio_dia(self, ds, excluir=None):
+        """Máscara com as horas de início de todos os turnos do dia"""
+        return bits_inicio(h for p, h in ds.items() if p in self.pessoas and p != excluir)
 
     def needs_early_coverage(self, ds):
         """Verifica se precisa de cobertura matinal (05:00-07:00)"""
-        return not any(
-            isinstance(h, str) and h.startswith(('05:', '06:', '07:'))
-            for p, h in ds.items()
-            if p in self.pessoas and h not in ['FOLGA', 'FÉRIAS']
-        )
+        return not self.bits_inicio_dia(ds) & INICIO_05_07
 
     def has_coverage_until_20(self, ds):
-        """Verifica se há cobertura até às 20:00"""
-        return any(
-            isinstance(h, str) and ' - 20:00' in h
-            for p, h in ds.items()
-            if p in self.pessoas and h not in ['FOLGA', 'FÉRIAS']
-        )
+        """Verifica se há quem acabe exatamente às 20:00 (turno de fecho)"""
+        return any(Shift.parse(h).fecha for p, h in ds.items() if p in self.pessoas)
 
     def has_early_shift_05_06(self, ds):
         """Verifica se há turno muito cedo (05:00 ou 06:00)"""
-        return any(
-            isinstance(h, str) and h.startswith(('05:', '06:'))
-            for p, h in ds.items()
-            if p in self.pessoas and h not in ['FOLGA', 'FÉRIAS']
-        )
+        return bool(self.bits_inicio_dia(ds) & INICIO_05_06)
 
     def has_late_shift_12(self, ds):
         """Verifica se há turno às 12:00"""
-        return any(
-            isinstance(h, str) and h.startswith('13:')
-            for p, h in ds.items()
-            if p in self.pessoas and h not in ['FOLGA', 'FÉRIAS']
-        )
+        return bool(self.bits_inicio_dia(ds) & INICIO_13)
 
     def generate_schedule(self):
-        self.schedule_data = []
-        ordem_processamento = ['Susana A.', 'Antónia F.', 'António C.', 'Magda G.', 'Eduardo S.']
-
-        # RECARREGA TUDO DA BASE DE DADOS
+        for _ in self.iter_schedule():
+            pass
+
+    def iter_schedule(self, por_semana=False):
+        """Gera a escala completa, devolvendo cada dia (ou semana) assim que fica pronto.
+
+        Cada dia é um registo no formato de ScheduleStore.linha; com por_semana
+        devolve listas de até 7 registos. Se as entradas não mudaram desde uma
+        geração anterior, a escala vem da memória ou da cache em disco.
+        """
+        num_dias = self.num_semanas * 7
+        entradas = self.impressoes_entradas()
+        chave = None
+        if self.cache is not None:
+            chave = impressao_digital(self.db.db_path, self.start_date, self.num_semanas,
+                                      self.VERSAO_GERACAO, entradas)
+        if chave is not None and chave == self.chave_gerada and self.schedule_data is not None:
+            # Nada mudou desde a última geração: a escala em memória serve (só as cores são relidas)
+            self.pessoas = self.db.get_pessoas()
+            self.escala_da_cache = True
+        else:
+            self.carregar_entradas()
+            ficheiro = None
+            if self.num_semanas > self.SEMANAS_EM_MEMORIA:
+                ficheiro = os.path.join(tempfile.gettempdir(), f'escala_blocos_{os.getpid()}_{id(self)}.db')
+            if self.schedule_data is not None:
+                self.schedule_data.fechar()
+            # Entradas iguais às de uma geração anterior: a escala vem da cache em disco
+            guardado = self.cache.obter(chave, self.start_date, ficheiro) if chave is not None else None
+            if guardado is not None and guardado.pessoas != list(self.pessoas):
+                guardado.fechar()
+                guardado = None
+            self.escala_da_cache = guardado is not None
+            self.schedule_data = guardado or ScheduleStore(self.start_date, num_dias, self.pessoas, ficheiro=ficheiro)
+        # Até o ciclo terminar a escala está incompleta (geração pode ser cancelada)
+        self.parametros_gerados = None
+        self.chave_gerada = None
+
+        semana = []
+        for total_days in range(num_dias):
+            if not self.escala_da_cache:
+                self.gerar_dia(total_days)
+            linha = self.schedule_data.linha(total_days)
+            if not por_semana:
+                yield linha
+                continue
+            semana.append(linha)
+            if len(semana) == 7 or total_days == num_dias - 1:
+                yield semana
+                semana = []
+
+        if chave is not None and not self.escala_da_cache:
+            self.cache.guardar(chave, self.schedule_data)
+        self.chave_gerada = chave
+        self.entradas_geradas = entradas
+        self.parametros_gerados = (self.start_date, self.num_semanas)
+        self.alteracoes = []
+        self.relatorio_otimizacao = None
+
+    def carregar_entradas(self):
+        """Relê todas as entradas da base de dados e recompila restrições e regras"""
         self.pessoas = self.db.get_pessoas()
         self.ferias = self.db.get_ferias()
         self.ciclos_folgas = self.db.get_folgas_ciclo()
         self.horarios_fixos = self.db.get_horarios_fixos()
         self.loja_fechada_dates = self.db.get_loja_fechada()
+        self.compile_constraints()
+        self.compile_rules()
+
+    def optimize_schedule(self, orcamento=None, seed=None, job=None):
+        """Melhora a escala gerada por pesquisa local dentro do orçamento (segundos)"""
+        if self.schedule_data is None:
+            self.generate_schedule()
+        orcamento = self.orcamento_otimizacao if orcamento is None else orcamento
+        self.relatorio_otimizacao = otimizador.otimizar(self, orcamento, seed, job)
+        # A escala deixa de ser a gulosa: a próxima atualização gera tudo de novo
+        self.parametros_gerados = None
+        self.chave_gerada = None
+        return self.relatorio_otimizacao
+
+    def marcar_alteracao(self, tabela, inicio=None, fim=None):
+        """Regista uma alteração nos dados de entrada.
+
+        Sem datas marca o horizonte inteiro; só com início marca esse dia.
+        """
+        self.alteracoes.append((tabela, inicio, fim))
+
+    def impressoes_entradas(self):
+        """Impressões por tabela das entradas atuais na base de dados, para o horizonte pedido"""
+        return impressoes_por_tabela(self.db.db_path, self.start_date, self.num_semanas)
+
+    def precisa_geracao_completa(self, entradas=None):
+        """Indica se a próxima atualização tem de gerar o horizonte inteiro.
+
+        Além das alterações notificadas, compara as entradas na base de dados
+        com as da escala em memória: uma tabela alterada sem notificação
+        (outro processo, diálogos sem observador) obriga a reler tudo.
+        """
+        if (self.schedule_data is None
+                or self.parametros_gerados != (self.start_date, self.num_semanas)
+                or any(tabela in self.TABELAS_GERACAO_COMPLETA for tabela, _, _ in self.alteracoes)
+                or self.entradas_geradas is None):
+            return True
+        entradas = entradas or self.impressoes_entradas()
+        notificadas = {tabela for tabela, _, _ in self.alteracoes}
+        return any(impressao != self.entradas_geradas.get(tabela) and tabela not in notificadas
+                   for tabela, impressao in entradas.items())
+
+    def update_schedule(self):
+        """Recalcula apenas os dias afetados pelas alterações pendentes.
+
+        Faz uma geração completa se ainda não houver resultado, se mudou a data
+        de início, o número de semanas, a lista de pessoas ou as políticas de
+        turnos, ou se alguma entrada mudou sem ser notificada. Devolve a lista
+        de dias (índices) recalculados.
+        """
+        num_dias = self.num_semanas * 7
+        entradas = self.impressoes_entradas()
+        if self.precisa_geracao_completa(entradas):
+            self.generate_schedule()
+            return list(range(num_dias))
+        if not self.alteracoes:
+            return []
+
+        # Recarrega só as tabelas alteradas e recompila as restrições
+        sujos = set()
+        tabelas = set()
+        for tabela, inicio, fim in self.alteracoes:
+            tabelas.add(tabela)
+            a = 0 if inicio is None else max(self.restricoes.dia(para_data(inicio)), 0)
+            b = num_dias - 1 if inicio is None else min(self.restricoes.dia(para_data(fim or inicio)), num_dias - 1)
+            sujos.update(range(a, b + 1))
+        for tabela in tabelas:
+            atributo, carregar = self.CARREGADORES.get(tabela, (None, None))
+            if atributo:
+                setattr(self, atributo, getattr(self.db, carregar)())
+        self.alteracoes = []
+        self.chave_gerada = None
+        self.entradas_geradas = entradas
+        self.compile_constraints()
+        return self.recalcular_dias(sujos)
+
+    def recalcular_dias(self, sujos):
+        """Gera de novo os dias indicados sobre a escala existente.
+
+        Recalcula por ordem; se mudar o turno de quem ajusta ao dia anterior
+        (suavizar_horas), o dia seguinte também é recalculado. Devolve a lista
+        de dias recalculados.
+        """
+        num_dias = self.num_semanas * 7
+        suavizados = [p for p, pol in self.despacho if pol.suavizar_horas]
+        pendentes = sorted(sujos)
+        recalculados = []
+        i = 0
+        while i < len(pendentes):
+            dia = pendentes[i]
+            i += 1
+            anterior = [self.schedule_data.get(dia, p) for p in suavizados]
+            self.gerar_dia(dia)
+            recalculados.append(dia)
+            seguinte = dia + 1
+            if (anterior != [self.schedule_data.get(dia, p) for p in suavizados] and seguinte < num_dias
+                    and (i >= len(pendentes) or pendentes[i] != seguinte)):
+                pendentes.insert(i, seguinte)
+        return recalculados
+
+    def gerar_dia(self, total_days):
+        """Gera os horários de um dia do horizonte e guarda-os na escala"""
+        restricoes = self.restricoes
+        day = total_days % 7
+        week = total_days // 7
+        current_date = self.start_date + timedelta(days=total_days)
+
+        ds = {
+            'Semana': week + 1,
+            'Data': current_date.strftime('%d/%m/%Y'),
+            'Dia': self.dias_semana[day],
+            'Data_obj': current_date
+        }
+
+        # === 1. LOJA FECHADA (com descrição) ===
+        descricao = restricoes.loja_fechada(total_days)
+        if descricao is not None:
+            for pessoa in self.pessoas:
+                ds[pessoa] = descricao
+            self.schedule_data.guardar_dia(total_days, ds)
+            return ds
+        # =======================================
+
+        # === 2. MARCAR HORÁRIOS FIXOS PARA PROTEÇÃO ===
+        horarios_fixos_hoje = set()
+        for pessoa in self.pessoas:
+            horario_fixo = restricoes.horario_fixo(pessoa, total_days)
+            if horario_fixo is not None:
+                ds[pessoa] = horario_fixo
+                horarios_fixos_hoje.add(pessoa)
+        # ==============================================
+
+        # === 3. PRIMEIRA PASSAGEM: GERAR HORÁRIOS BASE ===
+        for pessoa, politica in self.despacho:
+            if pessoa in horarios_fixos_hoje:
+                continue
+            ds[pessoa] = self.turno_politica(pessoa, politica, total_days, day, ds)
+        # ==================================================
+
+        # === 4. VERIFICAÇÃO DE CONFLITO DE HORÁRIOS TARDE ===
+        # Se já tem alguém às 11:00, 12:00 ou 13:00, passa para o turno_tarde
+        # quem o tiver na política (ex: António 09:00, Eduardo 06:00)
+        # Mas só se não forem folga/férias/horário fixo
+        ajustaveis = [(p, pol) for p, pol in self.despacho if pol.turno_tarde]
+        excluir = {p for p, _ in ajustaveis}
+        tem_alguem_tarde_inicio = bits_inicio(
+            ds.get(p) for p in self.pessoas if p not in excluir
+        ) & INICIO_11_13
 
-        for week in range(self.num_semanas):
-            for day in range(7):
-                total_days = (week * 7) + day
-                current_date = self.start_date + timedelta(days=total_days)
-
-                ds = {
-                    'Semana': week + 1,
-                    'Data': current_date.strftime('%d/%m/%Y'),
-                    'Dia': self.dias_semana[day],
-                    'Data_obj': current_date
-                }
-
-                # === 1. LOJA FECHADA (com descrição) ===
-                if self.is_loja_fechada(current_date):
-                    descricao = next(
-                        (d[1] for d in self.loja_fechada_dates if d[0].date() == current_date.date()),
-                        "Loja Fechada"
-                    )
-                    for pessoa in self.pessoas:
-                        ds[pessoa] = descricao
-                    self.schedule_data.append(ds)
-                    continue
-                # =======================================
-
-                # === 2. MARCAR HORÁRIOS FIXOS PARA PROTEÇÃO ===
-                horarios_fixos_hoje = set()
-                for pessoa in self.pessoas:
-                    if (current_date, pessoa) in self.horarios_fixos:
-                        ds[pessoa] = self.horarios_fixos[(current_date, pessoa)]
-                        horarios_fixos_hoje.add(pessoa)
-                # ==============================================
-
-                # === 3. PRIMEIRA PASSAGEM: GERAR HORÁRIOS BASE ===
-                for pessoa in ordem_processamento:
-                    if pessoa in horarios_fixos_hoje:
-                        continue
-
-                    folga = self.is_folga(pessoa, current_date)
-
-                    if pessoa == 'Susana A.':
-                        horario = self.get_susana_schedule(total_days, day, current_date, folga)
-                    elif pessoa == 'Antónia F.':
-                        horario = self.get_antonia_schedule(total_days, day, current_date, folga)
-                    elif pessoa == 'António C.':
-                        horario = self.get_antonio_schedule(total_days, day, current_date, folga, ds)
-                    elif pessoa == 'Magda G.':
-                        horario = self.get_magda_schedule(total_days, day, current_date, folga, ds)
-                    elif pessoa == 'Eduardo S.':
-                        horario = self.get_eduardo_schedule(total_days, day, current_date, folga, ds)
-                    else:
-                        horario = 'FOLGA' if folga else ('FÉRIAS' if self.is_ferias(pessoa, current_date) else '09:00 - 18:00')
-
-                    ds[pessoa] = horario
-                # ==================================================
-
-                # === 4. VERIFICAÇÃO DE CONFLITO DE HORÁRIOS TARDE ===
-                # Se já tem alguém às 11:00, 12:00 ou 13:00, ajusta António e Eduardo
-                # Mas só se não forem folga/férias/horário fixo
-                tem_alguem_tarde_inicio = any(
-                    isinstance(ds.get(p), str) and ds[p].startswith(('11:', '12:', '13:')) 
-                    and ds[p] not in ['FOLGA', 'FÉRIAS']
-                    for p in self.pessoas if p != 'António C.' and p != 'Eduardo S.'
+        if tem_alguem_tarde_inicio:
+            for pessoa, politica in ajustaveis:
+                if (pessoa not in horarios_fixos_hoje and
+                        ds.get(pessoa) not in ['FOLGA', 'FÉRIAS'] and
+                        politica.tarde_dias >> day & 1):
+                    ds[pessoa] = politica.turno_tarde
+        # ==================================================
+
+        # === 5. COBERTURA MATINAL (05:00-07:00) ===
+        if self.needs_early_coverage(ds):
+            for pessoa, politica in reversed(self.despacho):  # o último a ser processado primeiro
+                if pessoa in horarios_fixos_hoje:
+                    continue  # NUNCA MEXER EM FIXO
+
+                h = ds.get(pessoa, '')
+                if h not in ['FOLGA', 'FÉRIAS'] and not Shift.parse(h).bit_inicio & INICIO_05_07:
+                    ds[pessoa] = politica.turno_abertura
+                    break  # Só uma pessoa precisa
+        # ===========================================
+
+        # === 6. SEGUNDA PASSAGEM: OTIMIZAR COBERTURA ATÉ 20:00 ===
+        # Verifica se falta cobertura até 20:00
+        if not self.has_coverage_until_20(ds):
+            # Conta quantas pessoas estão efetivamente a trabalhar (não FOLGA/FÉRIAS)
+            pessoas_trabalhando = sum(
+                1 for p, h in ds.items()
+                if p in self.pessoas and isinstance(h, str) and not Shift.parse(h).is_ausencia
+            )
+
+            # Só otimiza se houver 3+ pessoas a trabalhar
+            if pessoas_trabalhando >= 3:
+                # Candidatos ao fecho pela ordem de fecho da política
+                candidatos = sorted(
+                    ((p, pol) for p, pol in self.despacho
+                     if pol.fecho_ordem is not None and p not in horarios_fixos_hoje
+                     and ds.get(p, '') not in ['FOLGA', 'FÉRIAS']),
+                    key=lambda item: item[1].fecho_ordem
                 )
 
-                if tem_alguem_tarde_inicio:
-                    # Ajusta António para 09:00-18:00 (se não tiver horário fixo/folga/férias)
-                    if ('António C.' not in horarios_fixos_hoje and 
-                        ds.get('António C.') not in ['FOLGA', 'FÉRIAS']):
-                        ds['António C.'] = '09:00 - 18:00'
-                    
-                    # Ajusta Eduardo para 06:00-15:00 (se não tiver horário fixo/folga/férias e não for terça)
-                    if ('Eduardo S.' not in horarios_fixos_hoje and 
-                        ds.get('Eduardo S.') not in ['FOLGA', 'FÉRIAS'] and 
-                        day != 1):
-                        ds['Eduardo S.'] = '06:00 - 15:00'
-                # ==================================================
-
-                # === 5. COBERTURA MATINAL (05:00-07:00) ===
-                if self.needs_early_coverage(ds):
-                    for pessoa in reversed(ordem_processamento):  # Eduardo é o último
-                        if pessoa in horarios_fixos_hoje:
-                            continue  # NUNCA MEXER EM FIXO
-
-                        h = ds.get(pessoa, '')
-                        if h not in ['FOLGA', 'FÉRIAS'] and not h.startswith(('05:', '06:', '07:')):
-                            if pessoa == 'Eduardo S.':
-                                ds[pessoa] = '06:00 - 15:00'
-                            else:
-                                ds[pessoa] = '07:00 - 16:00'
-                            break  # Só uma pessoa precisa
-                # ===========================================
-
-                # === 6. SEGUNDA PASSAGEM: OTIMIZAR COBERTURA ATÉ 20:00 ===
-                # Verifica se falta cobertura até 20:00
-                if not self.has_coverage_until_20(ds):
-                    # Conta quantas pessoas estão efetivamente a trabalhar (não FOLGA/FÉRIAS)
-                    pessoas_trabalhando = sum(
-                        1 for p, h in ds.items()
-                        if p in self.pessoas and isinstance(h, str) and h not in ['FOLGA', 'FÉRIAS']
-                    )
-                    
-                    # Só otimiza se houver 3+ pessoas a trabalhar
-                    if pessoas_trabalhando >= 3:
-                        # Lista de candidatos para horário tarde
-                        candidatos = []
-                        
-                        for pessoa in ['António C.', 'Magda G.', 'Eduardo S.']:
-                            if pessoa in horarios_fixos_hoje:
-                                continue
-                            
-                            h = ds.get(pessoa, '')
-                            if h not in ['FOLGA', 'FÉRIAS']:
-                                candidatos.append(pessoa)
-                        
-                        # Tenta ajustar o melhor candidato
-                        if candidatos:
-                            # Verifica se já tem turnos muito cedo (05:00-06:00)
-                            tem_turno_muito_cedo = self.has_early_shift_05_06(ds)
-                            
-                            # Verifica se já tem turno às 13:00
-                            tem_turno_13h = self.has_late_shift_12(ds)
-                            
-                            # Prioridade: Eduardo > Magda > António
-                            for pessoa in ['Eduardo S.', 'Magda G.', 'António C.']:
-                                if pessoa not in candidatos:
-                                    continue
-                                
-                                h = ds.get(pessoa, '')
-                                
-                                # Eduardo: se não está às 05:00-14:00, pode ir para 11:00-20:00
-                                if pessoa == 'Eduardo S.' and not h.startswith('05:'):
-                                    # Só muda se não for terça (dia 1) e não tiver já alguém às 13:00
-                                    if day != 1 and not tem_turno_13h:
-                                        ds[pessoa] = '11:00 - 20:00'
-                                        break
-                                
-                                # Magda: pode ir para 11:00-20:00 se não tiver turno 13:00
-                                elif pessoa == 'Magda G.' and not tem_turno_13h:
-                                    # Se já tem turno 05:00-06:00, Magda pode ir tarde
-                                    if tem_turno_muito_cedo:
-                                        ds[pessoa] = '11:00 - 20:00'
-                                        break
-                                
-                                # António: pode ir para 11:00-20:00 se for o turno quinzenal dele
-                                elif pessoa == 'António C.' and not tem_turno_13h:
-                                    # Verifica se é dia de semana (não sáb/dom)
-                                    if day not in [5, 6]:
-                                        turno_quinzenal = self.get_turno_antonio_quinzenal(total_days, day)
-                                        if turno_quinzenal and turno_quinzenal.startswith('11:'):
-                                            # Se já tem 05:00-06:00, António pode ir tarde
-                                            if tem_turno_muito_cedo:
-                                                ds[pessoa] = '11:00 - 20:00'
-                                                break
-                # ========================================================
-
-                self.schedule_data.append(ds)
+                # Tenta ajustar o melhor candidato
+                if candidatos:
+                    # Verifica se já tem turnos muito cedo (05:00-06:00)
+                    tem_turno_muito_cedo = self.has_early_shift_05_06(ds)
+
+                    # Verifica se já tem turno às 13:00
+                    tem_turno_13h = self.has_late_shift_12(ds)
+
+                    for pessoa, politica in candidatos:
+                        if self.pode_fechar(pessoa, politica, total_days, day, ds.get(pessoa, ''),
+                                            tem_turno_muito_cedo, tem_turno_13h):
+                            ds[pessoa] = politica.turno_fecho
+                            break
+        # ========================================================
+
+        self.schedule_data.guardar_dia(total_days, ds)
+        return ds
+
+    def guardar_escala(self, db):
+        """Guarda a escala gerada em escalas_geradas/escala_detalhes (db: database.DatabaseManager)"""
+        return db.save_escala(self.start_date.strftime('%Y-%m-%d'), self.num_semanas, self.schedule_data)
+
+    def carregar_escala(self, db, escala_id):
+        """Repõe uma escala guardada diretamente da base de dados, sem a gerar de novo"""
+        cabecalho, detalhes = db.load_escala(escala_id)
+        if cabecalho is None:
+            raise ValueError(f"Escala guardada não encontrada: {escala_id}")
+        self.start_date = datetime.strptime(cabecalho['data_inicio'], '%Y-%m-%d')
+        self.num_semanas = cabecalho['num_semanas']
+        # Restrições do horizonte carregado (resumo, cobertura e cores do Excel dependem delas)
+        self.carregar_entradas()
+        pessoas = list(self.pessoas.keys())
+        if self.schedule_data is not None:
+            self.schedule_data.fechar()
+        self.schedule_data = ScheduleStore.from_detalhes(self.start_date, self.num_semanas * 7, pessoas, detalhes)
+        # As regras podem ter mudado desde que foi guardada: a próxima atualização gera tudo
+        self.parametros_gerados = None
+        self.chave_gerada = None
+        self.alteracoes = []
+        self.relatorio_otimizacao = None
+        return cabecalho
 
     def create_dataframe(self):
-        df = pd.DataFrame(self.schedule_data)
-        return df[['Semana', 'Data', 'Dia'] + list(self.pessoas.keys())]
-
-    def export_to_excel(self, filename=None):
+        """DataFrame colunar construído a partir dos códigos da escala.
+
+        Data em datetime64, Semana em int16, Dia categórico (códigos int8) e uma
+        coluna categórica por pessoa, todas com as mesmas categorias (os horários).
+        """
+        pessoas = list(self.pessoas.keys())
+        store = self.schedule_data
+        dias = np.array(store.dias_preenchidos(), dtype=np.int64)
+        # Código 0 = sem horário -> categoria em falta (-1)
+        tipo_turno = pd.CategoricalDtype(store.vocabulario[1:])
+        dados = {
+            'Semana': (dias // 7 + 1).astype(np.int16),
+            'Data': (np.datetime64(para_data(store.start_date), 'D') + dias).astype('datetime64[ns]'),
+            'Dia': pd.Categorical.from_codes((dias % 7).astype(np.int8), categories=DIAS_SEMANA, ordered=True),
+        }
+        for pessoa in pessoas:
+            codigos = np.frombuffer(store.codigos_pessoa(pessoa), dtype=np.uint16)[dias]
+            dados[pessoa] = pd.Categorical.from_codes(codigos.astype(np.int16) - 1, dtype=tipo_turno)
+        return pd.DataFrame(dados, columns=COLUNAS_META + pessoas)
+
+    def estilos_excel(self, wb, pessoas):
+        """Cria uma só vez os estilos nomeados usados na exportação"""
+        thin = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
+        centro = Alignment(horizontal='center')
+
+        def estilo(nome, fill=None, font=None, border=thin):
+            est = NamedStyle(name=nome, border=border or Border(left=Side(), right=Side(), top=Side(), bottom=Side()),
+                             alignment=centro)
+            if fill:
+                est.fill = PatternFill(start_color=fill, end_color=fill, fill_type='solid')
+            est.font = font or copy(DEFAULT_FONT)
+            wb.add_named_style(est)
+            return nome
+
+        estilos = {
+            'cabecalho': estilo('escala_cabecalho', '3498DB', Font(color='FFFFFF', bold=True), border=None),
+            'meta': estilo('escala_meta'),
+            'fim_semana': estilo('escala_fim_semana', 'F8D7DA'),
+            'FOLGA': estilo('escala_folga', 'D1ECF1', Font(bold=True, color='0C5460')),
+            'FÉRIAS': estilo('escala_ferias', 'FFD700', Font(bold=True, color='000000')),
+            'Loja Fechada': estilo('escala_fechada', 'FF6666', Font(bold=True, color='990000')),
+            'fixo': estilo('escala_fixo', 'FFCCCC', Font(bold=True, color='CC0000')),
+        }
+        # Uma cor de fundo por pessoa (pessoas com a mesma cor partilham o estilo)
+        por_cor = {}
+        for pessoa in pessoas:
+            cor = self.pessoas[pessoa]['cor']
+            if cor not in por_cor:
+                por_cor[cor] = estilo(f'escala_pessoa_{len(por_cor)}', cor)
+            estilos[pessoa] = por_cor[cor]
+        return estilos
+
+    def export_to_excel(self, filename=None, job=None):
+        """Exporta a escala numa só passagem (openpyxl em modo write-only).
+
+        Com um Job, o progresso é atualizado e o cancelamento verificado a cada
+        semana de linhas; se for cancelada o ficheiro não é escrito.
+        """
+        job = job or Job()
         if filename is None:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             filename = f'escala_trabalho_{timestamp}.xlsx'
-        df = self.create_dataframe()
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Escala de Trabalho"
-        headers = df.columns.tolist()
-        ws.append(headers)
-        header_fill = PatternFill(start_color='3498DB', end_color='3498DB', fill_type='solid')
-        header_font = Font(color='FFFFFF', bold=True)
-        for cell in ws[1]:
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal='center')
-        for row_idx, row_data in enumerate(df.values, 2):
-            ws.append(row_data.tolist())
-            current_date = datetime.strptime(row_data[1], '%d/%m/%Y')
-            for col_idx, pessoa in enumerate(headers[3:], 4):
-                horario = row_data[col_idx - 1]
-                cell = ws.cell(row=row_idx, column=col_idx)
-                if (current_date, pessoa) in self.horarios_fixos:
-                    cell.fill = PatternFill(start_color='FFCCCC', end_color='FFCCCC', fill_type='solid')
-                    cell.font = Font(bold=True, color='CC0000')
-                if horario == 'Loja Fechada':
-                    cell.fill = PatternFill(start_color='FF6666', end_color='FF6666', fill_type='solid')
-                    cell.font = Font(bold=True, color='990000')
-        thin = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
-        colors = {pessoa: info['cor'] for pessoa, info in self.pessoas.items()}
-        folga_fill = PatternFill(start_color='D1ECF1', end_color='D1ECF1', fill_type='solid')
-        weekend_fill = PatternFill(start_color='F8D7DA', end_color='F8D7DA', fill_type='solid')
-        ferias_fill = PatternFill(start_color='FFD700', end_color='FFD700', fill_type='solid')
-        for row in range(2, len(df) + 2):
-            dia_semana = ws[f'C{row}'].value
-            is_weekend = dia_semana in ['Sábado', 'Domingo']
-            for col_num, header in enumerate(headers, 1):
-                cell = ws.cell(row=row, column=col_num)
-                cell.border = thin
-                cell.alignment = Alignment(horizontal='center')
-                if header in colors:
-                    if cell.value == 'FOLGA':
-                        cell.fill = folga_fill
-                        cell.font = Font(bold=True, color='0C5460')
-                    elif cell.value == 'FÉRIAS':
-                        cell.fill = ferias_fill
-                        cell.font = Font(bold=True, color='000000')
-                    elif cell.value != 'Loja Fechada' and not (datetime.strptime(ws[f'B{row}'].value, '%d/%m/%Y'), header) in self.horarios_fixos:
-                        cell.fill = PatternFill(start_color=colors[header], end_color=colors[header], fill_type='solid')
-                elif header == 'Dia' and is_weekend:
-                    cell.fill = weekend_fill
-        ws.append([])
-        ws.append(['Gerado em:', datetime.now().strftime('%d/%m/%Y %H:%M:%S')])
+        pessoas = list(self.pessoas.keys())
+        headers = COLUNAS_META + pessoas
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Escala de Trabalho")
+        estilos = self.estilos_excel(wb, pessoas)
+
         ws.column_dimensions['A'].width = 8
         ws.column_dimensions['B'].width = 12
         ws.column_dimensions['C'].width = 10
         for col in ['D', 'E', 'F', 'G', 'H']:
             ws.column_dimensions[col].width = 15
+
+        def celula(valor, nome_estilo):
+            cell = WriteOnlyCell(ws, value=valor)
+            cell.style = nome_estilo
+            return cell
+
+        ws.append([celula(h, estilos['cabecalho']) for h in headers])
+        restricoes = self.restricoes
+        dias = self.schedule_data.dias_preenchidos()
+        for i, (dia, row_data) in enumerate(zip(dias, self.schedule_data.rows(pessoas))):
+            if i % 7 == 0:
+                if job.cancelado:
+                    # Fecha a folha (ficheiro temporário do modo write-only) antes de desistir
+                    ws.close()
+                job.checkpoint(i / len(dias))
+            linha = [celula(row_data[0], estilos['meta']),
+                     celula(row_data[1], estilos['meta']),
+                     celula(row_data[2], estilos['fim_semana'] if row_data[2] in ['Sábado', 'Domingo'] else estilos['meta'])]
+            for pessoa, horario in zip(pessoas, row_data[3:]):
+                if horario in ('FOLGA', 'FÉRIAS', 'Loja Fechada'):
+                    nome_estilo = estilos[horario]
+                elif restricoes.horario_fixo(pessoa, dia) is not None:
+                    nome_estilo = estilos['fixo']
+                else:
+                    nome_estilo = estilos[pessoa]
+                linha.append(celula(horario, nome_estilo))
+            ws.append(linha)
+        ws.append([])
+        ws.append(['Gerado em:', datetime.now().strftime('%d/%m/%Y %H:%M:%S')])
+        self.escrever_resumo_excel(wb, pessoas, estilos)
         wb.save(filename)
-        return filename        
+        job.progresso(1.0)
+        return filename
+
+    def escrever_resumo_excel(self, wb, pessoas, estilos):
+        """Folhas de resumo (por pessoa, semana e mês) a partir das estatísticas memorizadas"""
+        stats = estatisticas(self.schedule_data, pessoas)
+        tabelas = (
+            ('Resumo', stats.por_pessoa, lambda pessoa: pessoa),
+            ('Horas por semana', stats.por_semana, lambda semana: int(semana)),
+            ('Horas por mês', stats.por_mes, lambda mes: mes.strftime('%m/%Y')),
+        )
+        for titulo, tabela, rotulo in tabelas:
+            ws = wb.create_sheet(titulo)
+            ws.column_dimensions['A'].width = 14
+            cabecalho = [tabela.index.name] + [str(c) for c in tabela.columns]
+            cabecalho_cells = []
+            for h in cabecalho:
+                cell = WriteOnlyCell(ws, value=h)
+                cell.style = estilos['cabecalho']
+                cabecalho_cells.append(cell)
+            ws.append(cabecalho_cells)
+            for indice, valores in zip(tabela.index, tabela.itertuples(index=False)):
+                ws.append([rotulo(indice)] + [round(float(v), 2) if isinstance(v, float) else int(v)
+                                               for v in valores])
+
+    def exportar(self, destino, formato=None, job=None):
+        """Exporta para xlsx, csv, parquet ou ics (formato pela extensão, se omitido).
+
+        Para ics o destino é uma pasta com um calendário por pessoa.
+        """
+        formato = (formato or os.path.splitext(destino)[1].lstrip('.') or 'xlsx').lower()
+        if formato == 'xlsx':
+            return self.export_to_excel(destino, job)
+        if formato not in exportadores.EXPORTADORES:
+            raise ValueError(f"Formato de exportação desconhecido: {formato}")
+        job = job or Job()
+        job.checkpoint()
+        resultado = exportadores.EXPORTADORES[formato](self.schedule_data, list(self.pessoas.keys()), destino)
+        job.progresso(1.0)
+        return resultado
+
+class ScheduleTableModel(QAbstractTableModel):
+    """Modelo da tabela da escala lido diretamente do ScheduleStore.
+
+    Só as células visíveis são pedidas pela vista, pelo que o custo de mostrar
+    a escala não depende do horizonte. Durante a geração as semanas recebidas
+    ficam numa lista até a escala estar completa.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.colunas = []
+        self.store = None
+        self.dias = []
+        self.linhas = []
+        self.pinceis = {}
+        self.fundo_folga = QBrush(QColor(209, 236, 241))
+        self.texto_folga = QBrush(QColor(12, 84, 96))
+        self.fundo_ferias = QBrush(QColor(255, 215, 0))
+        self.texto_ferias = QBrush(QColor(0, 0, 0))
+        self.fundo_fechada = QBrush(QColor(255, 102, 102))
+        self.texto_fechada = QBrush(QColor(153, 0, 0))
+
+    def definir_cores(self, pessoas):
+        """Cache de pincéis por pessoa a partir da cor da base de dados"""
+        self.pinceis = {}
+        for pessoa, info in pessoas.items():
+            cor = info.get('cor_tabela') or info.get('cor')
+            if cor and QColor('#' + cor).isValid():
+                self.pinceis[pessoa] = QBrush(QColor('#' + cor))
+
+    def definir_colunas(self, colunas):
+        """Tabela vazia à espera de linhas (geração em curso)"""
+        self.beginResetModel()
+        self.colunas = list(colunas)
+        self.store = None
+        self.dias = []
+        self.linhas = []
+        self.endResetModel()
+
+    def acrescentar_linhas(self, registos):
+        if not registos:
+            return
+        inicio = len(self.linhas)
+        self.beginInsertRows(QModelIndex(), inicio, inicio + len(registos) - 1)
+        self.linhas.extend(tuple(r.get(c) for c in self.colunas) for r in registos)
+        self.endInsertRows()
+
+    def definir_escala(self, store, pessoas):
+        """Passa a ler da escala gerada"""
+        self.beginResetModel()
+        self.colunas = COLUNAS_META + list(pessoas)
+        self.store = store
+        self.dias = store.dias_preenchidos()
+        self.linhas = []
+        self.endResetModel()
+
+    def definir_dataframe(self, df):
+        self.beginResetModel()
+        self.colunas = df.columns.tolist()
+        self.store = None
+        self.dias = []
+        self.linhas = [tuple(r) for r in df.itertuples(index=False)]
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.dias) if self.store is not None else len(self.linhas)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.colunas)
+
+    def valor(self, row, col):
+        if self.store is None:
+            return self.linhas[row][col]
+        dia = self.dias[row]
+        if col == 0:
+            return self.store.semana_numero(dia)
+        if col == 1:
+            return self.store.data(dia).strftime('%d/%m/%Y')
+        if col == 2:
+            return DIAS_SEMANA[dia % 7]
+        return self.store.get(dia, self.colunas[col])
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        col = index.column()
+        if role == Qt.DisplayRole:
+            return str(self.valor(index.row(), col))
+        if col < 3 or role not in (Qt.BackgroundRole, Qt.ForegroundRole):
+            return None
+        valor = self.valor(index.row(), col)
+        fundo = role == Qt.BackgroundRole
+        if valor == 'FOLGA':
+            return self.fundo_folga if fundo else self.texto_folga
+        if valor == 'FÉRIAS':
+            return self.fundo_ferias if fundo else self.texto_ferias
+        if valor == 'Loja Fechada':
+            return self.fundo_fechada if fundo else self.texto_fechada
+        return self.pinceis.get(self.colunas[col]) if fundo else None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.colunas[section] if section < len(self.colunas) else None
+        return str(section + 1)
+
+
+class DiffTableModel(QAbstractTableModel):
+    """Diferenças entre versões da escala, com cada linha realçada pelo tipo de alteração"""
+
+    CORES = {
+        comparacaoEscalas.ALTERADO: QColor(255, 243, 205),
+        comparacaoEscalas.NOVO: QColor(212, 237, 218),
+        comparacaoEscalas.REMOVIDO: QColor(248, 215, 218),
+    }
 
-class ScheduleTableWidget(QTableWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.colunas = list(comparacaoEscalas.COLUNAS)
+        self.linhas = []
+        self.pinceis = {tipo: QBrush(cor) for tipo, cor in self.CORES.items()}
+        self.negrito = QFont()
+        self.negrito.setBold(True)
+
+    def definir_diferencas(self, df):
+        self.beginResetModel()
+        self.linhas = [tuple(r) for r in df[self.colunas].itertuples(index=False)]
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.linhas)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.colunas)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        linha = self.linhas[index.row()]
+        if role == Qt.DisplayRole:
+            valor = linha[index.column()]
+            return '-' if valor is None or valor != valor else str(valor)
+        if role == Qt.BackgroundRole:
+            return self.pinceis.get(linha[-1])
+        if role == Qt.FontRole and self.colunas[index.column()] == 'Depois':
+            return self.negrito
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.colunas[section]
+        return str(section + 1)
+
+
+class ScheduleTableView(QTableView):
     def __init__(self):
         super().__init__()
+        self.model_escala = ScheduleTableModel(self)
+        self.setModel(self.model_escala)
         self.setAlternatingRowColors(True)
-        self.horizontalHeader().setStretchLastSection(True)
+        self.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        # Altura fixa: a vista não mede linhas fora do ecrã
+        self.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
 
     def display_data(self, df):
-        self.setRowCount(len(df))
-        self.setColumnCount(len(df.columns))
-        self.setHorizontalHeaderLabels(df.columns.tolist())
-        for row_idx, row_data in enumerate(df.values):
-            for col_idx, cell_data in enumerate(row_data):
-                item = QTableWidgetItem(str(cell_data))
-                if col_idx >= 3:
-                    if cell_data == 'FOLGA':
-                        item.setBackground(QColor(209, 236, 241))
-                        item.setForeground(QColor(12, 84, 96))
-                    elif cell_data == 'FÉRIAS':
-                        item.setBackground(QColor(255, 215, 0))
-                        item.setForeground(QColor(0, 0, 0))
-                    elif cell_data == 'Loja Fechada':
-                        item.setBackground(QColor(255, 102, 102))
-                        item.setForeground(QColor(153, 0, 0))
-                    else:
-                        pessoa = df.columns[col_idx]
-                        cores = {
-                            'Susana A.': QColor(232, 245, 232),
-                            'António C.': QColor(255, 243, 205),
-                            'Antónia F.': QColor(212, 237, 218),
-                            'Magda G.': QColor(204, 229, 255),
-                            'Eduardo S.': QColor(240, 230, 255)
-                        }
-                        if pessoa in cores:
-                            item.setBackground(cores[pessoa])
-                self.setItem(row_idx, col_idx, item)
-        self.resizeColumnsToContents()
-        self.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.model_escala.definir_dataframe(df)
+
+    def display_schedule(self, store, pessoas):
+        """Mostra a escala gerada (pessoas: dicionário do gerador, com as cores)"""
+        self.model_escala.definir_cores(pessoas)
+        self.model_escala.definir_escala(store, list(pessoas.keys()))
+
+    def iniciar(self, colunas, pessoas=None):
+        """Limpa a tabela e define as colunas para receber linhas durante a geração"""
+        if pessoas is not None:
+            self.model_escala.definir_cores(pessoas)
+        self.model_escala.definir_colunas(colunas)
+
+    def append_rows(self, linhas):
+        """Acrescenta dias (registos da escala) à medida que vão sendo gerados"""
+        self.model_escala.acrescentar_linhas(linhas)
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.generator = WorkScheduleGenerator()
+        self.escalas_guardadas = EscalasGuardadas(self.generator.db.db_path)
+        # Edições de férias, folgas e dias fixos marcam os dias a recalcular
+        registar_observador(self.generator.marcar_alteracao)
         self.init_ui()
 
     def init_ui(self):
@@ -704,11 +1037,21 @@ class MainWindow(QMainWindow):
         self.export_btn.clicked.connect(self.export_to_excel)
         self.export_btn.setStyleSheet("QPushButton { background-color: #2196F3; color: white; font-weight: bold; padding: 8px; }")
         self.export_btn.setEnabled(False)
+        self.load_btn = QPushButton("Carregar Escala")
+        self.load_btn.setToolTip("Abre uma escala gerada anteriormente, sem a gerar de novo")
+        self.load_btn.clicked.connect(self.load_saved_schedule)
+        self.load_btn.setStyleSheet("QPushButton { background-color: #607D8B; color: white; font-weight: bold; padding: 8px; }")
         self.close_btn = QPushButton("Fechar")
         self.close_btn.clicked.connect(self.hide)  # Apenas esconde, não fecha
         self.close_btn.setStyleSheet("QPushButton { background-color: #f44336; color: white; font-weight: bold; padding: 8px; }")
+        self.cancel_btn = QPushButton("Cancelar")
+        self.cancel_btn.clicked.connect(self.cancel_job)
+        self.cancel_btn.setStyleSheet("QPushButton { background-color: #FF9800; color: white; font-weight: bold; padding: 8px; }")
+        self.cancel_btn.setVisible(False)
         self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, PASSOS)
         self.progress_bar.setVisible(False)
+        self.worker = None
         date_label = QLabel("Data de Início:")
         date_label.setStyleSheet("font-weight: bold;")
         self.date_edit = QDateEdit()
@@ -718,18 +1061,30 @@ class MainWindow(QMainWindow):
         semanas_label = QLabel("Semanas:")
         semanas_label.setStyleSheet("font-weight: bold;")
         self.semanas_spin = QSpinBox()
-        self.semanas_spin.setRange(1, 52)
+        self.semanas_spin.setRange(1, 260)  # até 5 anos
         self.semanas_spin.setValue(12)
         self.semanas_spin.setStyleSheet("padding: 5px;")
+        self.otimizar_check = QCheckBox("Otimizar")
+        self.otimizar_check.setToolTip("Pesquisa local após a geração para melhorar a cobertura")
+        self.otimizar_spin = QSpinBox()
+        self.otimizar_spin.setRange(1, 60)
+        self.otimizar_spin.setValue(2)
+        self.otimizar_spin.setSuffix(" s")
+        self.otimizar_spin.setStyleSheet("padding: 5px;")
         control_layout.addWidget(date_label)
         control_layout.addWidget(self.date_edit)
         control_layout.addSpacing(10)
         control_layout.addWidget(semanas_label)
         control_layout.addWidget(self.semanas_spin)
+        control_layout.addSpacing(10)
+        control_layout.addWidget(self.otimizar_check)
+        control_layout.addWidget(self.otimizar_spin)
         control_layout.addSpacing(20)
         control_layout.addWidget(self.generate_btn)
         control_layout.addWidget(self.export_btn)
+        control_layout.addWidget(self.load_btn)
         control_layout.addWidget(self.close_btn)
+        control_layout.addWidget(self.cancel_btn)
         control_layout.addWidget(self.progress_bar)
         control_layout.addStretch()
         layout.addLayout(control_layout)
@@ -737,15 +1092,23 @@ class MainWindow(QMainWindow):
         layout.addWidget(self.tabs)
         self.table_tab = QWidget()
         self.table_layout = QVBoxLayout(self.table_tab)
-        self.table_widget = ScheduleTableWidget()
+        self.table_widget = ScheduleTableView()
         self.table_layout.addWidget(self.table_widget)
         self.summary_tab = QWidget()
         self.summary_layout = QVBoxLayout(self.summary_tab)
         self.summary_text = QTextEdit()
         self.summary_text.setReadOnly(True)
         self.summary_layout.addWidget(self.summary_text)
+        self.coverage_tab = QWidget()
+        self.coverage_layout = QVBoxLayout(self.coverage_tab)
+        self.coverage_table = ScheduleTableView()
+        self.coverage_layout.addWidget(self.coverage_table)
         self.tabs.addTab(self.table_tab, "Escala Completa")
         self.tabs.addTab(self.summary_tab, "Resumo e Estatísticas")
+        self.tabs.addTab(self.coverage_tab, "Cobertura")
+        self.tabs.addTab(self.criar_tab_comparacao(), "Comparação")
+        self.diferencas = None
+        self.atualizar_versoes()
         self.statusBar().showMessage("Pronto para gerar escala")
 
     def generate_schedule(self):
@@ -753,30 +1116,214 @@ class MainWindow(QMainWindow):
         start_date = datetime(qdate.year(), qdate.month(), qdate.day())
         self.generator.start_date = start_date
         self.generator.num_semanas = self.semanas_spin.value()
-        self.generator.pessoas = self.generator.db.get_pessoas()
-        self.generator.ferias = self.generator.db.get_ferias()
-        self.generator.ciclos_folgas = self.generator.db.get_folgas_ciclo()
-        self.generator.horarios_fixos = self.generator.db.get_horarios_fixos()
-        self.generator.loja_fechada_dates = self.generator.db.get_loja_fechada()
+        self.generator.orcamento_otimizacao = self.otimizar_spin.value() if self.otimizar_check.isChecked() else 0
         self.statusBar().showMessage("A gerar escala...")
-        self.progress_bar.setVisible(True)
-        self.generate_btn.setEnabled(False)
+        self.linhas_recebidas = 0
+        # A tabela deixa de ler a escala enquanto o worker a altera
+        pessoas = self.generator.db.get_pessoas()
+        self.table_widget.iniciar(COLUNAS_META + list(pessoas.keys()), pessoas)
         self.worker = ScheduleWorker(self.generator)
+        self.worker.semana_pronta.connect(self.on_semana_pronta)
         self.worker.finished.connect(self.on_generation_finished)
+        self.worker.cancelado.connect(self.on_generation_cancelled)
         self.worker.error.connect(self.on_generation_error)
-        self.worker.start()
+        self.start_job(self.worker)
 
-    def on_generation_finished(self, df):
-        self.table_widget.display_data(df)
-        self.export_btn.setEnabled(True)
+    def start_job(self, worker):
+        """Mostra a barra de progresso e o botão de cancelar enquanto o worker corre"""
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(True)
+        self.cancel_btn.setVisible(True)
+        self.cancel_btn.setEnabled(True)
+        self.generate_btn.setEnabled(False)
+        self.export_btn.setEnabled(False)
+        self.load_btn.setEnabled(False)
+        worker.progress.connect(self.progress_bar.setValue)
+        worker.estado.connect(self.statusBar().showMessage)
+        worker.start()
+
+    def end_job(self):
         self.progress_bar.setVisible(False)
+        self.cancel_btn.setVisible(False)
         self.generate_btn.setEnabled(True)
+        self.load_btn.setEnabled(True)
+        self.export_btn.setEnabled(self.escala_completa())
+
+    def escala_completa(self):
+        """Há escala para mostrar e exportar (uma geração cancelada deixa-a a meio)"""
+        store = self.generator.schedule_data
+        return store is not None and len(store) == store.num_dias
+
+    def cancel_job(self):
+        if self.worker is not None and self.worker.isRunning():
+            self.worker.cancelar()
+            self.cancel_btn.setEnabled(False)
+            self.statusBar().showMessage("A cancelar...")
+
+    def on_semana_pronta(self, semana):
+        self.table_widget.append_rows(semana)
+        self.linhas_recebidas += len(semana)
+
+    def on_generation_finished(self, df):
+        self.table_widget.display_schedule(self.generator.schedule_data, self.generator.pessoas)
+        self.end_job()
+        self.update_summary()
+        mensagem = f"Escala gerada com sucesso! {len(df)} dias processados."
+        if self.generator.escala_da_cache:
+            mensagem += " (entradas sem alterações: escala lida da cache)"
+        anterior = self.escalas_guardadas.ultima_versao(self.generator.start_date.strftime('%Y-%m-%d'),
+                                                        self.generator.num_semanas)
+        escala_id = self.generator.guardar_escala(self.escalas_guardadas)
+        if not escala_id:
+            mensagem += " (não foi possível guardá-la na base de dados)"
+        elif escala_id == anterior:
+            mensagem += f" Igual à versão #{escala_id} já guardada."
+        else:
+            mensagem += f" Guardada como versão #{escala_id}."
+        self.atualizar_versoes(anterior_a=escala_id if escala_id and escala_id != anterior else None)
+        self.statusBar().showMessage(mensagem)
+
+    def criar_tab_comparacao(self):
+        """Separador para comparar duas versões guardadas, ou uma guardada com a escala atual"""
+        tab = QWidget()
+        layout = QVBoxLayout(tab)
+        controlos = QHBoxLayout()
+        self.diff_antes = QComboBox()
+        self.diff_depois = QComboBox()
+        self.diff_btn = QPushButton("Comparar")
+        self.diff_btn.clicked.connect(self.compare_versions)
+        self.diff_export_btn = QPushButton("Exportar Diferenças")
+        self.diff_export_btn.clicked.connect(self.export_diff)
+        self.diff_export_btn.setEnabled(False)
+        controlos.addWidget(QLabel("Antes:"))
+        controlos.addWidget(self.diff_antes, 1)
+        controlos.addWidget(QLabel("Depois:"))
+        controlos.addWidget(self.diff_depois, 1)
+        controlos.addWidget(self.diff_btn)
+        controlos.addWidget(self.diff_export_btn)
+        layout.addLayout(controlos)
+        self.diff_resumo = QLabel("")
+        layout.addWidget(self.diff_resumo)
+        self.diff_model = DiffTableModel(self)
+        self.diff_table = QTableView()
+        self.diff_table.setModel(self.diff_model)
+        self.diff_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.diff_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        layout.addWidget(self.diff_table)
+        return tab
+
+    def atualizar_versoes(self, anterior_a=None):
+        """Preenche as listas de versões com as escalas guardadas.
+
+        Com anterior_a (versão acabada de guardar), propõe comparar a versão
+        anterior do mesmo horizonte com a escala atual.
+        """
+        escalas = self.escalas_guardadas.get_escalas_geradas() or []
+        for combo, atual in ((self.diff_antes, False), (self.diff_depois, True)):
+            selecionado = combo.currentData()
+            combo.clear()
+            if atual:
+                combo.addItem("Escala atual (em memória)", None)
+            for e in escalas:
+                inicio = datetime.strptime(e['data_inicio'], '%Y-%m-%d').strftime('%d/%m/%Y')
+                combo.addItem(f"#{e['id']} {inicio} - {e['num_semanas']} semanas ({e['data_geracao']})", e['id'])
+            indice = combo.findData(selecionado)
+            if indice >= 0:
+                combo.setCurrentIndex(indice)
+            elif not atual and combo.count() > 1:
+                combo.setCurrentIndex(1)  # a penúltima versão, para comparar com a mais recente
+
+        if anterior_a is not None:
+            guardada = next((e for e in escalas if e['id'] == anterior_a), None)
+            anteriores = [e for e in escalas if e['id'] < anterior_a]
+            mesmo_horizonte = [e for e in anteriores if guardada and
+                               (e['data_inicio'], e['num_semanas']) == (guardada['data_inicio'], guardada['num_semanas'])]
+            anterior = max(mesmo_horizonte or anteriores, key=lambda e: e['id'], default=None)
+            if anterior is not None:
+                self.diff_antes.setCurrentIndex(self.diff_antes.findData(anterior['id']))
+            self.diff_depois.setCurrentIndex(0)
+
+    def compare_versions(self):
+        antes = self.diff_antes.currentData()
+        depois = self.diff_depois.currentData()
+        if antes is None:
+            QMessageBox.information(self, "Comparação", "Escolha uma escala guardada para comparar.")
+            return
+        conn = self.escalas_guardadas.repo.leitura()
+        try:
+            if depois is None:
+                if not self.escala_completa():
+                    QMessageBox.information(self, "Comparação", "Não há escala atual completa para comparar.")
+                    return
+                df = comparacaoEscalas.comparar_com_atual(conn, antes, self.generator.schedule_data)
+            else:
+                df = comparacaoEscalas.comparar_guardadas(conn, antes, depois)
+        except Exception as e:
+            QMessageBox.critical(self, "Erro", f"Erro ao comparar escalas:\n{str(e)}")
+            return
+        self.diferencas = df
+        self.diff_model.definir_diferencas(df)
+        self.diff_export_btn.setEnabled(not df.empty)
+        if df.empty:
+            self.diff_resumo.setText("As duas versões são iguais.")
+        else:
+            resumo = comparacaoEscalas.resumo_diferencas(df)
+            self.diff_resumo.setText(f"{len(df)} alterações | " + " | ".join(
+                f"{r['Pessoa']}: {r['Total']}" for _, r in resumo.iterrows()))
+
+    def export_diff(self):
+        if self.diferencas is None or self.diferencas.empty:
+            return
+        filename, _ = QFileDialog.getSaveFileName(
+            self, "Exportar diferenças",
+            f"diferencas_escala_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+            "Excel Files (*.xlsx);;CSV (*.csv)"
+        )
+        if not filename:
+            return
+        try:
+            saved_file = comparacaoEscalas.exportar_diferencas(self.diferencas, filename)
+            self.statusBar().showMessage(f"Diferenças exportadas: {saved_file}")
+        except Exception as e:
+            QMessageBox.critical(self, "Erro", f"Erro ao exportar as diferenças:\n{str(e)}")
+
+    def load_saved_schedule(self):
+        """Escolhe uma escala guardada e mostra-a sem voltar a gerar"""
+        escalas = self.escalas_guardadas.get_escalas_geradas() or []
+        if not escalas:
+            QMessageBox.information(self, "Carregar Escala", "Ainda não há escalas guardadas.")
+            return
+        opcoes = [
+            f"#{e['id']} {datetime.strptime(e['data_inicio'], '%Y-%m-%d').strftime('%d/%m/%Y')} - "
+            f"{e['num_semanas']} semanas ({e['descricao'] or e['data_geracao']})"
+            for e in escalas
+        ]
+        escolha, ok = QInputDialog.getItem(self, "Carregar Escala", "Escala guardada:", opcoes, 0, False)
+        if not ok:
+            return
+        try:
+            cabecalho = self.generator.carregar_escala(self.escalas_guardadas, escalas[opcoes.index(escolha)]['id'])
+        except Exception as e:
+            QMessageBox.critical(self, "Erro", f"Erro ao carregar a escala:\n{str(e)}")
+            return
+        inicio = self.generator.start_date
+        self.date_edit.setDate(QDate(inicio.year, inicio.month, inicio.day))
+        self.semanas_spin.setValue(self.generator.num_semanas)
+        self.table_widget.display_schedule(self.generator.schedule_data, self.generator.pessoas)
+        self.export_btn.setEnabled(True)
         self.update_summary()
-        self.statusBar().showMessage(f"Escala gerada com sucesso! {len(df)} dias processados.")
+        self.statusBar().showMessage(f"Escala #{cabecalho['id']} carregada ({cabecalho['descricao'] or cabecalho['data_geracao']})")
+
+    def on_generation_cancelled(self):
+        self.end_job()
+        if self.escala_completa():
+            # Cancelada na otimização ou antes da atualização: a escala anterior mantém-se
+            self.table_widget.display_schedule(self.generator.schedule_data, self.generator.pessoas)
+            self.update_summary()
+        self.statusBar().showMessage("Geração cancelada")
 
     def on_generation_error(self, error_msg):
-        self.progress_bar.setVisible(False)
-        self.generate_btn.setEnabled(True)
+        self.end_job()
         QMessageBox.critical(self, "Erro", f"Erro ao gerar escala:\n{error_msg}")
         self.statusBar().showMessage("Erro ao gerar escala")
 
@@ -789,32 +1336,79 @@ class MainWindow(QMainWindow):
         end_date = self.generator.start_date + timedelta(days=len(self.generator.schedule_data)-1)
         summary_text += f"{end_date.strftime('%d/%m/%Y')}\n"
         summary_text += f"Total de dias: {len(self.generator.schedule_data)} dias\n\n"
+        stats = estatisticas(self.generator.schedule_data, list(self.generator.pessoas.keys()))
         summary_text += "RESUMO DE DIAS TRABALHADOS:\n"
         summary_text += "-" * 40 + "\n"
-        for pessoa in self.generator.pessoas:
-            total = sum(1 for d in self.generator.schedule_data
-                        if d.get(pessoa) not in ['FOLGA', 'FÉRIAS', 'Loja Fechada'])
-            horas = total * self.generator.pessoas[pessoa]['horas']
-            summary_text += f"{pessoa:<12}: {total:2d} dias | {horas:3d} horas\n"
+        for pessoa, linha in stats.por_pessoa.iterrows():
+            summary_text += (f"{pessoa:<12}: {int(linha['Dias de trabalho']):3d} dias | "
+                             f"{linha['Horas']:6.1f} horas | {int(linha['Dias ao fim de semana']):2d} fins de semana | "
+                             f"{int(linha['Turnos cedo']):3d} cedo | {int(linha['Turnos tarde']):3d} tarde\n")
+        summary_text += "\nHORAS POR MÊS:\n"
+        summary_text += "-" * 40 + "\n"
+        for mes, linha in stats.por_mes.iterrows():
+            summary_text += f"{mes.strftime('%m/%Y')}: " + " | ".join(
+                f"{pessoa} {horas:.1f}" for pessoa, horas in linha.items()) + "\n"
+        if self.generator.relatorio_otimizacao:
+            summary_text += "\n" + otimizador.formatar_relatorio(self.generator.relatorio_otimizacao)
+
+        # Cobertura hora a hora (dias de loja fechada não contam)
+        matriz = CoverageMatrix.from_generator(self.generator)
+        resumo = matriz.resumo()
+        summary_text += "\nCOBERTURA POR HORA:\n"
+        summary_text += "-" * 40 + "\n"
+        summary_text += f"Horas sem ninguém (07:00-20:00): {resumo['horas_em_falta']} "
+        summary_text += f"em {resumo['dias_com_falta']} dias\n"
+        for hora, media in resumo['media_por_hora'].items():
+            summary_text += f"{hora}: {media:4.2f} pessoas em média\n"
+        self.coverage_table.display_data(matriz.relatorio())
         self.summary_text.setText(summary_text)
 
     def export_to_excel(self):
         try:
-            filename, _ = QFileDialog.getSaveFileName(
+            filtros = {
+                "Excel Files (*.xlsx)": '.xlsx',
+                "CSV (*.csv)": '.csv',
+                "Parquet (*.parquet)": '.parquet',
+                "iCalendar por pessoa (*.ics)": '.ics',
+            }
+            filename, filtro = QFileDialog.getSaveFileName(
                 self,
-                "Exportar para Excel",
+                "Exportar escala",
                 f"escala_trabalho_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                "Excel Files (*.xlsx)"
+                ";;".join(filtros)
             )
             if filename:
-                if not filename.endswith('.xlsx'):
-                    filename += '.xlsx'
-                saved_file = self.generator.export_to_excel(filename)
-                QMessageBox.information(self, "Sucesso", f"Escala exportada para:\n{saved_file}")
-                self.statusBar().showMessage(f"Ficheiro exportado: {saved_file}")
+                extensao = filtros.get(filtro, '.xlsx')
+                if not filename.endswith(extensao):
+                    filename = os.path.splitext(filename)[0] + extensao
+                if extensao == '.ics':
+                    # Uma pasta com um calendário por pessoa
+                    self.worker = ExportWorker(self.generator, os.path.splitext(filename)[0], 'ics')
+                else:
+                    self.worker = ExportWorker(self.generator, filename)
+                self.worker.finished.connect(self.on_export_finished)
+                self.worker.cancelado.connect(self.on_export_cancelled)
+                self.worker.error.connect(self.on_export_error)
+                self.start_job(self.worker)
         except Exception as e:
             QMessageBox.critical(self, "Erro", f"Erro ao exportar:\n{str(e)}")
 
+    def on_export_finished(self, saved_file):
+        self.end_job()
+        if isinstance(saved_file, list):
+            # ics: lista de calendários na pasta de destino
+            saved_file = os.path.dirname(saved_file[0]) if saved_file else self.worker.destino
+        QMessageBox.information(self, "Sucesso", f"Escala exportada para:\n{saved_file}")
+        self.statusBar().showMessage(f"Ficheiro exportado: {saved_file}")
+
+    def on_export_cancelled(self):
+        self.end_job()
+        self.statusBar().showMessage("Exportação cancelada")
+
+    def on_export_error(self, error_msg):
+        self.end_job()
+        QMessageBox.critical(self, "Erro", f"Erro ao exportar:\n{error_msg}")
+
 # Variável global para manter a janela
 _janela_gerador = None
 
@@ -9,7 +9,7 @@ import os
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QPushButton, QLabel, QMessageBox,
                              QProgressBar, QFileDialog, QTextEdit, QFrame)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtGui import QFont, QPixmap
 from datetime import datetime
 import pandas as pd
@@ -18,6 +18,12 @@ from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
 import random
 from collections import defaultdict
 import traceback
+from turnos import Shift, mascara_horas
+from escalaDados import ScheduleStore
+from tarefas import Job, JobWorker, PASSOS
+
+# Horas de atendimento telefónico (08:00 às 22:00)
+JANELA_ATENDIMENTO = mascara_horas(*range(8, 22))
 
 # VARIÁVEL GLOBAL - ADICIONAR AQUI
 _janela_gerador_apoios = None
@@ -29,7 +35,6 @@ class PhoneScheduleGenerator:
         Inicializa o gerador de escala telefónica a partir do arquivo Excel
         """
         self.excel_file = excel_file
-        self.work_schedule = self.load_work_schedule()
         self.start_date = datetime(2026, 12, 22)
 
         # Abreviações dos nomes
@@ -50,6 +55,8 @@ class PhoneScheduleGenerator:
             'ES': 'F0E6FF'
         }
 
+        self.work_schedule = self.load_work_schedule()
+
         # Horários de atendimento (8:00 às 22:00)
         self.horarios = [f"{h:02d}:00" for h in range(8, 22)]
 
@@ -89,7 +96,7 @@ class PhoneScheduleGenerator:
                 }
                 schedule_data.append(entry)
 
-            return schedule_data
+            return ScheduleStore.from_rows(schedule_data, list(self.abreviacoes.keys())) or []
 
         except FileNotFoundError:
             print(f"Erro: Arquivo {self.excel_file} não encontrado.")
@@ -133,29 +140,11 @@ class PhoneScheduleGenerator:
 
     def parse_schedule_time(self, horario_str):
         """
-        Extrai hora de início e fim de um horário
-        Retorna tupla (hora_inicio, hora_fim) ou None se for FOLGA/FÉRIAS
+        Converte um horário no Shift partilhado (analisado uma só vez por texto)
+        Retorna None se for FOLGA/FÉRIAS/Loja Fechada ou formato inválido
         """
-        if horario_str in ['FOLGA', 'FÉRIAS', 'Loja Fechada'] or pd.isna(horario_str) or not horario_str:
-            return None
-
-        try:
-            # Converter para string se necessário
-            if not isinstance(horario_str, str):
-                horario_str = str(horario_str)
-
-            # Remover espaços extras
-            horario_str = horario_str.strip()
-
-            partes = horario_str.split(' - ')
-            if len(partes) != 2:
-                return None
-
-            hora_inicio = int(partes[0].split(':')[0])
-            hora_fim = int(partes[1].split(':')[0])
-            return (hora_inicio, hora_fim)
-        except Exception:
-            return None
+        shift = Shift.parse(horario_str)
+        return shift if shift.is_trabalho else None
 
     def get_available_people_at_hour(self, day_schedule, hour):
         """
@@ -165,16 +154,13 @@ class PhoneScheduleGenerator:
 
         for pessoa, horario in day_schedule.items():
             if pessoa in self.abreviacoes:
-                time_range = self.parse_schedule_time(horario)
-                if time_range:
-                    hora_inicio, hora_fim = time_range
-                    if hora_inicio <= hour < hora_fim:
-                        # Verifica se a pessoa está em intervalo
-                        break_hour = self.get_break_hour(hora_inicio)
-                        if break_hour == hour:
-                            # A pessoa está de intervalo nesta hora
-                            continue
-                        available.append(self.abreviacoes[pessoa])
+                shift = self.parse_schedule_time(horario)
+                if shift and shift.presente(hour):
+                    # Verifica se a pessoa está em intervalo
+                    if self.get_break_hour(shift.hora_inicio) == hour:
+                        # A pessoa está de intervalo nesta hora
+                        continue
+                    available.append(self.abreviacoes[pessoa])
 
         return available
 
@@ -187,14 +173,12 @@ class PhoneScheduleGenerator:
         for day_data in week_data:
             for pessoa, horario in day_data.items():
                 if pessoa in self.abreviacoes:
-                    time_range = self.parse_schedule_time(horario)
-                    if time_range:
-                        hora_inicio, hora_fim = time_range
+                    shift = self.parse_schedule_time(horario)
+                    if shift:
                         # Contar apenas horas entre 8:00 e 22:00
-                        inicio = max(8, hora_inicio)
-                        fim = min(22, hora_fim)
-                        if fim > inicio:
-                            hours_count[self.abreviacoes[pessoa]] += (fim - inicio)
+                        horas = (shift.mascara & JANELA_ATENDIMENTO).bit_count()
+                        if horas:
+                            hours_count[self.abreviacoes[pessoa]] += horas
 
         return hours_count
 
@@ -265,19 +249,21 @@ class PhoneScheduleGenerator:
 
         return day_phone_schedule
 
-    def generate_phone_schedule(self):
+    def generate_phone_schedule(self, job=None):
         """
-        Gera a escala telefónica completa
+        Gera a escala telefónica completa (cancelável entre semanas com um Job)
         """
         if not self.work_schedule:
             return False
 
+        job = job or Job()
         self.phone_schedule = []
 
         # Processar semana a semana
         for week in range(1, 13):
+            job.checkpoint((week - 1) / 12)
             # Coletar dados da semana
-            week_data = [entry for entry in self.work_schedule if entry['Semana'] == week]
+            week_data = list(self.work_schedule.linhas(self.work_schedule.dias_semana(week)))
 
             if not week_data:
                 continue
@@ -316,16 +302,20 @@ class PhoneScheduleGenerator:
                 phone_entry.update(day_phone)
 
                 self.phone_schedule.append(phone_entry)
-        
+
+        job.progresso(1.0)
         return True
 
-    def export_to_excel(self, filename_prefix='escala_telefonica'):
+    def export_to_excel(self, filename_prefix='escala_telefonica', job=None):
         """
         Exporta a escala telefónica para Excel com timestamp
         """
         if not self.phone_schedule:
             return None
 
+        job = job or Job()
+        total = len(self.phone_schedule)
+
         # Adicionar timestamp ao nome do arquivo
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"{filename_prefix}_{timestamp}.xlsx"
@@ -348,7 +338,9 @@ class PhoneScheduleGenerator:
             cell.alignment = Alignment(horizontal='center', vertical='center')
 
         # Adicionar dados
-        for entry in self.phone_schedule:
+        for i, entry in enumerate(self.phone_schedule):
+            if i % 7 == 0:
+                job.checkpoint(0.5 * i / total)
             row_data = [entry['Data'], entry['Dia']]
             for hora in self.horarios:
                 row_data.append(entry.get(hora, '-'))
@@ -367,6 +359,8 @@ class PhoneScheduleGenerator:
         loja_fechada_font = Font(bold=True, color='990000')
 
         for row in range(2, len(self.phone_schedule) + 2):
+            if row % 7 == 2:
+                job.checkpoint(0.5 + 0.5 * (row - 2) / total)
             dia_semana = ws[f'B{row}'].value
             is_weekend = dia_semana in ['Sábado', 'Domingo']
 
@@ -405,7 +399,9 @@ class PhoneScheduleGenerator:
         self.add_legend(ws3)
 
         # Salvar arquivo
+        job.checkpoint()
         wb.save(filename)
+        job.progresso(1.0)
         return filename
 
     def add_weekly_summary(self, worksheet):
@@ -428,8 +424,12 @@ class PhoneScheduleGenerator:
             cell.alignment = Alignment(horizontal='center')
 
         # Calcular totais por semana
+        por_semana = defaultdict(list)
+        for entry in self.phone_schedule:
+            por_semana[entry['Semana']].append(entry)
+
         for week in range(1, 13):
-            week_data = [entry for entry in self.phone_schedule if entry['Semana'] == week]
+            week_data = por_semana.get(week)
 
             if week_data:
                 start_date = week_data[0]['Data']
@@ -558,41 +558,33 @@ class PhoneScheduleGenerator:
         return start_hour + 3
 
 
-class GeradorWorker(QThread):
+class GeradorWorker(JobWorker):
     """Thread para gerar a escala sem travar a interface"""
-    progress = pyqtSignal(int)
     finished = pyqtSignal(str)
-    error = pyqtSignal(str)
 
     def __init__(self, excel_file):
         super().__init__()
         self.excel_file = excel_file
 
-    def run(self):
-        try:
-            self.progress.emit(30)
-            generator = PhoneScheduleGenerator(self.excel_file)
-            
-            self.progress.emit(50)
-            if not generator.work_schedule:
-                self.error.emit(f"Não foi possível carregar a escala de trabalho do ficheiro:\n{self.excel_file}\n\nVerifique se o ficheiro está no formato correto.")
-                return
-            
-            self.progress.emit(70)
-            success = generator.generate_phone_schedule()
-            
-            if not success:
-                self.error.emit("Erro ao gerar escala telefónica.")
-                return
-            
-            self.progress.emit(90)
-            filename = generator.export_to_excel()
-            
-            self.progress.emit(100)
-            self.finished.emit(filename)
-            
-        except Exception as e:
-            self.error.emit(f"Erro: {str(e)}\n\n{traceback.format_exc()}")
+    def executar(self, job):
+        job.fase(0.0, 0.2, "A ler a escala de trabalho...")
+        generator = PhoneScheduleGenerator(self.excel_file)
+        if not generator.work_schedule:
+            self.error.emit(f"Não foi possível carregar a escala de trabalho do ficheiro:\n{self.excel_file}\n\nVerifique se o ficheiro está no formato correto.")
+            return
+
+        job.fase(0.2, 0.6, "A gerar escala telefónica...")
+        success = generator.generate_phone_schedule(job)
+        if not success:
+            self.error.emit("Erro ao gerar escala telefónica.")
+            return
+
+        job.fase(0.6, 1.0, "A exportar...")
+        filename = generator.export_to_excel(job=job)
+        self.finished.emit(filename)
+
+    def mensagem_erro(self, erro):
+        return f"Erro: {str(erro)}\n\n{traceback.format_exc()}"
 
 
 class GeradorApoiosWindow(QMainWindow):
@@ -771,8 +763,14 @@ class GeradorApoiosWindow(QMainWindow):
                 border-radius: 3px;
             }
         """)
+        self.progress_bar.setRange(0, PASSOS)
         layout.addWidget(self.progress_bar)
-        
+
+        self.estado_label = QLabel("")
+        self.estado_label.setAlignment(Qt.AlignCenter)
+        self.estado_label.setStyleSheet("color: #666; font-size: 10px;")
+        self.estado_label.setVisible(False)
+        layout.addWidget(self.estado_label)
         
         
         # Botões
@@ -842,6 +840,25 @@ class GeradorApoiosWindow(QMainWindow):
         """)
         btn_fechar.clicked.connect(self.hide)
         buttons_layout.addWidget(btn_fechar)
+
+        self.btn_cancelar = QPushButton("⏹ Cancelar")
+        self.btn_cancelar.setFont(QFont("Arial", 12))
+        self.btn_cancelar.setMinimumHeight(50)
+        self.btn_cancelar.setStyleSheet("""
+            QPushButton {
+                background-color: #C0392B;
+                color: white;
+                border: none;
+                border-radius: 8px;
+                padding: 10px;
+            }
+            QPushButton:hover {
+                background-color: #A93226;
+            }
+        """)
+        self.btn_cancelar.clicked.connect(self.cancelar_geracao)
+        self.btn_cancelar.setVisible(False)
+        buttons_layout.addWidget(self.btn_cancelar)
         
         layout.addLayout(buttons_layout)
         
@@ -894,14 +911,19 @@ class GeradorApoiosWindow(QMainWindow):
         for btn in self.findChildren(QPushButton):
             btn.setEnabled(False)
         
+        self.btn_cancelar.setEnabled(True)
+        self.btn_cancelar.setVisible(True)
         self.progress_bar.setVisible(True)
         self.progress_bar.setValue(0)
+        self.estado_label.setVisible(True)
         self.log(f"Iniciando geração da escala telefónica a partir de: {os.path.basename(self.ficheiro_selecionado)}")
         
         # Criar e iniciar worker com o ficheiro selecionado
         self.worker = GeradorWorker(self.ficheiro_selecionado)
         self.worker.progress.connect(self.atualizar_progresso)
+        self.worker.estado.connect(self.estado_label.setText)
         self.worker.finished.connect(self.geracao_concluida)
+        self.worker.cancelado.connect(self.geracao_cancelada)
         self.worker.error.connect(self.erro_geracao)
         self.worker.start()
 
@@ -909,14 +931,29 @@ class GeradorApoiosWindow(QMainWindow):
         """Atualiza a barra de progresso"""
         self.progress_bar.setValue(valor)
 
-    def geracao_concluida(self, filename):
-        """Chamado quando a geração termina com sucesso"""
+    def cancelar_geracao(self):
+        """Pede ao worker para parar no próximo ponto de verificação"""
+        if self.worker is not None and self.worker.isRunning():
+            self.worker.cancelar()
+            self.btn_cancelar.setEnabled(False)
+            self.log("A cancelar...")
+
+    def terminar_tarefa(self):
+        """Esconde o progresso e reabilita os botões"""
         self.progress_bar.setVisible(False)
-        self.log(f"✅ Escala gerada com sucesso: {filename}")
-        
-        # Reabilitar botões
+        self.estado_label.setVisible(False)
+        self.btn_cancelar.setVisible(False)
         for btn in self.findChildren(QPushButton):
             btn.setEnabled(True)
+
+    def geracao_cancelada(self):
+        self.terminar_tarefa()
+        self.log("⏹ Geração cancelada.")
+
+    def geracao_concluida(self, filename):
+        """Chamado quando a geração termina com sucesso"""
+        self.terminar_tarefa()
+        self.log(f"✅ Escala gerada com sucesso: {filename}")
         
         QMessageBox.information(
             self, 
@@ -928,13 +965,9 @@ class GeradorApoiosWindow(QMainWindow):
 
     def erro_geracao(self, erro_msg):
         """Chamado quando ocorre erro na geração"""
-        self.progress_bar.setVisible(False)
+        self.terminar_tarefa()
         self.log(f"❌ ERRO: {erro_msg}")
         
-        # Reabilitar botões
-        for btn in self.findChildren(QPushButton):
-            btn.setEnabled(True)
-        
         QMessageBox.critical(self, "Erro na Geração", erro_msg)
 
     def abrir_pasta(self):
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Geração de escalas em lote para várias lojas/equipas.
+
+Cada loja tem a sua base de dados SQLite; as escalas são geradas em paralelo
+num ProcessPoolExecutor (um processo por loja) e no fim é escrito um Excel
+por loja e um relatório combinado.
+
+Uso:
+    python geradorLotes.py loja_norte.db loja_sul.db --inicio 2026-03-16 --semanas 12
+    python geradorLotes.py norte sul --saida escalas_lote
+"""
+
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd
+
+from turnos import Shift, mascara_horas
+
+INICIO_05_07 = mascara_horas(5, 6, 7)
+
+
+def resolver_base(entrada):
+    """Caminho da base de dados: ficheiro existente ou ID de equipa (escala_trabalho_<id>.db)"""
+    if os.path.isfile(entrada):
+        return entrada
+    return f'escala_trabalho_{entrada}.db'
+
+
+def nome_loja(db_path):
+    return os.path.splitext(os.path.basename(db_path))[0]
+
+
+def resumir_escala(generator):
+    """Resumo por pessoa e cobertura diária de uma escala gerada"""
+    store = generator.schedule_data
+    pessoas = list(generator.pessoas.keys())
+    resumo = {}
+    for pessoa in pessoas:
+        turnos = [Shift.parse(h) for h in store.coluna(pessoa)]
+        resumo[pessoa] = {
+            'horas': sum(t.minutos for t in turnos) / 60,
+            'dias_trabalho': sum(1 for t in turnos if t.is_trabalho),
+            'folgas': sum(1 for t in turnos if t.tipo == Shift.FOLGA),
+            'ferias': sum(1 for t in turnos if t.tipo == Shift.FERIAS),
+        }
+
+    sem_fecho = 0
+    sem_abertura = 0
+    for dia in store.dias_preenchidos():
+        turnos = [Shift.parse(store.get(dia, p)) for p in pessoas]
+        if any(t.tipo == Shift.FECHADO for t in turnos):
+            continue
+        if not any(t.fecha for t in turnos):
+            sem_fecho += 1
+        if not any(t.bit_inicio & INICIO_05_07 for t in turnos):
+            sem_abertura += 1
+    return resumo, {'dias': len(store), 'dias_sem_fecho': sem_fecho, 'dias_sem_abertura': sem_abertura}
+
+
+def gerar_loja(db_path, start_date, num_semanas, pasta_saida=None):
+    """Gera a escala de uma loja (executado num processo do pool)"""
+    # Importado aqui para que cada processo carregue o gerador uma só vez
+    from gerador import WorkScheduleGenerator
+
+    inicio = time.perf_counter()
+    resultado = {'loja': nome_loja(db_path), 'db_path': db_path, 'ficheiro': None, 'erro': None}
+    try:
+        if not os.path.isfile(db_path):
+            raise FileNotFoundError(f"Base de dados não encontrada: {db_path}")
+        generator = WorkScheduleGenerator(db_path)
+        generator.start_date = start_date
+        generator.num_semanas = num_semanas
+        generator.generate_schedule()
+        resultado['pessoas'], resultado['cobertura'] = resumir_escala(generator)
+        if pasta_saida:
+            ficheiro = os.path.join(pasta_saida, f"escala_{resultado['loja']}.xlsx")
+            resultado['ficheiro'] = generator.export_to_excel(ficheiro)
+    except Exception as e:
+        resultado['erro'] = str(e)
+    resultado['segundos'] = round(time.perf_counter() - inicio, 3)
+    return resultado
+
+
+def gerar_lote(bases, start_date, num_semanas, pasta_saida=None, max_workers=None, progresso=None):
+    """Gera as escalas de várias lojas em paralelo.
+
+    bases: lista de caminhos de bases de dados ou IDs de equipa.
+    progresso: callback opcional (concluidas, total, resultado).
+    Devolve a lista de resultados pela ordem de `bases`.
+    """
+    caminhos = [resolver_base(b) for b in bases]
+    if pasta_saida:
+        os.makedirs(pasta_saida, exist_ok=True)
+
+    resultados = [None] * len(caminhos)
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futuros = {
+            pool.submit(gerar_loja, caminho, start_date, num_semanas, pasta_saida): i
+            for i, caminho in enumerate(caminhos)
+        }
+        for concluidas, futuro in enumerate(as_completed(futuros), 1):
+            i = futuros[futuro]
+            resultados[i] = futuro.result()
+            if progresso:
+                progresso(concluidas, len(caminhos), resultados[i])
+    return resultados
+
+
+def relatorio_combinado(resultados, filename=None):
+    """Escreve um Excel com o resumo por loja e por pessoa de todas as lojas"""
+    if filename is None:
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = f'relatorio_lote_{timestamp}.xlsx'
+
+    lojas = []
+    pessoas = []
+    for r in resultados:
+        cobertura = r.get('cobertura') or {}
+        lojas.append({
+            'Loja': r['loja'],
+            'Dias': cobertura.get('dias'),
+            'Dias sem fecho 20:00': cobertura.get('dias_sem_fecho'),
+            'Dias sem abertura': cobertura.get('dias_sem_abertura'),
+            'Ficheiro': r['ficheiro'],
+            'Tempo (s)': r['segundos'],
+            'Erro': r['erro'] or '',
+        })
+        for pessoa, info in (r.get('pessoas') or {}).items():
+            pessoas.append({
+                'Loja': r['loja'],
+                'Pessoa': pessoa,
+                'Horas': info['horas'],
+                'Dias de trabalho': info['dias_trabalho'],
+                'Folgas': info['folgas'],
+                'Férias': info['ferias'],
+            })
+
+    with pd.ExcelWriter(filename, engine='openpyxl') as writer:
+        pd.DataFrame(lojas).to_excel(writer, sheet_name='Lojas', index=False)
+        pd.DataFrame(pessoas, columns=['Loja', 'Pessoa', 'Horas', 'Dias de trabalho', 'Folgas', 'Férias']) \
+            .to_excel(writer, sheet_name='Pessoas', index=False)
+    return filename
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Gera escalas de trabalho para várias lojas em paralelo')
+    parser.add_argument('bases', nargs='+', help='bases de dados (.db) ou IDs de equipa')
+    parser.add_argument('--inicio', default='2026-03-16', help='data de início (AAAA-MM-DD)')
+    parser.add_argument('--semanas', type=int, default=12, help='número de semanas')
+    parser.add_argument('--saida', default='escalas_lote', help='pasta para os Excel gerados')
+    parser.add_argument('--processos', type=int, default=None, help='número máximo de processos')
+    args = parser.parse_args(argv)
+
+    start_date = datetime.strptime(args.inicio, '%Y-%m-%d')
+
+    def mostrar(concluidas, total, resultado):
+        estado = f"ERRO: {resultado['erro']}" if resultado['erro'] else f"{resultado['segundos']}s"
+        print(f"[{concluidas}/{total}] {resultado['loja']}: {estado}")
+
+    resultados = gerar_lote(args.bases, start_date, args.semanas, args.saida, args.processos, mostrar)
+    relatorio = relatorio_combinado(resultados, os.path.join(args.saida, 'relatorio_lote.xlsx'))
+    print(f"Relatório combinado: {relatorio}")
+    return 1 if any(r['erro'] for r in resultados) else 0
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
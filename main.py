@@ -7,6 +7,7 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QScrollArea, QGridLayout)
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QFont
+from repositorio import fechar_todos
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -316,6 +317,8 @@ def main():
     window = MainWindow()
     window.show()
     
+    # Fecha as ligações partilhadas à base de dados (checkpoint do WAL)
+    app.aboutToQuit.connect(fechar_todos)
     sys.exit(app.exec_())
 
 if __name__ == '__main__':
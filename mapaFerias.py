@@ -12,19 +12,22 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
 from PyQt5.QtCore import Qt, QDate
 from PyQt5.QtGui import QFont, QColor
 from datetime import datetime
-import sqlite3
+from repositorio import repositorio
+from datas import de_ordinal, limites_ano
+import migracoes
 
 class DatabaseManager:
+    """Consultas do mapa de férias, sobre a ligação partilhada (repositorio.py)"""
+
     def __init__(self, db_path='escala_trabalho.db'):
         self.db_path = db_path
+        self.repo = repositorio(db_path)
+        migracoes.migrar(self.repo)
 
     def get_ferias(self, pessoa_filtro=None, ano_filtro=None):
         """Obtém as férias da base de dados com filtros opcionais"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         query = '''
-            SELECT p.nome, f.data_inicio, f.data_fim
+            SELECT p.nome, f.inicio_dia, f.fim_dia
             FROM ferias f
             JOIN pessoas p ON f.pessoa_id = p.id
             WHERE p.ativo = 1
@@ -37,53 +40,40 @@ class DatabaseManager:
             query += " AND p.nome = ?"
             params.append(pessoa_filtro)
         
-        # Aplicar filtro por ano
+        # Aplicar filtro por ano: férias que se sobrepõem ao ano (intervalo de ordinais, pelo índice)
         if ano_filtro and ano_filtro != "Todos":
-            query += " AND (strftime('%Y', f.data_inicio) = ? OR strftime('%Y', f.data_fim) = ?)"
-            params.extend([ano_filtro, ano_filtro])
+            primeiro, ultimo = limites_ano(ano_filtro)
+            query += " AND f.inicio_dia <= ? AND f.fim_dia >= ?"
+            params.extend([ultimo, primeiro])
         
-        query += " ORDER BY p.nome, f.data_inicio"
+        query += " ORDER BY p.nome, f.inicio_dia"
         
-        cursor.execute(query, params)
-        ferias_data = cursor.fetchall()
-        conn.close()
+        ferias_data = self.repo.consultar(query, params)
 
         ferias = {}
         for nome, inicio, fim in ferias_data:
             if nome not in ferias:
                 ferias[nome] = []
-            ferias[nome].append((
-                datetime.strptime(inicio, '%Y-%m-%d').date(),
-                datetime.strptime(fim, '%Y-%m-%d').date()
-            ))
+            ferias[nome].append((de_ordinal(inicio), de_ordinal(fim)))
         return ferias
 
     def get_pessoas(self):
         """Obtém a lista de pessoas"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
+        return [row[0] for row in self.repo.consultar('''
             SELECT nome FROM pessoas WHERE ativo = 1 ORDER BY nome
-        ''')
-        pessoas = [row[0] for row in cursor.fetchall()]
-        conn.close()
-        return pessoas
+        ''')]
 
     def get_anos_ferias(self):
         """Obtém lista de anos únicos com férias"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT DISTINCT strftime('%Y', data_inicio) as ano
+        anos = self.repo.consultar('''
+            SELECT DISTINCT substr(data_inicio, 1, 4) as ano
             FROM ferias
             UNION
-            SELECT DISTINCT strftime('%Y', data_fim) as ano
+            SELECT DISTINCT substr(data_fim, 1, 4) as ano
             FROM ferias
             ORDER BY ano DESC
         ''')
-        anos = [row[0] for row in cursor.fetchall() if row[0]]
-        conn.close()
-        return anos
+        return [row[0] for row in anos if row[0]]
 
 class MapaFeriasWindow(QMainWindow):
     def __init__(self):
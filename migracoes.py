@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Migrações do esquema da base de dados, numeradas por `PRAGMA user_version`.
+
+Cada migração corre uma só vez por base de dados, dentro de uma transação
+que também grava o novo user_version. Com o esquema em dia, o arranque só
+lê o user_version (uma vez por processo): já não há CREATE TABLE,
+PRAGMA table_info nem contagens sempre que se abre um diálogo ou o gerador.
+
+Para alterar o esquema acrescenta-se uma função ao fim de MIGRACOES; nunca
+se alteram migrações já publicadas.
+"""
+
+import regras
+import ciclosFolgas
+from datas import sql_ordinal
+
+# === 1. ESQUEMA BASE ===
+# Idempotente: as bases de dados anteriores às migrações (user_version 0)
+# já têm estas tabelas e ficam iguais; as novas são criadas do zero.
+TABELAS = [
+    '''CREATE TABLE IF NOT EXISTS pessoas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome TEXT NOT NULL UNIQUE,
+        horas_diarias INTEGER DEFAULT 8,
+        cor_hex TEXT DEFAULT '#FFFFFF',
+        ativo BOOLEAN DEFAULT TRUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        cor TEXT DEFAULT "FFFFFF"
+    )''',
+    '''CREATE TABLE IF NOT EXISTS ferias (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        pessoa_id INTEGER NOT NULL,
+        data_inicio DATE NOT NULL,
+        data_fim DATE NOT NULL,
+        descricao TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (pessoa_id) REFERENCES pessoas(id) ON DELETE CASCADE
+    )''',
+    '''CREATE TABLE IF NOT EXISTS horarios_fixos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        pessoa_id INTEGER NOT NULL,
+        data DATE NOT NULL,
+        horario TEXT NOT NULL,
+        descricao TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (pessoa_id) REFERENCES pessoas(id) ON DELETE CASCADE,
+        UNIQUE(pessoa_id, data)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS folgas_ciclo (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        pessoa_id INTEGER NOT NULL,
+        semana_id TEXT NOT NULL,  -- Formato: AAAASS (ex: 202540, 202601)
+        dia_semana INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (pessoa_id) REFERENCES pessoas(id) ON DELETE CASCADE,
+        UNIQUE(pessoa_id, semana_id, dia_semana)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS folgas_especiais (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        pessoa_id INTEGER NOT NULL,
+        data DATE NOT NULL,
+        descricao TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (pessoa_id) REFERENCES pessoas(id) ON DELETE CASCADE,
+        UNIQUE(pessoa_id, data)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS dias_loja_fechada (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        data DATE NOT NULL UNIQUE,
+        descricao TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''',
+    '''CREATE TABLE IF NOT EXISTS escalas_geradas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        data_inicio DATE NOT NULL,
+        num_semanas INTEGER NOT NULL,
+        data_geracao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        descricao TEXT,
+        UNIQUE(data_inicio, num_semanas)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS escala_detalhes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        escala_id INTEGER NOT NULL,
+        pessoa_id INTEGER NOT NULL,
+        data DATE NOT NULL,
+        horario TEXT NOT NULL,
+        dia_semana INTEGER NOT NULL,
+        semana_numero INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (escala_id) REFERENCES escalas_geradas(id) ON DELETE CASCADE,
+        FOREIGN KEY (pessoa_id) REFERENCES pessoas(id) ON DELETE CASCADE,
+        UNIQUE(escala_id, pessoa_id, data)
+    )''',
+]
+
+PESSOAS_INICIAIS = [
+    ('Susana A.', 8, '#E8F5E8'),
+    ('António C.', 8, '#FFF3CD'),
+    ('Antónia F.', 8, '#D4EDDA'),
+    ('Magda G.', 8, '#CCE5FF'),
+    ('Eduardo S.', 8, '#F0E6FF'),
+]
+
+DIAS_FECHADOS_INICIAIS = [
+    ('2025-12-25', 'Natal'),
+    ('2026-01-01', 'Ano Novo'),
+]
+
+
+def _colunas(cursor, tabela):
+    # table_xinfo inclui as colunas geradas
+    cursor.execute(f"PRAGMA table_xinfo({tabela})")
+    return [col[1] for col in cursor.fetchall()]
+
+
+def esquema_base(cursor):
+    for tabela in TABELAS:
+        cursor.execute(tabela)
+
+    # Colunas acrescentadas depois da primeira versão
+    colunas = _colunas(cursor, 'pessoas')
+    if 'cor' not in colunas:
+        cursor.execute('ALTER TABLE pessoas ADD COLUMN cor TEXT DEFAULT "FFFFFF"')
+    if 'cor_hex' not in colunas:
+        cursor.execute("ALTER TABLE pessoas ADD COLUMN cor_hex TEXT DEFAULT '#FFFFFF'")
+
+    # De loja_fechada → dias_loja_fechada
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='loja_fechada'")
+    if cursor.fetchone():
+        cursor.execute('''
+            INSERT OR IGNORE INTO dias_loja_fechada (data)
+            SELECT data FROM loja_fechada
+        ''')
+        cursor.execute('DROP TABLE loja_fechada')
+
+    # Dados iniciais de uma base de dados nova
+    cursor.execute("SELECT COUNT(*) FROM pessoas")
+    if cursor.fetchone()[0] == 0:
+        cursor.executemany(
+            "INSERT OR IGNORE INTO pessoas (nome, horas_diarias, cor_hex) VALUES (?, ?, ?)",
+            PESSOAS_INICIAIS
+        )
+        cursor.executemany(
+            "INSERT OR IGNORE INTO dias_loja_fechada (data, descricao) VALUES (?, ?)",
+            DIAS_FECHADOS_INICIAIS
+        )
+
+    # Políticas de turnos (regras por pessoa/função)
+    regras.criar_tabelas(cursor)
+    regras.inserir_politicas_iniciais(cursor)
+
+
+# === 2. ÍNDICES DE COBERTURA ===
+# Um por consulta frequente; incluem todas as colunas lidas, pelo que as
+# consultas são respondidas só pelo índice, sem ir à tabela.
+INDICES = [
+    # Férias de cada pessoa e filtro por intervalo (gerador, cache, diálogo de férias)
+    'CREATE INDEX IF NOT EXISTS idx_ferias_pessoa_datas ON ferias (pessoa_id, data_inicio, data_fim)',
+    # Horários fixos por intervalo de datas
+    'CREATE INDEX IF NOT EXISTS idx_horarios_fixos_data ON horarios_fixos (data, pessoa_id, horario)',
+    # Ciclo de folgas por semana
+    'CREATE INDEX IF NOT EXISTS idx_folgas_ciclo_semana ON folgas_ciclo (semana_id, pessoa_id, dia_semana)',
+    # Escala guardada lida por data (carregar, comparar versões)
+    'CREATE INDEX IF NOT EXISTS idx_escala_detalhes_data ON escala_detalhes (escala_id, data, pessoa_id, horario)',
+]
+
+
+def indices_cobertura(cursor):
+    for indice in INDICES:
+        cursor.execute(indice)
+    cursor.execute('ANALYZE')
+
+
+# === 3. CICLOS DE FOLGAS POR REGRA ===
+# As linhas de folgas_ciclo passam a exceções por semana de uma regra
+# compacta (ver ciclosFolgas.py); as existentes são compactadas sem mudar
+# as folgas resultantes.
+TABELA_CICLOS = '''CREATE TABLE IF NOT EXISTS ciclos_folgas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    pessoa_id INTEGER NOT NULL,
+    semanas TEXT NOT NULL,    -- JSON: dias de folga de cada semana do padrão, ex: [[5,6],[3,4]]
+    ancora DATE NOT NULL,     -- segunda-feira da primeira semana do padrão
+    valido_de DATE NOT NULL,
+    valido_ate DATE,          -- NULL = sem fim
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (pessoa_id) REFERENCES pessoas(id) ON DELETE CASCADE
+)'''
+
+
+def ciclos_por_regra(cursor):
+    cursor.execute(TABELA_CICLOS)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ciclos_folgas_pessoa ON ciclos_folgas (pessoa_id, id)')
+    ciclosFolgas.compactar_folgas(cursor)
+
+
+# === 4. ORDINAIS DE DIA ===
+# Colunas geradas (virtuais) com o ordinal do dia das datas em TEXT; os
+# índices por data passam a ser sobre os ordinais e os de texto deixam de
+# ser usados.
+COLUNAS_ORDINAIS = [
+    ('ferias', 'inicio_dia', 'data_inicio'),
+    ('ferias', 'fim_dia', 'data_fim'),
+    ('horarios_fixos', 'dia', 'data'),
+    ('dias_loja_fechada', 'dia', 'data'),
+]
+INDICES_ORDINAIS = [
+    # Férias de uma pessoa que se sobrepõem a um intervalo (gerador, diálogo de férias)
+    'CREATE INDEX IF NOT EXISTS idx_ferias_pessoa_dias ON ferias (pessoa_id, inicio_dia, fim_dia)',
+    # Férias que se sobrepõem a um intervalo (cache, filtro por ano do mapa de férias)
+    'CREATE INDEX IF NOT EXISTS idx_ferias_dias ON ferias (inicio_dia, fim_dia, pessoa_id)',
+    'CREATE INDEX IF NOT EXISTS idx_horarios_fixos_dia ON horarios_fixos (dia, pessoa_id, horario)',
+    'CREATE INDEX IF NOT EXISTS idx_dias_loja_fechada_dia ON dias_loja_fechada (dia, descricao)',
+    'DROP INDEX IF EXISTS idx_ferias_pessoa_datas',
+    'DROP INDEX IF EXISTS idx_horarios_fixos_data',
+]
+
+
+def ordinais_de_dia(cursor):
+    for tabela, coluna, origem in COLUNAS_ORDINAIS:
+        if coluna not in _colunas(cursor, tabela):
+            cursor.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} INTEGER "
+                           f"GENERATED ALWAYS AS ({sql_ordinal(origem)}) VIRTUAL")
+    for indice in INDICES_ORDINAIS:
+        cursor.execute(indice)
+    cursor.execute('ANALYZE')
+
+
+# === 5. VERSÕES DE ESCALAS ===
+# Cada gravação é uma nova versão: sai o UNIQUE(data_inicio, num_semanas),
+# que obrigava a substituir a versão anterior do mesmo horizonte. O SQLite
+# não remove restrições com ALTER TABLE, por isso a tabela é reconstruída.
+TABELA_ESCALAS = '''CREATE TABLE escalas_geradas_nova (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    data_inicio DATE NOT NULL,
+    num_semanas INTEGER NOT NULL,
+    data_geracao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    descricao TEXT
+)'''
+
+
+def versoes_de_escalas(cursor):
+    cursor.execute(TABELA_ESCALAS)
+    cursor.execute('''
+        INSERT INTO escalas_geradas_nova (id, data_inicio, num_semanas, data_geracao, descricao)
+        SELECT id, data_inicio, num_semanas, data_geracao, descricao FROM escalas_geradas
+    ''')
+    cursor.execute('DROP TABLE escalas_geradas')
+    cursor.execute('ALTER TABLE escalas_geradas_nova RENAME TO escalas_geradas')
+
+
+# (versão, descrição, função(cursor)), por ordem
+MIGRACOES = [
+    (1, 'Esquema base', esquema_base),
+    (2, 'Índices de cobertura', indices_cobertura),
+    (3, 'Ciclos de folgas por regra', ciclos_por_regra),
+    (4, 'Ordinais de dia', ordinais_de_dia),
+    (5, 'Versões de escalas', versoes_de_escalas),
+]
+VERSAO_ESQUEMA = MIGRACOES[-1][0]
+
+
+def versao(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrar(repo):
+    """Aplica as migrações em falta; devolve as versões aplicadas (lista vazia se estava em dia)"""
+    if repo.versao_esquema == VERSAO_ESQUEMA:
+        return []
+    aplicadas = []
+    if versao(repo.conn) < VERSAO_ESQUEMA:
+        with repo.transacao() as conn:
+            # BEGIN IMMEDIATE: outro processo não pode migrar ao mesmo tempo
+            conn.execute('BEGIN IMMEDIATE')
+            atual = versao(conn)
+            cursor = conn.cursor()
+            for numero, descricao, aplicar in MIGRACOES:
+                if numero > atual:
+                    aplicar(cursor)
+                    conn.execute(f'PRAGMA user_version = {numero}')
+                    aplicadas.append(numero)
+    repo.versao_esquema = VERSAO_ESQUEMA
+    return aplicadas
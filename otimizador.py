@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modo de otimização da escala por pesquisa local.
+
+Parte do resultado do gerador (passagem gulosa) e, dentro de um orçamento de
+tempo, experimenta reatribuições de turnos e trocas entre pessoas no mesmo
+dia. Horários fixos, folgas, férias e dias de loja fechada nunca são
+alterados. A cobertura obrigatória (fecho às 20:00 e abertura) é
+lexicográfica: nenhum movimento pode tirar o fecho ou a abertura a um dia.
+O resto do custo soma os turnos cedo em excesso, a dispersão de fechos e
+turnos cedo face à média da equipa, as horas e a suavização; cada movimento
+é avaliado pela diferença (delta) só no dia e pessoas afetados.
+
+A melhor escala só substitui a gulosa se nenhum indicador do relatório
+piorar.
+"""
+
+import math
+import random
+import time
+
+from turnos import Shift, mascara_horas
+
+INICIO_05_07 = mascara_horas(5, 6, 7)
+
+# Pesos de cobertura usados na pontuação de cenários (aqui a cobertura é lexicográfica)
+PESO_SEM_FECHO = 10.0       # dia sem ninguém a acabar às 20:00
+PESO_SEM_ABERTURA = 10.0    # dia sem ninguém a começar entre as 05 e as 07h
+# Pesos do custo da pesquisa local
+PESO_EXCESSO_CEDO = 1.0     # por turno cedo (início <= 07h) acima de MAX_CEDO
+PESO_EQUIDADE = 1.0         # soma dos quadrados dos desvios à média da equipa (fechos e turnos cedo)
+PESO_HORAS = 1.0            # por hora de desvio face às horas da escala inicial
+PESO_SUAVIZAR = 1.0         # salto de horário entre dias seguidos acima de suavizar_horas
+MAX_CEDO = 2
+
+
+def _fecha(turno):
+    return 1 if turno.fecha else 0
+
+
+def _cedo(turno):
+    return 1 if turno.is_trabalho and turno.hora_inicio <= 7 else 0
+
+
+class LocalSearchOptimizer:
+    """Pesquisa local (recozimento simulado) sobre a escala gerada"""
+
+    def __init__(self, generator, seed=None):
+        self.generator = generator
+        self.store = generator.schedule_data
+        self.random = random.Random(seed)
+        self.pessoas = list(generator.pessoas.keys())
+        politicas = dict(generator.despacho)
+
+        fixos = generator.restricoes
+        self.dias = store_dias = self.store.dias_preenchidos()
+        # grelha[d][i] = Shift da pessoa i no dia d
+        self.grelha = {d: [Shift.parse(self.store.get(d, p)) for p in self.pessoas] for d in store_dias}
+        # Células que podem mudar: turnos de trabalho que não são horário fixo
+        self.moveis = [
+            (d, i) for d in store_dias for i, p in enumerate(self.pessoas)
+            if self.grelha[d][i].is_trabalho and fixos.horario_fixo(p, d) is None
+        ]
+        self.moveis_dia = {}
+        for d, i in self.moveis:
+            self.moveis_dia.setdefault(d, []).append(i)
+        self.dias_troca = [d for d, pessoas in self.moveis_dia.items() if len(pessoas) >= 2]
+
+        # Turnos possíveis por pessoa: os da política e os que já teve na escala
+        self.candidatos = []
+        self.suavizar = []
+        for i, p in enumerate(self.pessoas):
+            politica = politicas.get(p)
+            textos = set()
+            if politica is not None:
+                textos.update((politica.turno_base, politica.turno_abertura, politica.turno_fecho))
+                textos.update(t for t in (politica.turno_tarde, politica.quinzenal_a, politica.quinzenal_b) if t)
+                textos.update(t for _, _, t in politica.regras if t)
+            textos.update(self.grelha[d][i].texto for d in store_dias if self.grelha[d][i].is_trabalho)
+            turnos = sorted((Shift.parse(t) for t in textos), key=lambda s: (s.inicio, s.fim))
+            self.candidatos.append([t for t in turnos if t.is_trabalho])
+            self.suavizar.append(politica.suavizar_horas if politica is not None else None)
+
+        # Estado agregado para avaliação incremental
+        self.recalcular()
+        self.minutos_alvo = list(self.minutos)
+
+    # ------------------------------------------------------------------
+    # Custo
+    # ------------------------------------------------------------------
+    def cobertura_dia(self, turnos):
+        """(sem fecho, sem abertura, turnos cedo em excesso) de um dia"""
+        if not any(t.is_trabalho for t in turnos):
+            return 0, 0, 0  # loja fechada ou ninguém a trabalhar
+        inicio = cedo = 0
+        fecha = False
+        for t in turnos:
+            inicio |= t.bit_inicio
+            fecha = fecha or t.fecha
+            cedo += _cedo(t)
+        return int(not fecha), int(not inicio & INICIO_05_07), max(cedo - MAX_CEDO, 0)
+
+    def custo_suavizar(self, i, d, turno):
+        """Penalização de salto de horário com os dias vizinhos"""
+        limite = self.suavizar[i]
+        if not limite or not turno.is_trabalho:
+            return 0.0
+        custo = 0.0
+        for vizinho in (d - 1, d + 1):
+            outro = self.grelha.get(vizinho)
+            if outro is not None and outro[i].is_trabalho and \
+                    abs(outro[i].hora_inicio - turno.hora_inicio) > limite:
+                custo += PESO_SUAVIZAR
+        return custo
+
+    def custo_equidade(self):
+        """Dispersão de fechos e turnos cedo face à média da equipa"""
+        return PESO_EQUIDADE * (_dispersao(self.fechos) + _dispersao(self.cedos))
+
+    def custo_horas(self, i):
+        return PESO_HORAS * abs(self.minutos[i] - self.minutos_alvo[i]) / 60
+
+    def custo_total(self):
+        """Custo sem a cobertura obrigatória (que nunca piora)"""
+        total = PESO_EXCESSO_CEDO * self.excesso_cedo + self.custo_equidade()
+        total += sum(self.custo_horas(i) for i in range(len(self.pessoas)))
+        for d in self.dias:
+            for i, t in enumerate(self.grelha[d]):
+                total += self.custo_suavizar(i, d, t) / 2  # cada par contado duas vezes
+        return total
+
+    def contar(self, linha, nova):
+        """Atualiza as contagens por pessoa ao passar de uma linha do dia para outra"""
+        for i, (antigo, turno) in enumerate(zip(linha, nova)):
+            if antigo is not turno:
+                self.fechos[i] += _fecha(turno) - _fecha(antigo)
+                self.cedos[i] += _cedo(turno) - _cedo(antigo)
+                self.minutos[i] += turno.minutos - antigo.minutos
+
+    def delta(self, d, mudancas):
+        """Efeito de aplicar [(pessoa, novo_turno)] no dia d.
+
+        Devolve (falhas de cobertura corrigidas, delta do custo, nova linha,
+        cobertura do dia), ou None se o dia perder o fecho ou a abertura.
+        """
+        linha = self.grelha[d]
+        nova = list(linha)
+        for i, turno in mudancas:
+            nova[i] = turno
+        sem_fecho, sem_abertura, excesso = cobertura = self.cobertura_dia(nova)
+        antes = self.cobertura[d]
+        if sem_fecho > antes[0] or sem_abertura > antes[1]:
+            return None
+        corrigidas = antes[0] + antes[1] - sem_fecho - sem_abertura
+
+        delta = PESO_EXCESSO_CEDO * (excesso - antes[2]) - self.custo_equidade()
+        delta -= sum(self.custo_horas(i) for i, _ in mudancas)
+        self.contar(linha, nova)
+        delta += self.custo_equidade() + sum(self.custo_horas(i) for i, _ in mudancas)
+        self.contar(nova, linha)
+        for i, turno in mudancas:
+            delta += self.custo_suavizar(i, d, turno) - self.custo_suavizar(i, d, linha[i])
+        return corrigidas, delta, nova, cobertura
+
+    def aplicar(self, d, nova, cobertura):
+        """Substitui a linha do dia; devolve a anterior (para a poder repor)"""
+        linha = self.grelha[d]
+        self.contar(linha, nova)
+        antes = self.cobertura[d]
+        self.sem_fecho += cobertura[0] - antes[0]
+        self.sem_abertura += cobertura[1] - antes[1]
+        self.excesso_cedo += cobertura[2] - antes[2]
+        self.cobertura[d] = cobertura
+        self.grelha[d] = nova
+        return linha
+
+    # ------------------------------------------------------------------
+    # Movimentos
+    # ------------------------------------------------------------------
+    def movimento(self):
+        """Sorteia uma reatribuição ou uma troca; devolve (dia, mudanças) ou None"""
+        rnd = self.random
+        if self.dias_troca and rnd.random() < 0.3:
+            d = rnd.choice(self.dias_troca)
+            i, j = rnd.sample(self.moveis_dia[d], 2)
+            a, b = self.grelha[d][i], self.grelha[d][j]
+            if a == b or b not in self.candidatos[i] or a not in self.candidatos[j]:
+                return None
+            return d, [(i, b), (j, a)]
+        d, i = rnd.choice(self.moveis)
+        opcoes = self.candidatos[i]
+        if len(opcoes) < 2:
+            return None
+        turno = rnd.choice(opcoes)
+        if turno == self.grelha[d][i]:
+            return None
+        return d, [(i, turno)]
+
+    # ------------------------------------------------------------------
+    # Pesquisa
+    # ------------------------------------------------------------------
+    def resumo(self, custo):
+        """Indicadores do relatório a partir do estado agregado"""
+        return {
+            'dias_sem_fecho': self.sem_fecho,
+            'dias_sem_abertura': self.sem_abertura,
+            'turnos_cedo_em_excesso': self.excesso_cedo,
+            'desvio_fechos': _desvio(self.fechos),
+            'desvio_cedos': _desvio(self.cedos),
+            'custo': round(custo, 2),
+        }
+
+    def indicadores(self):
+        """Cobertura e equidade da grelha atual"""
+        return self.resumo(self.custo_total())
+
+    def otimizar(self, orcamento=2.0, temperatura=2.0, job=None):
+        """Pesquisa local durante `orcamento` segundos; devolve o relatório.
+
+        Só conta como melhor uma grelha com menos falhas de cobertura, ou
+        as mesmas e menor custo, em que nenhum indicador seja pior do que na
+        escala gulosa; se não houver nenhuma, a gulosa mantém-se. Com um Job,
+        o cancelamento é verificado junto com o relógio; se for cancelada a
+        escala do gerador fica como estava.
+        """
+        antes = self.indicadores()
+        inicio = time.perf_counter()
+        fim = inicio + orcamento
+        custo = antes['custo']
+        melhor = (self.sem_fecho + self.sem_abertura, custo)
+        # Linhas substituídas desde a melhor grelha (para voltar a ela no fim)
+        diario = []
+        testados = aceites = 0
+        agora = inicio
+        while self.moveis:
+            if testados & 255 == 0:
+                agora = time.perf_counter()
+                if agora >= fim:
+                    break
+                if job is not None:
+                    job.checkpoint((agora - inicio) / orcamento)
+            testados += 1
+            mov = self.movimento()
+            if mov is None:
+                continue
+            avaliado = self.delta(*mov)
+            if avaliado is None:
+                continue  # perderia o fecho ou a abertura
+            corrigidas, delta, nova, cobertura = avaliado
+            t = temperatura * (fim - agora) / orcamento if orcamento > 0 else 0
+            if corrigidas > 0 or delta <= 0 or (t > 0 and self.random.random() < math.exp(-delta / t)):
+                d = mov[0]
+                diario.append((d, self.aplicar(d, nova, cobertura)))
+                aceites += 1
+                custo += delta
+                atual = (self.sem_fecho + self.sem_abertura, custo)
+                if atual[0] < melhor[0] or (atual[0] == melhor[0] and atual[1] < melhor[1] - 1e-9):
+                    if _nao_pior(self.resumo(custo), antes):
+                        melhor = atual
+                        diario = []
+
+        for d, linha in reversed(diario):
+            self.grelha[d] = linha
+        self.recalcular()
+        segundos = time.perf_counter() - inicio
+        alterados = self.escrever()
+        depois = self.indicadores()
+        return {
+            'antes': antes,
+            'depois': depois,
+            'melhorou': depois != antes and _nao_pior(depois, antes),
+            'movimentos_testados': testados,
+            'movimentos_aceites': aceites,
+            'movimentos_por_segundo': int(testados / segundos) if segundos > 0 else 0,
+            'segundos': round(segundos, 3),
+            'celulas_alteradas': alterados,
+        }
+
+    def recalcular(self):
+        """Recalcula o estado agregado a partir da grelha"""
+        n = len(self.pessoas)
+        self.fechos = [0] * n
+        self.cedos = [0] * n
+        self.minutos = [0] * n
+        for d in self.dias:
+            for i, t in enumerate(self.grelha[d]):
+                self.fechos[i] += _fecha(t)
+                self.cedos[i] += _cedo(t)
+                self.minutos[i] += t.minutos
+        self.cobertura = {d: self.cobertura_dia(self.grelha[d]) for d in self.dias}
+        self.sem_fecho = sum(c[0] for c in self.cobertura.values())
+        self.sem_abertura = sum(c[1] for c in self.cobertura.values())
+        self.excesso_cedo = sum(c[2] for c in self.cobertura.values())
+
+    def escrever(self):
+        """Copia a grelha para a escala do gerador; devolve o número de células alteradas"""
+        alterados = 0
+        for d in self.dias:
+            for i, p in enumerate(self.pessoas):
+                texto = self.grelha[d][i].texto
+                if self.store.get(d, p) != texto:
+                    self.store.set(d, p, texto)
+                    alterados += 1
+        return alterados
+
+
+def _dispersao(valores):
+    """Soma dos quadrados dos desvios à média"""
+    if not valores:
+        return 0.0
+    media = sum(valores) / len(valores)
+    return sum((v - media) ** 2 for v in valores)
+
+
+def _desvio(valores):
+    """Desvio padrão (populacional)"""
+    if not valores:
+        return 0.0
+    return round(math.sqrt(_dispersao(valores) / len(valores)), 2)
+
+
+def _nao_pior(indicadores, referencia):
+    """Se nenhum indicador (todos a minimizar) é pior do que na referência"""
+    return all(indicadores[chave] <= referencia[chave] for chave in referencia)
+
+
+def otimizar(generator, orcamento=2.0, seed=None, job=None):
+    """Otimiza a escala já gerada do gerador (em memória) e devolve o relatório"""
+    return LocalSearchOptimizer(generator, seed).otimizar(orcamento, job=job)
+
+
+def formatar_relatorio(relatorio):
+    """Texto do relatório para o separador de resumo"""
+    antes, depois = relatorio['antes'], relatorio['depois']
+    linhas = [
+        "OTIMIZAÇÃO (PESQUISA LOCAL):",
+        "-" * 40,
+        f"{'Indicador':<24} {'Guloso':>8} {'Otimizado':>10}",
+    ]
+    for chave, nome in [('dias_sem_fecho', 'Dias sem fecho 20:00'),
+                        ('dias_sem_abertura', 'Dias sem abertura'),
+                        ('turnos_cedo_em_excesso', 'Turnos cedo a mais'),
+                        ('desvio_fechos', 'Desvio de fechos'),
+                        ('desvio_cedos', 'Desvio de turnos cedo'),
+                        ('custo', 'Custo total')]:
+        linhas.append(f"{nome:<24} {antes[chave]:>8} {depois[chave]:>10}")
+    if relatorio['melhorou']:
+        linhas.append("Melhoria sem piorar nenhum indicador.")
+    else:
+        linhas.append("Sem melhoria em todos os indicadores: mantém-se a escala gulosa.")
+    linhas.append(f"{relatorio['movimentos_testados']} movimentos em {relatorio['segundos']}s "
+                  f"({relatorio['movimentos_por_segundo']}/s), {relatorio['celulas_alteradas']} células alteradas")
+    return "\n".join(linhas) + "\n"
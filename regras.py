@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Políticas de turnos guardadas em SQLite.
+
+Cada pessoa (ou função) tem uma política com turno base, regras por dia da
+semana, alternância quinzenal, papéis de cobertura (abertura, fecho, ajuste
+quando já há turno da tarde) e prioridade de processamento. As políticas são
+compiladas numa tabela de despacho antes do ciclo diário do gerador, pelo que
+adicionar pessoas não exige alterar código.
+"""
+
+# Condições das regras (avaliadas pela ordem, a primeira que se aplica ganha)
+SEMPRE = 'sempre'
+TARDE_OCUPADA = 'tarde_ocupada'   # outra pessoa já começa às 11, 12 ou 13h
+SEM_FECHO = 'sem_fecho'           # ninguém acaba às 20:00
+SEM_ABERTURA = 'sem_abertura'     # ninguém começa às 05 ou 06h
+QUINZENAL = 'quinzenal'           # alternância quinzenal da política
+
+# Condições para ser escolhido para o fecho às 20:00
+FECHO_SEM_TURNO_13 = 'sem_turno_13'      # ninguém começa às 13h
+FECHO_COM_TURNO_CEDO = 'com_turno_cedo'  # já há alguém às 05 ou 06h
+FECHO_NAO_ABRE = 'nao_abre'              # a própria pessoa não começa às 05h
+FECHO_QUINZENAL = 'quinzenal_fecho'      # o turno quinzenal do dia é o de fecho
+
+FUNCAO_GERAL = 'geral'
+TODOS_OS_DIAS = '0123456'
+
+CREATE_POLITICAS = '''
+    CREATE TABLE IF NOT EXISTS politicas_turno (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        pessoa_id INTEGER UNIQUE,
+        funcao TEXT UNIQUE,
+        prioridade INTEGER DEFAULT 100,
+        turno_base TEXT DEFAULT '09:00 - 18:00',
+        turno_tarde TEXT,
+        tarde_dias TEXT DEFAULT '0123456',
+        turno_abertura TEXT DEFAULT '07:00 - 16:00',
+        turno_fecho TEXT DEFAULT '11:00 - 20:00',
+        fecho_ordem INTEGER,
+        fecho_condicoes TEXT,
+        fecho_dias TEXT DEFAULT '0123456',
+        quinzenal_a TEXT,
+        quinzenal_b TEXT,
+        quinzenal_desfasamento INTEGER DEFAULT 0,
+        suavizar_horas INTEGER,
+        FOREIGN KEY (pessoa_id) REFERENCES pessoas(id) ON DELETE CASCADE
+    )
+'''
+
+CREATE_REGRAS = '''
+    CREATE TABLE IF NOT EXISTS regras_turno (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        politica_id INTEGER NOT NULL,
+        ordem INTEGER NOT NULL,
+        dias TEXT DEFAULT '0123456',
+        condicao TEXT DEFAULT 'sempre',
+        turno TEXT,
+        FOREIGN KEY (politica_id) REFERENCES politicas_turno(id) ON DELETE CASCADE
+    )
+'''
+
+# Políticas iniciais: reproduzem as regras que estavam fixas no gerador
+POLITICAS_INICIAIS = {
+    'Susana A.': (
+        {'prioridade': 1, 'turno_base': 'FOLGA'},
+        [('01234', SEMPRE, '05:00 - 14:00')],
+    ),
+    'Antónia F.': (
+        {'prioridade': 2, 'turno_base': '07:00 - 16:00'},
+        [('1', SEMPRE, '06:00 - 15:00')],
+    ),
+    'António C.': (
+        {'prioridade': 3, 'turno_base': '09:00 - 18:00', 'turno_tarde': '09:00 - 18:00',
+         'fecho_ordem': 3, 'fecho_condicoes': 'sem_turno_13,com_turno_cedo,quinzenal_fecho',
+         'fecho_dias': '01234', 'quinzenal_a': '09:00 - 18:00', 'quinzenal_b': '11:00 - 20:00',
+         'quinzenal_desfasamento': 4, 'suavizar_horas': 3},
+        [(TODOS_OS_DIAS, TARDE_OCUPADA, '09:00 - 18:00'),
+         ('56', SEM_FECHO, '11:00 - 20:00'),
+         ('56', SEM_ABERTURA, '08:00 - 17:00'),
+         ('56', SEMPRE, '09:00 - 18:00'),
+         ('01234', QUINZENAL, None)],
+    ),
+    'Magda G.': (
+        {'prioridade': 4, 'turno_base': '13:00 - 22:00',
+         'fecho_ordem': 2, 'fecho_condicoes': 'sem_turno_13,com_turno_cedo'},
+        [],
+    ),
+    'Eduardo S.': (
+        {'prioridade': 5, 'turno_base': '06:00 - 15:00', 'turno_tarde': '06:00 - 15:00',
+         'tarde_dias': '023456', 'turno_abertura': '06:00 - 15:00',
+         'fecho_ordem': 1, 'fecho_condicoes': 'sem_turno_13,nao_abre', 'fecho_dias': '023456'},
+        [('1', SEMPRE, '05:00 - 14:00'),
+         (TODOS_OS_DIAS, TARDE_OCUPADA, '06:00 - 15:00'),
+         (TODOS_OS_DIAS, SEM_FECHO, '11:00 - 20:00')],
+    ),
+}
+
+
+def mascara_dias(dias):
+    """'01234' -> máscara de 7 bits (bit 0 = Segunda)"""
+    mascara = 0
+    for c in dias or '':
+        if c.isdigit() and int(c) < 7:
+            mascara |= 1 << int(c)
+    return mascara
+
+
+class Politica:
+    """Política de turnos compilada (regras já convertidas em máscaras)"""
+
+    __slots__ = ('id', 'pessoa_id', 'funcao', 'prioridade', 'turno_base', 'turno_tarde',
+                 'tarde_dias', 'turno_abertura', 'turno_fecho', 'fecho_ordem',
+                 'fecho_condicoes', 'fecho_dias', 'quinzenal_a', 'quinzenal_b',
+                 'quinzenal_desfasamento', 'suavizar_horas', 'regras')
+
+    def __init__(self, row, regras=()):
+        self.id = row['id']
+        self.pessoa_id = row['pessoa_id']
+        self.funcao = row['funcao']
+        self.prioridade = row['prioridade'] if row['prioridade'] is not None else 100
+        self.turno_base = row['turno_base'] or '09:00 - 18:00'
+        self.turno_tarde = row['turno_tarde']
+        self.tarde_dias = mascara_dias(row['tarde_dias'] or TODOS_OS_DIAS)
+        self.turno_abertura = row['turno_abertura'] or '07:00 - 16:00'
+        self.turno_fecho = row['turno_fecho'] or '11:00 - 20:00'
+        self.fecho_ordem = row['fecho_ordem']
+        self.fecho_condicoes = frozenset(
+            c.strip() for c in (row['fecho_condicoes'] or '').split(',') if c.strip()
+        )
+        self.fecho_dias = mascara_dias(row['fecho_dias'] or TODOS_OS_DIAS)
+        self.quinzenal_a = row['quinzenal_a']
+        self.quinzenal_b = row['quinzenal_b']
+        self.quinzenal_desfasamento = row['quinzenal_desfasamento'] or 0
+        self.suavizar_horas = row['suavizar_horas']
+        # (máscara de dias, condição, turno) pela ordem de avaliação
+        self.regras = tuple(regras)
+
+    def turno_quinzenal(self, total_days):
+        """Turno da alternância quinzenal para o dia do horizonte"""
+        if not self.quinzenal_a:
+            return self.turno_base
+        periodo = (total_days - self.quinzenal_desfasamento) // 7
+        return self.quinzenal_a if periodo % 2 == 0 else (self.quinzenal_b or self.quinzenal_a)
+
+
+def criar_tabelas(cursor):
+    """Cria as tabelas de políticas e a coluna pessoas.funcao, se faltarem"""
+    cursor.execute(CREATE_POLITICAS)
+    cursor.execute(CREATE_REGRAS)
+    cursor.execute("PRAGMA table_info(pessoas)")
+    if 'funcao' not in [col[1] for col in cursor.fetchall()]:
+        cursor.execute('ALTER TABLE pessoas ADD COLUMN funcao TEXT')
+
+
+def inserir_politicas_iniciais(cursor):
+    """Insere as políticas iniciais se a tabela estiver vazia e já houver pessoas"""
+    cursor.execute("SELECT COUNT(*) FROM politicas_turno")
+    if cursor.fetchone()[0] > 0:
+        return
+    cursor.execute("SELECT COUNT(*) FROM pessoas")
+    if cursor.fetchone()[0] == 0:
+        return
+    cursor.execute("INSERT INTO politicas_turno (funcao) VALUES (?)", (FUNCAO_GERAL,))
+    for nome, (campos, regras) in POLITICAS_INICIAIS.items():
+        cursor.execute("SELECT id FROM pessoas WHERE nome = ?", (nome,))
+        row = cursor.fetchone()
+        if not row:
+            continue
+        colunas = ['pessoa_id'] + list(campos.keys())
+        cursor.execute(
+            f"INSERT INTO politicas_turno ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})",
+            [row[0]] + list(campos.values())
+        )
+        politica_id = cursor.lastrowid
+        cursor.executemany(
+            "INSERT INTO regras_turno (politica_id, ordem, dias, condicao, turno) VALUES (?, ?, ?, ?, ?)",
+            [(politica_id, ordem, dias, condicao, turno)
+             for ordem, (dias, condicao, turno) in enumerate(regras)]
+        )
+
+
+def carregar_politicas(conn):
+    """Lê as políticas e regras; devolve ({pessoa_id: Politica}, {funcao: Politica})"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT politica_id, dias, condicao, turno
+        FROM regras_turno
+        ORDER BY politica_id, ordem
+    ''')
+    regras = {}
+    for politica_id, dias, condicao, turno in cursor.fetchall():
+        regras.setdefault(politica_id, []).append((mascara_dias(dias), condicao or SEMPRE, turno))
+
+    cursor.execute('SELECT * FROM politicas_turno')
+    colunas = [d[0] for d in cursor.description]
+    por_pessoa = {}
+    por_funcao = {}
+    for valores in cursor.fetchall():
+        row = dict(zip(colunas, valores))
+        politica = Politica(row, regras.get(row['id'], ()))
+        if row['pessoa_id'] is not None:
+            por_pessoa[row['pessoa_id']] = politica
+        elif row['funcao']:
+            por_funcao[row['funcao']] = politica
+    return por_pessoa, por_funcao
+
+
+def politica_de(info, por_pessoa, por_funcao):
+    """Política da pessoa: individual, senão a da sua função, senão a geral"""
+    politica = por_pessoa.get(info.get('id'))
+    if politica is None:
+        politica = por_funcao.get(info.get('funcao') or FUNCAO_GERAL) or por_funcao.get(FUNCAO_GERAL)
+    if politica is None:
+        politica = Politica({'id': None, 'pessoa_id': None, 'funcao': FUNCAO_GERAL, 'prioridade': 100,
+                             'turno_base': None, 'turno_tarde': None, 'tarde_dias': None,
+                             'turno_abertura': None, 'turno_fecho': None, 'fecho_ordem': None,
+                             'fecho_condicoes': None, 'fecho_dias': None, 'quinzenal_a': None,
+                             'quinzenal_b': None, 'quinzenal_desfasamento': 0, 'suavizar_horas': None})
+    return politica
+
+
+def compilar_despacho(pessoas, por_pessoa, por_funcao):
+    """Lista [(nome, Politica)] pela ordem de processamento (prioridade, ordem original)"""
+    despacho = [(nome, politica_de(info, por_pessoa, por_funcao)) for nome, info in pessoas.items()]
+    ordem = {nome: i for i, (nome, _) in enumerate(despacho)}
+    despacho.sort(key=lambda item: (item[1].prioridade, ordem[item[0]]))
+    return despacho
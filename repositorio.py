@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Acesso partilhado às bases de dados SQLite.
+
+Cada processo tem uma só ligação longa por ficheiro (Repository), aberta no
+primeiro uso e partilhada por todos os diálogos, o gerador e as caches; as
+escritas passam por `transacao`, protegida por um lock, e podem vir de
+qualquer thread. As leituras nas threads de trabalho usam ligações só de
+leitura próprias da thread, que em modo WAL não bloqueiam nem são
+bloqueadas pela escrita; são fechadas no fim de cada tarefa
+(`libertar_leituras`, chamada pelo JobWorker).
+
+A ligação fica com journal WAL, synchronous=NORMAL, cache de páginas e
+mmap maiores e uma cache de instruções preparadas: como as consultas são
+sempre as mesmas strings, o sqlite3 reutiliza-as em vez de as compilar de
+novo em cada chamada.
+"""
+
+import os
+import sys
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote
+
+DB_PADRAO = 'escala_trabalho.db'
+
+# Pragmas por ligação (a de escrita e as só de leitura)
+PRAGMAS = (
+    'PRAGMA cache_size = -16000',      # 16 MB de cache de páginas
+    'PRAGMA mmap_size = 268435456',    # até 256 MB lidos por mmap
+    'PRAGMA temp_store = MEMORY',
+)
+INSTRUCOES_EM_CACHE = 256
+
+
+def _copiar_bd_do_executavel(db_path):
+    """No executável (PyInstaller), copia a base de dados incluída se ainda não existir"""
+    if getattr(sys, 'frozen', False):
+        bundled_db = os.path.join(sys._MEIPASS, os.path.basename(db_path))
+        if os.path.exists(bundled_db) and not os.path.exists(db_path):
+            shutil.copy(bundled_db, db_path)
+
+
+def _abrir(db_path, so_leitura=False):
+    if so_leitura:
+        conn = sqlite3.connect(f"file:{quote(os.path.abspath(db_path))}?mode=ro", uri=True,
+                               check_same_thread=False, cached_statements=INSTRUCOES_EM_CACHE)
+    else:
+        conn = sqlite3.connect(db_path, timeout=10, check_same_thread=False,
+                               cached_statements=INSTRUCOES_EM_CACHE)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class Repository:
+    """Ligação longa a uma base de dados, com leituras por thread e escritas serializadas"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = _abrir(db_path)
+        self.lock = threading.RLock()
+        self._local = threading.local()
+        self._leitores = set()
+        # Versão do esquema já verificada neste processo (migracoes.migrar)
+        self.versao_esquema = None
+
+    def leitura(self):
+        """Ligação para ler na thread atual (a principal na thread principal, senão só de leitura)"""
+        if threading.current_thread() is threading.main_thread():
+            return self.conn
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = _abrir(self.db_path, so_leitura=True)
+            with self.lock:
+                self._leitores.add(conn)
+        return conn
+
+    def libertar_leitura(self):
+        """Fecha a ligação só de leitura da thread atual (no fim de uma tarefa)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            with self.lock:
+                self._leitores.discard(conn)
+            conn.close()
+
+    @contextmanager
+    def transacao(self):
+        """Escrita numa só transação: commit no fim, rollback se houver exceção"""
+        with self.lock:
+            with self.conn:
+                yield self.conn
+
+    def consultar(self, sql, params=()):
+        """Linhas (tuplas) de uma consulta"""
+        return self.leitura().execute(sql, params).fetchall()
+
+    def consultar_um(self, sql, params=()):
+        return self.leitura().execute(sql, params).fetchone()
+
+    def consultar_dicts(self, sql, params=()):
+        """Linhas de uma consulta como dicionários coluna -> valor"""
+        cursor = self.leitura().cursor()
+        cursor.row_factory = sqlite3.Row
+        return [dict(row) for row in cursor.execute(sql, params)]
+
+    def executar(self, sql, params=()):
+        with self.transacao() as conn:
+            return conn.execute(sql, params)
+
+    def executar_muitos(self, sql, linhas):
+        with self.transacao() as conn:
+            return conn.executemany(sql, linhas)
+
+    def fechar(self):
+        with self.lock:
+            for conn in self._leitores:
+                conn.close()
+            self._leitores.clear()
+            self.conn.close()
+
+
+_repositorios = {}
+_pid = os.getpid()
+_lock = threading.Lock()
+
+
+def repositorio(db_path=DB_PADRAO):
+    """Repository partilhado do processo para o ficheiro indicado"""
+    global _pid
+    chave = os.path.abspath(db_path)
+    with _lock:
+        if os.getpid() != _pid:
+            # Processo filho (fork): as ligações do pai não podem ser usadas
+            _repositorios.clear()
+            _pid = os.getpid()
+        repo = _repositorios.get(chave)
+        if repo is None:
+            _copiar_bd_do_executavel(db_path)
+            repo = _repositorios[chave] = Repository(db_path)
+        return repo
+
+
+def libertar_leituras():
+    """Fecha as ligações só de leitura da thread atual em todos os repositórios"""
+    with _lock:
+        repos = list(_repositorios.values())
+    for repo in repos:
+        repo.libertar_leitura()
+
+
+def fechar_todos():
+    """Fecha todas as ligações do processo (ao sair da aplicação)"""
+    with _lock:
+        for repo in _repositorios.values():
+            repo.fechar()
+        _repositorios.clear()
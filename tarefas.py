@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tarefas longas canceláveis (geração e exportação de escalas).
+
+Um Job é partilhado entre a interface e o código que faz o trabalho: este
+chama `checkpoint` entre semanas ou blocos de linhas, o que atualiza a
+fração concluída e lança Cancelado se o utilizador tiver pedido para parar.
+O progresso pode ser dividido em fases (por exemplo geração e otimização),
+cada uma com a sua parte da barra. O tempo decorrido e o tempo restante
+estimado são calculados a partir da fração concluída.
+
+JobWorker é a QThread base dos workers da interface: corre `executar(job)`
+e transforma o progresso, o cancelamento e os erros em sinais Qt.
+"""
+
+import time
+import threading
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from repositorio import libertar_leituras
+
+PASSOS = 1000  # resolução da barra de progresso (permilagem)
+
+
+class Cancelado(Exception):
+    """A tarefa foi cancelada pelo utilizador"""
+
+
+class Job:
+    """Cancelamento, progresso e tempos de uma tarefa longa"""
+
+    def __init__(self, callback=None, intervalo=0.05):
+        # callback(fracao, decorrido, restante, mensagem); chamado no máximo a cada `intervalo` s
+        self.callback = callback
+        self.intervalo = intervalo
+        self._cancelado = threading.Event()
+        self.inicio = time.perf_counter()
+        self.fracao = 0.0
+        self.mensagem = ''
+        self._fase = (0.0, 1.0)
+        self._ultimo_aviso = 0.0
+
+    def cancelar(self):
+        self._cancelado.set()
+
+    @property
+    def cancelado(self):
+        return self._cancelado.is_set()
+
+    def verificar(self):
+        """Lança Cancelado se a tarefa tiver sido cancelada"""
+        if self._cancelado.is_set():
+            raise Cancelado()
+
+    def fase(self, inicio, fim, mensagem=None):
+        """Passa a uma nova fase, que ocupa [inicio, fim] da barra de progresso"""
+        self._fase = (inicio, fim)
+        if mensagem is not None:
+            self.mensagem = mensagem
+        self.progresso(0.0)
+
+    def progresso(self, fracao, mensagem=None):
+        """Fração concluída (0-1) da fase atual"""
+        inicio, fim = self._fase
+        self.fracao = max(self.fracao, inicio + (fim - inicio) * min(max(fracao, 0.0), 1.0))
+        if mensagem is not None:
+            self.mensagem = mensagem
+        if self.callback is None:
+            return
+        agora = time.perf_counter()
+        if agora - self._ultimo_aviso >= self.intervalo or self.fracao >= 1.0:
+            self._ultimo_aviso = agora
+            self.callback(self.fracao, self.decorrido, self.restante, self.mensagem)
+
+    def checkpoint(self, fracao=None, mensagem=None):
+        """Ponto de cancelamento; atualiza também o progresso da fase, se indicado"""
+        self.verificar()
+        if fracao is not None:
+            self.progresso(fracao, mensagem)
+
+    @property
+    def decorrido(self):
+        return time.perf_counter() - self.inicio
+
+    @property
+    def restante(self):
+        """Tempo restante estimado em segundos (None enquanto não houver progresso)"""
+        if self.fracao <= 0.0:
+            return None
+        return self.decorrido * (1.0 - self.fracao) / self.fracao
+
+
+def formatar_duracao(segundos):
+    segundos = int(round(segundos))
+    horas, resto = divmod(segundos, 3600)
+    minutos, segundos = divmod(resto, 60)
+    if horas:
+        return f"{horas}:{minutos:02d}:{segundos:02d}"
+    return f"{minutos:02d}:{segundos:02d}"
+
+
+def formatar_estado(fracao, decorrido, restante, mensagem=''):
+    """Texto de estado: mensagem, percentagem, tempo decorrido e tempo restante"""
+    texto = f"{mensagem} {fracao * 100:.1f}%".strip()
+    texto += f" | decorrido {formatar_duracao(decorrido)}"
+    if restante is not None and fracao < 1.0:
+        texto += f" | faltam ~{formatar_duracao(restante)}"
+    return texto
+
+
+class JobWorker(QThread):
+    """QThread que executa `executar(job)` com progresso e cancelamento.
+
+    As subclasses implementam `executar` e emitem o seu sinal de conclusão;
+    Cancelado é convertido no sinal `cancelado`.
+    """
+    progress = pyqtSignal(int)
+    estado = pyqtSignal(str)
+    cancelado = pyqtSignal()
+    error = pyqtSignal(str)
+
+    def __init__(self):
+        super().__init__()
+        self.job = Job(self._notificar)
+
+    def _notificar(self, fracao, decorrido, restante, mensagem):
+        self.progress.emit(int(fracao * PASSOS))
+        self.estado.emit(formatar_estado(fracao, decorrido, restante, mensagem))
+
+    def cancelar(self):
+        self.job.cancelar()
+
+    def executar(self, job):
+        raise NotImplementedError
+
+    def mensagem_erro(self, erro):
+        return str(erro)
+
+    def run(self):
+        try:
+            self.executar(self.job)
+        except Cancelado:
+            self.cancelado.emit()
+        except Exception as e:
+            self.error.emit(self.mensagem_erro(e))
+        finally:
+            libertar_leituras()
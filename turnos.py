@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tipo Shift partilhado pelo gerador de escalas, escala telefónica e dias fixos.
+
+Um horário como '09:00 - 18:00' é convertido uma única vez (cache por texto)
+em minutos de início/fim e máscaras de bits por hora, para que as verificações
+de cobertura sejam operações bitwise em vez de comparações de strings.
+"""
+
+import re
+
+FOLGA = 'FOLGA'
+FERIAS = 'FÉRIAS'
+LOJA_FECHADA = 'Loja Fechada'
+
+# Fecho da loja (minutos desde as 00:00): turno de fecho é o que acaba exatamente às 20:00
+FECHO = 20 * 60
+
+# Mesmo formato aceite pelo editor de dias fixos: H:MM ou HH:MM, 00-23
+_HORARIO_RE = re.compile(r'^([0-1]?[0-9]|2[0-3]):([0-5][0-9]) - ([0-1]?[0-9]|2[0-3]):([0-5][0-9])$')
+
+
+def mascara_horas(*horas):
+    """Máscara com um bit por hora (bit h = hora h)"""
+    mascara = 0
+    for h in horas:
+        mascara |= 1 << h
+    return mascara
+
+
+class Shift:
+    """Horário de um dia: turno de trabalho ou sentinela (FOLGA, FÉRIAS, loja fechada)"""
+
+    TRABALHO = 0
+    FOLGA = 1
+    FERIAS = 2
+    FECHADO = 3
+    INVALIDO = 4
+
+    __slots__ = ('texto', 'tipo', 'inicio', 'fim', 'mascara', 'bit_inicio', 'bit_fim', 'fecha')
+
+    _cache = {}
+
+    def __init__(self, texto, tipo, inicio=0, fim=0):
+        self.texto = texto
+        self.tipo = tipo
+        self.inicio = inicio  # minutos desde as 00:00
+        self.fim = fim        # minutos desde as 00:00 (> 1440 se passar a meia-noite)
+        if tipo == Shift.TRABALHO:
+            # Horas em que a pessoa está presente a hora inteira
+            primeira = -(-inicio // 60)
+            self.mascara = ((1 << (fim // 60)) - 1) & ~((1 << primeira) - 1) if fim // 60 > primeira else 0
+            self.bit_inicio = 1 << (inicio // 60)
+            self.bit_fim = 1 << (fim // 60)
+            # Só o fim exato conta: 11:00 - 20:30 não é turno de fecho
+            self.fecha = fim == FECHO
+        else:
+            self.mascara = 0
+            self.bit_inicio = 0
+            self.bit_fim = 0
+            self.fecha = False
+
+    @classmethod
+    def parse(cls, texto):
+        """Converte um horário em Shift; cada texto distinto é analisado uma só vez"""
+        if not isinstance(texto, str):
+            return cls(texto, cls.INVALIDO)
+        shift = cls._cache.get(texto)
+        if shift is None:
+            shift = cls._parse(texto)
+            cls._cache[texto] = shift
+        return shift
+
+    @classmethod
+    def _parse(cls, texto):
+        if texto == FOLGA:
+            return cls(texto, cls.FOLGA)
+        if texto == FERIAS:
+            return cls(texto, cls.FERIAS)
+        if texto == LOJA_FECHADA:
+            return cls(texto, cls.FECHADO)
+        m = _HORARIO_RE.match(texto.strip())
+        if not m:
+            return cls(texto, cls.INVALIDO)
+        h1, m1, h2, m2 = (int(g) for g in m.groups())
+        inicio = h1 * 60 + m1
+        fim = h2 * 60 + m2
+        if fim <= inicio:
+            # Turno que passa a meia-noite
+            fim += 24 * 60
+        return cls(texto, cls.TRABALHO, inicio, fim)
+
+    @property
+    def is_trabalho(self):
+        return self.tipo == Shift.TRABALHO
+
+    @property
+    def is_ausencia(self):
+        """FOLGA ou FÉRIAS"""
+        return self.tipo in (Shift.FOLGA, Shift.FERIAS)
+
+    @property
+    def hora_inicio(self):
+        return self.inicio // 60
+
+    @property
+    def hora_fim(self):
+        return self.fim // 60
+
+    @property
+    def minutos(self):
+        return self.fim - self.inicio if self.tipo == Shift.TRABALHO else 0
+
+    def presente(self, hora):
+        """Verifica se a pessoa está presente durante toda a hora indicada"""
+        return bool(self.mascara >> hora & 1)
+
+    def __eq__(self, other):
+        if isinstance(other, Shift):
+            return self.texto == other.texto
+        return self.texto == other
+
+    def __hash__(self):
+        return hash(self.texto)
+
+    def __str__(self):
+        return str(self.texto)
+
+    def __repr__(self):
+        return f"Shift({self.texto!r})"
+
+
+def bits_inicio(horarios):
+    """OR das horas de início de uma coleção de horários (texto ou Shift)"""
+    bits = 0
+    for h in horarios:
+        bits |= (h if isinstance(h, Shift) else Shift.parse(h)).bit_inicio
+    return bits
+
+
+def bits_fim(horarios):
+    """OR das horas de fim de uma coleção de horários (texto ou Shift)"""
+    bits = 0
+    for h in horarios:
+        bits |= (h if isinstance(h, Shift) else Shift.parse(h)).bit_fim
+    return bits
+
+
+def validar_horario(texto):
+    """Verifica se o texto é um horário HH:MM - HH:MM válido"""
+    return isinstance(texto, str) and _HORARIO_RE.match(texto.strip()) is not None